@@ -1,7 +1,11 @@
 from logging.config import fileConfig
 
+import asyncio
+
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import async_engine_from_config
 from dotenv import load_dotenv
 from alembic import context
 
@@ -78,6 +82,11 @@ def run_migrations_online() -> None:
         url = url.replace("https://", "postgresql://", 1)
     configuration["sqlalchemy.url"] = url # Update configuration with resolved URL
 
+    # DATABASE_URL may name the asyncpg driver the app uses, run through it then
+    if make_url(url).get_dialect().is_async:
+        asyncio.run(run_async_migrations(configuration))
+        return
+
     connectable = engine_from_config(
         configuration,
         prefix="sqlalchemy.",
@@ -85,16 +94,34 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            compare_type=True, # Added for autogeneration
-            render_as_batch=True, # Added for specific DBs like SQLite
-            compare_server_default=True, # Habilita la detección de cambios en valores por defecto
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        do_run_migrations(connection)
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True, # Added for autogeneration
+        render_as_batch=True, # Added for specific DBs like SQLite
+        compare_server_default=True, # Habilita la detección de cambios en valores por defecto
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations(configuration: dict) -> None:
+    connectable = async_engine_from_config(
+        configuration,
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    async with connectable.connect() as connection:
+        # Migrations are synchronous, including the ones reading through op.get_bind()
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
 
 
 if context.is_offline_mode():
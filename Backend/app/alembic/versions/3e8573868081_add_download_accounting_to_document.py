@@ -0,0 +1,57 @@
+"""Add download accounting to Document
+
+Revision ID: 3e8573868081
+Revises: 4b79c309f46a
+Create Date: 2026-10-19 09:12:41.530117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8573868081'
+down_revision: Union[str, Sequence[str], None] = '4b79c309f46a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('download_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_downloaded_at', sa.DateTime(), nullable=True))
+
+    # Applies a whole batch of buffered download events in two statements.
+    # Called by services.download_tracker.DownloadTracker.flush through PostgREST RPC.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_document_downloads(documents jsonb, shares jsonb)
+        RETURNS void
+        LANGUAGE sql
+        AS $$
+            UPDATE documents AS d
+            SET download_count = d.download_count + b.downloads,
+                last_downloaded_at = GREATEST(d.last_downloaded_at, b.downloaded_at),
+                status = CASE WHEN d.status = 'process' THEN 'downloaded'::documentstatus ELSE d.status END
+            FROM jsonb_to_recordset(documents) AS b(document_id integer, downloads integer, downloaded_at timestamp)
+            WHERE d.id = b.document_id;
+
+            UPDATE documents_shared AS s
+            SET downloaded_at = GREATEST(s.downloaded_at, b.downloaded_at)
+            FROM jsonb_to_recordset(shares) AS b(document_id integer, user_id integer, downloaded_at timestamp)
+            WHERE s.document_id = b.document_id
+              AND s.user_id = b.user_id
+              AND s.deleted_at IS NULL;
+        $$;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS record_document_downloads(jsonb, jsonb)")
+
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_column('last_downloaded_at')
+        batch_op.drop_column('download_count')
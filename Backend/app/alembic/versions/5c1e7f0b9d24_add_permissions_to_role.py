@@ -0,0 +1,37 @@
+"""Add permissions to Role
+
+Revision ID: 5c1e7f0b9d24
+Revises: daa4abe40501
+Create Date: 2026-10-19 19:58:12.840316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7f0b9d24'
+down_revision: Union[str, Sequence[str], None] = 'daa4abe40501'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# auth.permissions values at the time of this revision
+ALL_PERMISSIONS = 255
+STANDARD_USER_PERMISSIONS = 71
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('roles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('permissions', sa.BigInteger(), server_default='0', nullable=False))
+
+    op.execute(f"UPDATE roles SET permissions = {ALL_PERMISSIONS} WHERE role_name = 'Admin'")
+    op.execute(f"UPDATE roles SET permissions = {STANDARD_USER_PERMISSIONS} WHERE role_name = 'User'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('roles', schema=None) as batch_op:
+        batch_op.drop_column('permissions')
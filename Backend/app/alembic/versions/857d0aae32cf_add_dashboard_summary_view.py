@@ -0,0 +1,108 @@
+"""Add dashboard summary view
+
+Revision ID: 857d0aae32cf
+Revises: d45ae21c38fa
+Create Date: 2026-10-19 15:48:26.174902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '857d0aae32cf'
+down_revision: Union[str, Sequence[str], None] = 'd45ae21c38fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Supabase grants EXECUTE on new functions to its API roles, a SECURITY DEFINER function
+# that only the Celery workers call is taken back from them and left to the service role
+RESTRICT_TO_SERVICE_ROLE = """
+    DO $$
+    BEGIN
+        REVOKE ALL ON FUNCTION {function} FROM PUBLIC;
+        IF EXISTS (SELECT FROM pg_roles WHERE rolname = 'anon') THEN
+            REVOKE ALL ON FUNCTION {function} FROM anon, authenticated;
+        END IF;
+        IF EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') THEN
+            GRANT EXECUTE ON FUNCTION {function} TO service_role;
+        END IF;
+    END
+    $$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Every aggregate of the dashboard in a single row, recomputed by refresh_dashboard_summary()
+    op.execute("""
+        CREATE MATERIALIZED VIEW dashboard_summary_mv AS
+        WITH live AS (
+            SELECT id, user_id, status, created_at,
+                   CASE WHEN size ~ '^[0-9]+$' THEN size::bigint ELSE 0 END AS size_bytes
+            FROM documents
+            WHERE deleted_at IS NULL
+        )
+        SELECT 1 AS id,
+               (SELECT count(*) FROM live) AS total_documents,
+               (SELECT coalesce(jsonb_object_agg(status, documents), '{}'::jsonb)
+                FROM (SELECT status::text AS status, count(*) AS documents FROM live GROUP BY status) AS by_status) AS documents_by_status,
+               (SELECT count(*) FROM users WHERE deleted_at IS NULL) AS total_users,
+               (SELECT coalesce(sum(size_bytes), 0) FROM live) AS total_storage_bytes,
+               (SELECT coalesce(jsonb_agg(by_user ORDER BY by_user.bytes DESC), '[]'::jsonb)
+                FROM (SELECT user_id, sum(size_bytes) AS bytes, count(*) AS documents
+                      FROM live
+                      WHERE user_id IS NOT NULL
+                      GROUP BY user_id
+                      ORDER BY bytes DESC
+                      LIMIT 20) AS by_user) AS storage_by_user,
+               (SELECT coalesce(jsonb_agg(by_day ORDER BY by_day.day), '[]'::jsonb)
+                FROM (SELECT created_at::date AS day, count(*) AS uploads
+                      FROM live
+                      WHERE created_at >= current_date - 29
+                      GROUP BY 1) AS by_day) AS uploads_per_day,
+               now() AS refreshed_at
+    """)
+    # REFRESH ... CONCURRENTLY needs a unique index, and keeps the view readable while it runs
+    op.execute("CREATE UNIQUE INDEX ix_dashboard_summary_mv_id ON dashboard_summary_mv (id)")
+
+    # Called by the tasks.refresh_dashboard_summary Celery beat task through PostgREST RPC, with the service key
+    op.execute("""
+        CREATE OR REPLACE FUNCTION refresh_dashboard_summary()
+        RETURNS void
+        LANGUAGE sql
+        SECURITY DEFINER
+        SET search_path = public
+        AS $$
+            REFRESH MATERIALIZED VIEW CONCURRENTLY dashboard_summary_mv;
+        $$;
+    """)
+    # Over RPC anyone could otherwise keep the database busy recomputing the view
+    op.execute(RESTRICT_TO_SERVICE_ROLE.format(function="refresh_dashboard_summary()"))
+
+    # The precomputed row plus the latest log entries, which are a cheap primary key scan.
+    # Called by services.dashboard_service.DashboardService.get_summary through PostgREST RPC.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION dashboard_summary(recent_limit integer DEFAULT 10)
+        RETURNS jsonb
+        LANGUAGE sql STABLE
+        AS $$
+            SELECT (to_jsonb(s) - 'id') || jsonb_build_object('recent_activity', coalesce((
+                SELECT jsonb_agg(recent ORDER BY recent.id DESC)
+                FROM (SELECT id, event, user_id, event_description, created_at
+                      FROM logs
+                      ORDER BY id DESC
+                      LIMIT recent_limit) AS recent
+            ), '[]'::jsonb))
+            FROM dashboard_summary_mv AS s
+        $$;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS dashboard_summary(integer)")
+    op.execute("DROP FUNCTION IF EXISTS refresh_dashboard_summary()")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS dashboard_summary_mv")
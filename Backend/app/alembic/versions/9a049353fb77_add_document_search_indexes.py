@@ -0,0 +1,93 @@
+"""Add document search indexes
+
+Revision ID: 9a049353fb77
+Revises: 3e8573868081
+Create Date: 2026-10-19 11:04:17.286450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a049353fb77'
+down_revision: Union[str, Sequence[str], None] = '3e8573868081'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Words of the name and type, punctuation split so "q3-report.pdf" matches "report" and "pdf".
+    # Used both by the index and by the query so the planner can match them.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION document_search_vector(name text, type text)
+        RETURNS tsvector
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT to_tsvector('simple'::regconfig, regexp_replace(coalesce(name, '') || ' ' || coalesce(type, ''), '[^[:alnum:]]+', ' ', 'g'))
+        $$;
+    """)
+
+    # Every word of the search text as a prefix, all of them required
+    op.execute("""
+        CREATE OR REPLACE FUNCTION document_search_query(search_query text)
+        RETURNS tsquery
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+            SELECT to_tsquery('simple'::regconfig, string_agg(word || ':*', ' & '))
+            FROM regexp_split_to_table(lower(search_query), '[^[:alnum:]]+') AS word
+            WHERE word <> ''
+        $$;
+    """)
+
+    # Prefix matches through the tsvector index, misspellings through the trigram index.
+    # Ranked by text rank plus name similarity, paginated on (rank, id).
+    # Called by services.document_service.DocumentService.search_documents through PostgREST RPC.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION search_documents(search_query text, max_results integer, after_rank double precision DEFAULT NULL, after_id integer DEFAULT NULL)
+        RETURNS TABLE (document jsonb, rank double precision)
+        LANGUAGE sql STABLE
+        AS $$
+            WITH matches AS (
+                SELECT d.*,
+                       (ts_rank(document_search_vector(d.name, d.type), document_search_query(search_query))
+                        + similarity(d.name, search_query))::double precision AS search_rank
+                FROM documents AS d
+                WHERE d.deleted_at IS NULL
+                  AND (document_search_vector(d.name, d.type) @@ document_search_query(search_query)
+                       OR d.name % search_query)
+            )
+            SELECT to_jsonb(m) - 'search_rank', m.search_rank
+            FROM matches AS m
+            WHERE after_rank IS NULL OR (m.search_rank, m.id) < (after_rank, after_id)
+            ORDER BY m.search_rank DESC, m.id DESC
+            LIMIT max_results
+        $$;
+    """)
+
+    # Built without locking writes out of a large documents table
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_search_vector
+            ON documents USING gin (document_search_vector(name, type))
+            WHERE deleted_at IS NULL
+        """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_name_trgm
+            ON documents USING gin (name gin_trgm_ops)
+            WHERE deleted_at IS NULL
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_documents_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_documents_search_vector")
+    op.execute("DROP FUNCTION IF EXISTS search_documents(text, integer, double precision, integer)")
+    op.execute("DROP FUNCTION IF EXISTS document_search_query(text)")
+    op.execute("DROP FUNCTION IF EXISTS document_search_vector(text, text)")
@@ -0,0 +1,181 @@
+"""Add size_bytes to Document and user_storage_usage
+
+Revision ID: b37a19a9a91b
+Revises: 857d0aae32cf
+Create Date: 2026-10-19 17:21:05.338714
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b37a19a9a91b'
+down_revision: Union[str, Sequence[str], None] = '857d0aae32cf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per backfill statement, each one commits on its own so locks stay short
+BACKFILL_BATCH_SIZE = 10000
+
+DASHBOARD_SUMMARY_MV = """
+    CREATE MATERIALIZED VIEW dashboard_summary_mv AS
+    WITH live AS (
+        SELECT id, user_id, status, created_at, {size_bytes} AS size_bytes
+        FROM documents
+        WHERE deleted_at IS NULL
+    )
+    SELECT 1 AS id,
+           (SELECT count(*) FROM live) AS total_documents,
+           (SELECT coalesce(jsonb_object_agg(status, documents), '{{}}'::jsonb)
+            FROM (SELECT status::text AS status, count(*) AS documents FROM live GROUP BY status) AS by_status) AS documents_by_status,
+           (SELECT count(*) FROM users WHERE deleted_at IS NULL) AS total_users,
+           (SELECT coalesce(sum(size_bytes), 0) FROM live) AS total_storage_bytes,
+           (SELECT coalesce(jsonb_agg(by_user ORDER BY by_user.bytes DESC), '[]'::jsonb)
+            FROM ({storage_by_user}
+                  ORDER BY bytes DESC
+                  LIMIT 20) AS by_user) AS storage_by_user,
+           (SELECT coalesce(jsonb_agg(by_day ORDER BY by_day.day), '[]'::jsonb)
+            FROM (SELECT created_at::date AS day, count(*) AS uploads
+                  FROM live
+                  WHERE created_at >= current_date - 29
+                  GROUP BY 1) AS by_day) AS uploads_per_day,
+           now() AS refreshed_at
+"""
+
+
+# Same as in d45ae21c38fa, the columns of a view are fixed when it is created
+USER_SHARED_DOCUMENTS = """
+    CREATE VIEW user_shared_documents WITH (security_invoker = true) AS
+    SELECT s.user_id AS shared_with_id, s.shared_date, s.downloaded_at AS shared_downloaded_at,
+           d.id, d.name, d.type, d.size, d.created_at, d.updated_at, d.deleted_at, d.uploaded_at,
+           d.status, d.file_url, d.user_id, d.download_count, d.last_downloaded_at{extra_columns}
+    FROM documents_shared AS s
+    JOIN documents AS d ON d.id = s.document_id
+    WHERE s.deleted_at IS NULL
+      AND d.deleted_at IS NULL
+"""
+
+
+def _create_user_shared_documents(extra_columns: str = "") -> None:
+    op.execute("DROP VIEW IF EXISTS user_shared_documents")
+    op.execute(USER_SHARED_DOCUMENTS.format(extra_columns=extra_columns))
+
+
+def _create_dashboard_summary_mv(size_bytes: str, storage_by_user: str) -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS dashboard_summary_mv")
+    op.execute(DASHBOARD_SUMMARY_MV.format(size_bytes=size_bytes, storage_by_user=storage_by_user))
+    op.execute("CREATE UNIQUE INDEX ix_dashboard_summary_mv_id ON dashboard_summary_mv (id)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+
+    # Sizes were stored as text, either a byte count from uploads or "10MB" style from the seed data
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION parse_size_bytes(size text)
+        RETURNS bigint
+        LANGUAGE sql IMMUTABLE
+        AS $$
+            SELECT coalesce((
+                SELECT (m[1]::numeric * CASE upper(left(m[2], 1))
+                    WHEN 'K' THEN 1024
+                    WHEN 'M' THEN 1048576
+                    WHEN 'G' THEN 1073741824
+                    WHEN 'T' THEN 1099511627776
+                    ELSE 1 END)::bigint
+                FROM regexp_match(size, '^\s*([0-9]+(?:\.[0-9]+)?)\s*([KMGT]?B?)\s*$', 'i') AS m
+            ), 0)
+        $$;
+    """)
+
+    with op.get_context().autocommit_block():
+        if context.is_offline_mode():
+            op.execute("UPDATE documents SET size_bytes = parse_size_bytes(size) WHERE size_bytes IS NULL")
+        else:
+            bind = op.get_bind()
+            low, high = bind.execute(sa.text("SELECT min(id), max(id) FROM documents")).one()
+            for start in range(low or 0, (high or -1) + 1, BACKFILL_BATCH_SIZE):
+                bind.execute(
+                    sa.text("UPDATE documents SET size_bytes = parse_size_bytes(size) WHERE id >= :start AND id < :end AND size_bytes IS NULL"),
+                    {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+                )
+
+    # Writes are held off from here to the trigger so the usage totals start out exact
+    op.execute("LOCK TABLE documents IN SHARE ROW EXCLUSIVE MODE")
+    # Rows written by the previous release while the backfill ran
+    op.execute("UPDATE documents SET size_bytes = parse_size_bytes(size) WHERE size_bytes IS NULL")
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.alter_column('size_bytes', existing_type=sa.BigInteger(), server_default='0', nullable=False)
+
+    op.create_table('user_storage_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('documents', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute("""
+        INSERT INTO user_storage_usage (user_id, bytes, documents)
+        SELECT user_id, sum(size_bytes), count(*)
+        FROM documents
+        WHERE user_id IS NOT NULL AND deleted_at IS NULL
+        GROUP BY user_id
+    """)
+
+    # Runs in the same transaction as the document write, whichever path made it
+    # (upload, compression, soft or hard delete, owner change)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION track_user_storage_usage()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.user_id IS NOT NULL AND OLD.deleted_at IS NULL THEN
+                UPDATE user_storage_usage
+                SET bytes = bytes - OLD.size_bytes, documents = documents - 1, updated_at = now()
+                WHERE user_id = OLD.user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL AND NEW.deleted_at IS NULL THEN
+                INSERT INTO user_storage_usage AS u (user_id, bytes, documents)
+                VALUES (NEW.user_id, NEW.size_bytes, 1)
+                ON CONFLICT (user_id) DO UPDATE
+                SET bytes = u.bytes + EXCLUDED.bytes, documents = u.documents + 1, updated_at = now();
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER documents_user_storage_usage
+        AFTER INSERT OR DELETE OR UPDATE OF size_bytes, user_id, deleted_at ON documents
+        FOR EACH ROW EXECUTE FUNCTION track_user_storage_usage()
+    """)
+
+    _create_dashboard_summary_mv(
+        size_bytes="size_bytes",
+        storage_by_user="SELECT user_id, bytes, documents FROM user_storage_usage WHERE documents > 0",
+    )
+    # Shared-with-me listings report the sizes too
+    _create_user_shared_documents(extra_columns=", d.size_bytes")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _create_dashboard_summary_mv(
+        size_bytes="CASE WHEN size ~ '^[0-9]+$' THEN size::bigint ELSE 0 END",
+        storage_by_user="SELECT user_id, sum(size_bytes) AS bytes, count(*) AS documents FROM live WHERE user_id IS NOT NULL GROUP BY user_id",
+    )
+    op.execute("DROP TRIGGER IF EXISTS documents_user_storage_usage ON documents")
+    op.execute("DROP FUNCTION IF EXISTS track_user_storage_usage()")
+    op.drop_table('user_storage_usage')
+    op.execute("DROP FUNCTION IF EXISTS parse_size_bytes(text)")
+    _create_user_shared_documents()
+
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_column('size_bytes')
@@ -0,0 +1,45 @@
+"""Add foreign key lookup indexes
+
+Revision ID: c6d2a8e4f310
+Revises: 5c1e7f0b9d24
+Create Date: 2026-10-19 21:12:40.118527
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6d2a8e4f310'
+down_revision: Union[str, Sequence[str], None] = '5c1e7f0b9d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE_ROWS = sa.text("deleted_at IS NULL")
+
+# (name, table, columns, partial on live rows)
+INDEXES = [
+    # A user's uploads, paged on id (UserService.get_documents_uploaded_by_user, user_id filter of list_documents)
+    ('ix_documents_live_user_id_id', 'documents', ['user_id', 'id'], True),
+    # A user's log entries, newest first on id, which follows created_at (LogService.get_logs_by_user)
+    ('ix_logs_user_id_id', 'logs', ['user_id', 'id'], False),
+    # Roles embedded into every user row (the embed does not filter deleted_at), and the users of a role for token revocation
+    ('ix_user_roles_user_id', 'user_roles', ['user_id'], False),
+    ('ix_user_roles_role_id', 'user_roles', ['role_id'], False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built without locking writes out of large tables
+    with op.get_context().autocommit_block():
+        for name, table, columns, live_only in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_where=LIVE_ROWS if live_only else None, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
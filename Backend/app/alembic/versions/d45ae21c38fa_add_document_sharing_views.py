@@ -0,0 +1,70 @@
+"""Add document sharing views
+
+Revision ID: d45ae21c38fa
+Revises: fcf186e1e420
+Create Date: 2026-10-19 14:02:11.617384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd45ae21c38fa'
+down_revision: Union[str, Sequence[str], None] = 'fcf186e1e420'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # "Shared with me" pages seek on (shared_date, document_id), shared_date has to be set
+    op.execute("UPDATE documents_shared SET shared_date = coalesce(updated_at, now()) WHERE shared_date IS NULL")
+    with op.batch_alter_table('documents_shared', schema=None) as batch_op:
+        batch_op.alter_column('shared_date', existing_type=sa.DateTime(), server_default=sa.func.now(), nullable=False)
+
+    # Users a document is shared with, one row per live share. Columns are listed, a `*` would be
+    # frozen when the view is created and would expose the password columns.
+    # Read by services.document_service.DocumentService.get_shared_users_for_document.
+    op.execute("""
+        CREATE VIEW document_shared_users WITH (security_invoker = true) AS
+        SELECT s.document_id, s.shared_date, s.downloaded_at AS shared_downloaded_at,
+               u.id, u.email, u.username, u.phone, u.responsability, u.is_active,
+               u.created_at, u.updated_at, u.deleted_at
+        FROM documents_shared AS s
+        JOIN users AS u ON u.id = s.user_id
+        JOIN documents AS d ON d.id = s.document_id
+        WHERE s.deleted_at IS NULL
+          AND u.deleted_at IS NULL
+          AND d.deleted_at IS NULL
+    """)
+
+    # Documents shared with each user, one row per live share.
+    # Read by services.document_service.DocumentService.list_documents_shared_with_user.
+    op.execute("""
+        CREATE VIEW user_shared_documents WITH (security_invoker = true) AS
+        SELECT s.user_id AS shared_with_id, s.shared_date, s.downloaded_at AS shared_downloaded_at,
+               d.id, d.name, d.type, d.size, d.created_at, d.updated_at, d.deleted_at, d.uploaded_at,
+               d.status, d.file_url, d.user_id, d.download_count, d.last_downloaded_at
+        FROM documents_shared AS s
+        JOIN documents AS d ON d.id = s.document_id
+        WHERE s.deleted_at IS NULL
+          AND d.deleted_at IS NULL
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_documents_shared_live_user_id_shared_date', 'documents_shared', ['user_id', 'shared_date', 'document_id'], unique=False, postgresql_where=sa.text("deleted_at IS NULL"), postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_documents_shared_live_document_id', 'documents_shared', ['document_id'], unique=False, postgresql_where=sa.text("deleted_at IS NULL"), postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_shared_live_document_id', table_name='documents_shared', if_exists=True)
+    op.drop_index('ix_documents_shared_live_user_id_shared_date', table_name='documents_shared', if_exists=True)
+    op.execute("DROP VIEW IF EXISTS user_shared_documents")
+    op.execute("DROP VIEW IF EXISTS document_shared_users")
+
+    with op.batch_alter_table('documents_shared', schema=None) as batch_op:
+        batch_op.alter_column('shared_date', existing_type=sa.DateTime(), server_default=None, nullable=True)
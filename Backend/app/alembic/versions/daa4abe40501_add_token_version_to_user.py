@@ -0,0 +1,90 @@
+"""Add token_version to User
+
+Revision ID: daa4abe40501
+Revises: b37a19a9a91b
+Create Date: 2026-10-19 18:46:30.512907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'daa4abe40501'
+down_revision: Union[str, Sequence[str], None] = 'b37a19a9a91b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+    # Access tokens carry the user's roles and token_version, get_current_user only
+    # compares versions. Any change that has to revoke issued tokens bumps it here,
+    # whichever path made the change.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_user_token_version()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF NEW.password IS DISTINCT FROM OLD.password
+               OR NEW.hashed_password IS DISTINCT FROM OLD.hashed_password
+               OR NEW.email IS DISTINCT FROM OLD.email
+               OR NEW.is_active IS DISTINCT FROM OLD.is_active
+               OR NEW.deleted_at IS DISTINCT FROM OLD.deleted_at THEN
+                NEW.token_version := OLD.token_version + 1;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER users_token_version
+        BEFORE UPDATE OF password, hashed_password, email, is_active, deleted_at ON users
+        FOR EACH ROW EXECUTE FUNCTION bump_user_token_version()
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_user_role_token_version()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'roles' THEN
+                UPDATE users SET token_version = token_version + 1
+                WHERE id IN (SELECT user_id FROM user_roles WHERE role_id = NEW.id);
+            ELSE
+                UPDATE users SET token_version = token_version + 1
+                WHERE id IN (OLD.user_id, NEW.user_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER user_roles_token_version
+        AFTER INSERT OR DELETE OR UPDATE OF user_id, role_id, deleted_at ON user_roles
+        FOR EACH ROW EXECUTE FUNCTION bump_user_role_token_version()
+    """)
+    op.execute("""
+        CREATE TRIGGER roles_token_version
+        AFTER UPDATE OF role_name, deleted_at ON roles
+        FOR EACH ROW EXECUTE FUNCTION bump_user_role_token_version()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS roles_token_version ON roles")
+    op.execute("DROP TRIGGER IF EXISTS user_roles_token_version ON user_roles")
+    op.execute("DROP FUNCTION IF EXISTS bump_user_role_token_version()")
+    op.execute("DROP TRIGGER IF EXISTS users_token_version ON users")
+    op.execute("DROP FUNCTION IF EXISTS bump_user_token_version()")
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
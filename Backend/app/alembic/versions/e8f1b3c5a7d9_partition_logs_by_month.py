@@ -0,0 +1,198 @@
+"""Partition logs by month of created_at
+
+Revision ID: e8f1b3c5a7d9
+Revises: c6d2a8e4f310
+Create Date: 2026-10-19 23:04:52.601734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f1b3c5a7d9'
+down_revision: Union[str, Sequence[str], None] = 'c6d2a8e4f310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Empty partitions created up front, the maintain_log_partitions() task keeps this many ahead from then on
+PARTITIONS_AHEAD = 3
+
+# Rows without created_at can't be routed to a partition, they take the time of their last update
+COPY_ROWS = """
+    INSERT INTO {target} (id, event, user_id, event_description, created_at, updated_at, deleted_at)
+    SELECT id, event, user_id, event_description, coalesce(created_at, updated_at, now()), updated_at, deleted_at
+    FROM {source}
+"""
+
+RESTRICT_TO_SERVICE_ROLE = """
+    DO $$
+    BEGIN
+        REVOKE ALL ON FUNCTION {function} FROM PUBLIC;
+        IF EXISTS (SELECT FROM pg_roles WHERE rolname = 'anon') THEN
+            REVOKE ALL ON FUNCTION {function} FROM anon, authenticated;
+        END IF;
+        IF EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') THEN
+            GRANT EXECUTE ON FUNCTION {function} TO service_role;
+        END IF;
+    END
+    $$;
+"""
+
+LOG_INDEXES = ('{}_pkey', 'ix_{}_id', 'ix_{}_user_id_id')
+
+
+def _create_logs_table(name: str, partitioned: bool) -> None:
+    # The partition key has to be part of the primary key, ids stay unique through the shared sequence
+    primary_key = ['id', 'created_at'] if partitioned else ['id']
+    table_options = {'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {}
+    op.create_table(name,
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('logs_id_seq'::regclass)"), nullable=False),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('event_description', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now() if partitioned else None, nullable=not partitioned),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='logs_user_id_fkey'),
+    sa.PrimaryKeyConstraint(*primary_key, name=LOG_INDEXES[0].format(name)),
+    **table_options
+    )
+    op.create_index(LOG_INDEXES[1].format(name), name, ['id'], unique=False)
+    op.create_index(LOG_INDEXES[2].format(name), name, ['user_id', 'id'], unique=False)
+
+
+def _rename_logs_table(old_name: str, new_name: str) -> None:
+    op.rename_table(old_name, new_name)
+    for index in LOG_INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {index.format(old_name)} RENAME TO {index.format(new_name)}")
+
+
+def _swap_logs_table(new_table: str, old_name: str) -> None:
+    """Put `new_table` in place of logs, which is renamed to `old_name` and dropped."""
+    _rename_logs_table('logs', old_name)
+    _rename_logs_table(new_table, 'logs')
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY logs.id")
+    op.drop_table(old_name)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Everything below runs in the migration transaction, a failure leaves logs as it was.
+    # Writes to logs wait until the swap commits, reads go on against the old table until the swap.
+    op.execute("LOCK TABLE logs IN EXCLUSIVE MODE")
+    _create_logs_table('logs_partitioned', partitioned=True)
+
+    # There is no DEFAULT partition: it would have to be emptied of a month's rows
+    # before that month's partition could be created. Writes outside every monthly
+    # partition fail instead, the maintenance task keeps partitions ahead of now().
+    # Every month with existing entries, up to PARTITIONS_AHEAD months from now.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', least(coalesce(min(coalesce(created_at, updated_at)), now()), now())),
+                    date_trunc('month', greatest(coalesce(max(coalesce(created_at, updated_at)), now()), now()) + interval '{PARTITIONS_AHEAD} months'),
+                    interval '1 month'
+                )
+                FROM logs
+            LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF logs_partitioned FOR VALUES FROM (%L) TO (%L)',
+                               'logs_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month');
+            END LOOP;
+        END
+        $$;
+    """)
+
+    op.execute(COPY_ROWS.format(target='logs_partitioned', source='logs'))
+    _swap_logs_table('logs_partitioned', old_name='logs_unpartitioned')
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION create_log_partition(for_month date)
+        RETURNS text
+        LANGUAGE plpgsql
+        SET search_path = public
+        AS $$
+        DECLARE
+            start_at timestamp := date_trunc('month', for_month);
+            partition_name text := 'logs_' || to_char(start_at, 'YYYY_MM');
+        BEGIN
+            IF to_regclass(partition_name) IS NOT NULL THEN
+                RETURN NULL;
+            END IF;
+            EXECUTE format('CREATE TABLE %I PARTITION OF logs FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, start_at, start_at + interval '1 month');
+            RETURN partition_name;
+        END;
+        $$;
+    """)
+    op.execute(RESTRICT_TO_SERVICE_ROLE.format(function="create_log_partition(date)"))
+
+    # Called daily by the tasks.maintain_log_partitions Celery beat task through PostgREST RPC,
+    # with the service role. Expired partitions are whole months ending before the first of
+    # the current month minus retention_months, dropped or, with archive, detached into the
+    # logs_archive schema.
+    op.execute("CREATE SCHEMA IF NOT EXISTS logs_archive")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION maintain_log_partitions(months_ahead integer, retention_months integer, archive boolean DEFAULT false)
+        RETURNS jsonb
+        LANGUAGE plpgsql
+        SECURITY DEFINER
+        SET search_path = public
+        AS $$
+        DECLARE
+            this_month timestamp := date_trunc('month', now()::timestamp);
+            created text[] := '{}';
+            expired text[] := '{}';
+            partition_name text;
+        BEGIN
+            IF retention_months < 1 THEN
+                RAISE EXCEPTION 'retention_months must be at least 1, got %', retention_months;
+            END IF;
+
+            FOR month_offset IN 0..months_ahead LOOP
+                partition_name := create_log_partition((this_month + make_interval(months => month_offset))::date);
+                IF partition_name IS NOT NULL THEN
+                    created := created || partition_name;
+                END IF;
+            END LOOP;
+
+            FOR partition_name IN
+                SELECT part.relname
+                FROM pg_inherits AS inh
+                JOIN pg_class AS part ON part.oid = inh.inhrelid
+                WHERE inh.inhparent = 'logs'::regclass
+                  AND (regexp_match(pg_get_expr(part.relpartbound, part.oid), 'TO \\(''([^'']+)''\\)'))[1]::timestamp
+                      <= this_month - make_interval(months => retention_months)
+                ORDER BY part.relname
+            LOOP
+                IF archive THEN
+                    EXECUTE format('ALTER TABLE logs DETACH PARTITION %I', partition_name);
+                    EXECUTE format('ALTER TABLE %I SET SCHEMA logs_archive', partition_name);
+                ELSE
+                    EXECUTE format('DROP TABLE %I', partition_name);
+                END IF;
+                expired := expired || partition_name;
+            END LOOP;
+
+            RETURN jsonb_build_object('created', to_jsonb(created), 'expired', to_jsonb(expired));
+        END;
+        $$;
+    """)
+    op.execute(RESTRICT_TO_SERVICE_ROLE.format(function="maintain_log_partitions(integer, integer, boolean)"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Partitions archived into logs_archive are left where they are
+    op.execute("LOCK TABLE logs IN EXCLUSIVE MODE")
+    _create_logs_table('logs_unpartitioned', partitioned=False)
+    op.execute(COPY_ROWS.format(target='logs_unpartitioned', source='logs'))
+    _swap_logs_table('logs_unpartitioned', old_name='logs_partitioned')
+    op.execute("DROP FUNCTION IF EXISTS maintain_log_partitions(integer, integer, boolean)")
+    op.execute("DROP FUNCTION IF EXISTS create_log_partition(date)")
@@ -0,0 +1,54 @@
+"""Add document listing indexes
+
+Revision ID: fcf186e1e420
+Revises: 9a049353fb77
+Create Date: 2026-10-19 12:37:52.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fcf186e1e420'
+down_revision: Union[str, Sequence[str], None] = '9a049353fb77'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE_ROWS = sa.text("deleted_at IS NULL")
+
+INDEXES = [
+    ('ix_documents_live_status', ['status', 'id']),
+    ('ix_documents_live_type', ['type', 'id']),
+    ('ix_documents_live_user_id_created_at', ['user_id', 'created_at', 'id']),
+    ('ix_documents_live_created_at', ['created_at', 'id']),
+    ('ix_documents_live_uploaded_at', ['uploaded_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows inserted through PostgREST never got the ORM defaults. Listings seek on
+    # (created_at, id) and (uploaded_at, id), which needs both columns to be set.
+    op.execute("UPDATE documents SET created_at = coalesce(created_at, updated_at, now()) WHERE created_at IS NULL")
+    op.execute("UPDATE documents SET uploaded_at = created_at WHERE uploaded_at IS NULL")
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        batch_op.alter_column('uploaded_at', existing_type=sa.DateTime(), server_default=sa.func.now(), nullable=False)
+
+    # Built without locking writes out of a large documents table
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'documents', columns, unique=False, postgresql_where=LIVE_ROWS, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='documents', if_exists=True)
+
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.alter_column('uploaded_at', existing_type=sa.DateTime(), server_default=None, nullable=True)
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), server_default=None, nullable=True)
@@ -1,24 +1,84 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from db.base import get_db
-from auth.jwt import verify_access_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from db.base import get_async_db
+from auth.jwt import TokenData, live_role_names, verify_access_token
 from models.user import User as UserModel
+from models.user_role import UserRole as UserRoleModel
 from schemas.user import User as UserSchema
+from services.entity_cache import AUTH_USER_NAMESPACE, TOKEN_VERSION_NAMESPACE, entity_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserSchema:
+# Never cached, nothing downstream of authentication reads them
+SECRET_FIELDS = {"password", "hashed_password"}
+
+
+def with_roles(query):
+    """Eager loads the roles of the selected users, async sessions can't load them lazily."""
+    return query.options(selectinload(UserModel.user_roles).selectinload(UserRoleModel.role))
+
+
+async def _load_user(db: AsyncSession, email: str) -> Optional[dict]:
+    user = await db.scalar(with_roles(select(UserModel).where(UserModel.email == email, UserModel.deleted_at.is_(None))))
+    if user is None or user.is_active is False:
+        return None
+    row = UserSchema.model_validate(user).model_dump(mode="json", exclude=SECRET_FIELDS)
+    row["roles"] = live_role_names(user)
+    row["role"] = row["roles"][0] if row["roles"] else None
+    return row
+
+
+async def _load_token_version(db: AsyncSession, user_id: int) -> dict:
+    result = await db.execute(select(UserModel.token_version, UserModel.is_active, UserModel.deleted_at).where(UserModel.id == user_id))
+    row = result.first()
+    # Missing, deleted and deactivated users match no token, cached like any other version
+    if row is None or row.deleted_at is not None or row.is_active is False:
+        return {"token_version": None}
+    return {"token_version": row.token_version}
+
+
+async def current_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    row = await entity_cache.aget(TOKEN_VERSION_NAMESPACE, user_id)
+    if row is None:
+        generation = entity_cache.generation()
+        row = await _load_token_version(db, user_id)
+        await entity_cache.aset(TOKEN_VERSION_NAMESPACE, user_id, row, generation)
+    return row["token_version"]
+
+
+async def _user_from_subject(db: AsyncSession, token_data: TokenData, credentials_exception: HTTPException) -> UserSchema:
+    # Tokens issued before they carried claims, resolved from the cached user row
+    row = await entity_cache.aget(AUTH_USER_NAMESPACE, token_data.username)
+    if row is None:
+        generation = entity_cache.generation()
+        row = await _load_user(db, token_data.username)
+        if row is None:
+            raise credentials_exception
+        await entity_cache.aset(AUTH_USER_NAMESPACE, token_data.username, row, generation)
+    return UserSchema(password="", **row)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserSchema:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     token_data = verify_access_token(token, credentials_exception)
-    user = db.query(UserModel).filter(UserModel.email == token_data.username).first()
-    print(f"User ==>: {user}")
-    if user is None:
-        raise credentials_exception
-    return UserSchema.from_orm(user)
-
+    if token_data.user_id is None:
+        return await _user_from_subject(db, token_data, credentials_exception)
 
+    # Identity and roles come from the verified claims, only revocation is checked
+    if await current_token_version(db, token_data.user_id) != token_data.token_version:
+        raise credentials_exception
+    return UserSchema(
+        id=token_data.user_id,
+        email=token_data.username,
+        password="",
+        role=token_data.roles[0] if token_data.roles else None,
+        roles=token_data.roles,
+    )
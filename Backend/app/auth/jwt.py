@@ -1,17 +1,28 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from core.config import Settings
 
 settings = Settings()
 
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    # Unset on tokens issued before claims were added, those still need a user lookup
+    user_id: Optional[int] = None
+    roles: List[str] = []
+    token_version: Optional[int] = None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -23,15 +34,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_access_token(token: str, credentials_exception):
+def live_role_names(user) -> List[str]:
+    """Names of the roles of a `models.user.User` whose assignment and role are both live."""
+    return [
+        user_role.role.role_name for user_role in user.user_roles
+        if user_role.deleted_at is None and user_role.role is not None and user_role.role.deleted_at is None
+    ]
+
+def create_token_pair(user) -> Token:
+    """Access and refresh tokens for a `models.user.User` with its roles loaded."""
+    claims = {
+        "sub": user.email,
+        "uid": user.id,
+        "roles": live_role_names(user),
+        "ver": user.token_version or 0,
+    }
+    access_token = create_access_token({**claims, "type": ACCESS_TOKEN_TYPE})
+    refresh_token = create_access_token(
+        {"sub": user.email, "uid": user.id, "ver": claims["ver"], "type": REFRESH_TOKEN_TYPE},
+        expires_delta=timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES),
+    )
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+def verify_access_token(token: str, credentials_exception, token_type: str = ACCESS_TOKEN_TYPE):
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        # Tokens without a type predate refresh tokens and are access tokens
+        if payload.get("type", ACCESS_TOKEN_TYPE) != token_type:
+            raise credentials_exception
+        token_data = TokenData(username=username, user_id=payload.get("uid"), roles=payload.get("roles", []), token_version=payload.get("ver"))
     except JWTError:
         raise credentials_exception
     return token_data
-
-
@@ -0,0 +1,47 @@
+import asyncio
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from core.config import Settings
+
+settings = Settings()
+
+# Hashes under older schemes or parameters still verify and are flagged for rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a few threads hash in parallel while the event loop keeps
+# serving. Bounded so a login burst queues here instead of taking every threadpool worker.
+password_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return pwd_context.hash(secrets.token_urlsafe(16))
+
+
+def _verify_and_update(password: str, hashed_password: Optional[str], legacy_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if hashed_password and pwd_context.identify(hashed_password):
+        return pwd_context.verify_and_update(password, hashed_password)
+    # Without a usable hash the same bcrypt work is done against a throwaway one, so the
+    # response time never tells unknown accounts from known ones
+    pwd_context.verify(password, _dummy_hash())
+    # Users created before passwords were hashed only have the plaintext column
+    if legacy_password is None or not secrets.compare_digest(legacy_password.encode(), password.encode()):
+        return False, None
+    return True, pwd_context.hash(password)
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_executor, pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: Optional[str], legacy_password: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    """Whether `password` matches, and the hash to store instead when it needs upgrading.
+
+    The new hash is set for plaintext legacy passwords and for hashes made with
+    parameters that are no longer current, None otherwise. Called with no hash
+    at all it costs as much as a real check and returns False.
+    """
+    return await asyncio.get_running_loop().run_in_executor(password_executor, _verify_and_update, password, hashed_password, legacy_password)
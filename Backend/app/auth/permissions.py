@@ -0,0 +1,61 @@
+from enum import IntFlag
+from typing import Dict
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.base import get_async_db
+from auth.dependencies import get_current_user
+from models.role import Role as RoleModel
+from schemas.user import User as UserSchema
+from services.entity_cache import ROLE_PERMISSIONS_NAMESPACE, entity_cache
+
+# The whole roles table is one cache entry, it is small and read on every checked request
+ROLE_PERMISSIONS_KEY = "all"
+
+
+class Permission(IntFlag):
+    """Bits of `roles.permissions`. Values are stored, never renumber them."""
+    READ_DOCUMENTS = 1 << 0
+    WRITE_DOCUMENTS = 1 << 1
+    READ_USERS = 1 << 2
+    MANAGE_USERS = 1 << 3
+    MANAGE_ROLES = 1 << 4
+    READ_LOGS = 1 << 5
+    WRITE_LOGS = 1 << 6
+    VIEW_DASHBOARD = 1 << 7
+
+
+ALL_PERMISSIONS = Permission(sum(Permission))
+STANDARD_USER_PERMISSIONS = Permission.READ_DOCUMENTS | Permission.WRITE_DOCUMENTS | Permission.READ_USERS | Permission.WRITE_LOGS
+
+
+async def _load_role_permissions(db: AsyncSession) -> Dict[str, int]:
+    result = await db.execute(select(RoleModel.role_name, RoleModel.permissions).where(RoleModel.deleted_at.is_(None)))
+    return {row.role_name: row.permissions or 0 for row in result}
+
+
+async def role_permissions(db: AsyncSession) -> Dict[str, int]:
+    """Permission bits by role name, from the cache unless a role changed."""
+    permissions = await entity_cache.aget(ROLE_PERMISSIONS_NAMESPACE, ROLE_PERMISSIONS_KEY)
+    if permissions is None:
+        generation = entity_cache.generation()
+        permissions = await _load_role_permissions(db)
+        await entity_cache.aset(ROLE_PERMISSIONS_NAMESPACE, ROLE_PERMISSIONS_KEY, permissions, generation)
+    return permissions
+
+
+async def user_permissions(user: UserSchema, db: AsyncSession) -> Permission:
+    permissions = await role_permissions(db)
+    granted = 0
+    for role_name in user.roles:
+        granted |= permissions.get(role_name, 0)
+    return Permission(granted)
+
+
+def require_permission(permission: Permission):
+    """Dependency resolving the current user and rejecting it with 403 unless it has every bit of `permission`."""
+    async def dependency(current_user: UserSchema = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> UserSchema:
+        if permission & ~await user_permissions(current_user, db):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+        return current_user
+    return dependency
@@ -15,4 +15,14 @@ beat_schedule = {
         'schedule': crontab(minute='*/2'),
         'args': ('Hola, mundo!',) # Argumentos que se pasarán a la tarea (opcional)
     },
+    'refrescar-resumen-dashboard': {
+        # Recalcula la vista materializada de /dashboard/summary
+        'task': 'tasks.refresh_dashboard_summary',
+        'schedule': crontab(minute='*/5'),
+    },
+    'mantener-particiones-logs': {
+        # Crea las particiones mensuales de logs y elimina o archiva las vencidas
+        'task': 'tasks.maintain_log_partitions',
+        'schedule': crontab(hour=3, minute=15),
+    },
 }
\ No newline at end of file
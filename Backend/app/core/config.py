@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 
@@ -12,10 +13,51 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 7 * 24 * 60
+
+    # Password hashing, run on its own thread pool so logins never block the event loop
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
 
     DATABASE_URL: str
     SUPABASE_URL: str
     SUPABASE_KEY: str
-    
+    # Service role key, only the Celery workers use it, for the maintenance RPCs the API roles may not call
+    SUPABASE_SERVICE_KEY: Optional[str] = None
+
+    # Read replicas, comma separated PostgREST URLs taking the same key. Listings and other
+    # read-only service calls go to one of them, except for a client's reads within
+    # READ_YOUR_WRITES_SECONDS of its own write, which stay on SUPABASE_URL.
+    SUPABASE_REPLICA_URLS: Optional[str] = None
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # Download accounting: buffered events are flushed to the DB on this interval
+    DOWNLOAD_FLUSH_INTERVAL_SECONDS: float = 10.0
+
+    # Local disk cache for downloaded document files
+    DOCUMENT_CACHE_DIR: str = "./document_cache"
+    DOCUMENT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # logs is partitioned by month of created_at. The daily maintenance task keeps
+    # LOG_PARTITIONS_AHEAD months of empty partitions ready and removes the ones older than
+    # LOG_RETENTION_MONTHS, moving them to the logs_archive schema instead when LOG_ARCHIVE_EXPIRED is set.
+    LOG_RETENTION_MONTHS: int = 12
+    LOG_PARTITIONS_AHEAD: int = 3
+    LOG_ARCHIVE_EXPIRED: bool = False
+
+    # Cache for single document/user/log lookups, shared through Redis when a URL is set
+    ENTITY_CACHE_TTL_SECONDS: float = 60.0
+    ENTITY_CACHE_MAX_ENTRIES: int = 10000
+    REDIS_CACHE_URL: Optional[str] = None
+
+    # Instrumentation: calls and requests slower than these are logged, and so are requests
+    # making more than MANY_CALLS_THRESHOLD SQL/PostgREST calls. SQL_ECHO prints every statement.
+    SLOW_SQL_MS: float = 200.0
+    SLOW_POSTGREST_MS: float = 500.0
+    SLOW_STORAGE_MS: float = 2000.0
+    SLOW_REQUEST_MS: float = 1000.0
+    SLOW_TASK_MS: float = 30000.0
+    MANY_CALLS_THRESHOLD: int = 20
+    SQL_ECHO: bool = False
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
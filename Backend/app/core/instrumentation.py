@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Dict, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from core.config import Settings
+
+settings = Settings()
+
+logger = logging.getLogger("instashare.instrumentation")
+
+SQL = "sql"
+POSTGREST = "postgrest"
+STORAGE = "storage"
+
+SLOW_CALL_THRESHOLDS_MS = {
+    SQL: settings.SLOW_SQL_MS,
+    POSTGREST: settings.SLOW_POSTGREST_MS,
+    STORAGE: settings.SLOW_STORAGE_MS,
+}
+
+
+class CallStats:
+    """Number and total duration of outgoing calls made on behalf of one request or task."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.counts: Dict[str, int] = {SQL: 0, POSTGREST: 0, STORAGE: 0}
+        self.durations_ms: Dict[str, float] = {SQL: 0.0, POSTGREST: 0.0, STORAGE: 0.0}
+        # Sync clients may run in worker threads of the same request
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, duration_ms: float) -> None:
+        with self._lock:
+            self.counts[kind] += 1
+            self.durations_ms[kind] += duration_ms
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        metrics = [
+            f'{kind};desc="{kind} x{self.counts[kind]}";dur={self.durations_ms[kind]:.1f}'
+            for kind in self.counts
+            if self.counts[kind]
+        ]
+        metrics.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(metrics)
+
+    def summary(self) -> str:
+        calls = " ".join(f"{kind}={self.counts[kind]}/{self.durations_ms[kind]:.1f}ms" for kind in self.counts)
+        return f"{self.name} {self.elapsed_ms():.1f}ms {calls}"
+
+
+_current: ContextVar[Optional[CallStats]] = ContextVar("instashare_call_stats", default=None)
+
+
+def start(name: str) -> Token:
+    return _current.set(CallStats(name))
+
+
+def current() -> Optional[CallStats]:
+    return _current.get()
+
+
+def finish(token: Token, slow_ms: float) -> Optional[CallStats]:
+    """Stops collecting for the request or task started with `token`, logging it when it was slow or chatty."""
+    stats = _current.get()
+    _current.reset(token)
+    if stats is None:
+        return None
+    if stats.elapsed_ms() > slow_ms:
+        logger.warning("Slow %s", stats.summary())
+    elif stats.counts[SQL] + stats.counts[POSTGREST] > settings.MANY_CALLS_THRESHOLD:
+        # The usual sign of a query per row
+        logger.warning("Many calls in %s", stats.summary())
+    return stats
+
+
+def record(kind: str, duration_ms: float, description: str) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.add(kind, duration_ms)
+    if duration_ms > SLOW_CALL_THRESHOLDS_MS[kind]:
+        logger.warning("Slow %s call %.1fms in %s: %s", kind, duration_ms, stats.name if stats else "-", description[:500])
+
+
+# --- SQLAlchemy, every engine including the sync side of async ones ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("instashare_query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["instashare_query_started"].pop()
+    record(SQL, (time.perf_counter() - started) * 1000, statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute
+    # Not every attribute is set for errors raised outside of a statement
+    if getattr(exception_context, "execution_context", None) is not None and exception_context.connection is not None:
+        started = exception_context.connection.info.get("instashare_query_started")
+        if started:
+            started.pop()
+
+
+# --- Supabase HTTP clients ---
+
+def _timed_hooks(kind: str):
+    def on_request(request: httpx.Request) -> None:
+        request.extensions["instashare_started"] = time.perf_counter()
+
+    def on_response(response: httpx.Response) -> None:
+        # Time to the response headers; the body is left for the caller to stream or read
+        started = response.request.extensions.get("instashare_started")
+        if started is not None:
+            record(kind, (time.perf_counter() - started) * 1000, f"{response.request.method} {response.request.url.path} {response.status_code}")
+
+    return on_request, on_response
+
+
+def _instrument_sessions(client) -> None:
+    for kind, session in ((POSTGREST, client.postgrest.session), (STORAGE, client.storage.session)):
+        if getattr(session, "instashare_instrumented", False):
+            continue
+        on_request, on_response = _timed_hooks(kind)
+        session.event_hooks["request"].append(on_request)
+        session.event_hooks["response"].append(on_response)
+        session.instashare_instrumented = True
+
+
+def instrument_supabase_client(client) -> None:
+    """Times every PostgREST and storage request made through `client`."""
+    _instrument_sessions(client)
+    # supabase drops its PostgREST and storage clients on sign in, sign out and
+    # token refresh (create_user signs up through the same client), and builds
+    # new, uninstrumented ones on next use. Our listener runs after its own.
+    client.auth.on_auth_state_change(lambda event, session: _instrument_sessions(client))
+
+
+# --- Celery tasks ---
+
+_task_tokens: Dict[str, Token] = {}
+
+
+def instrument_celery() -> None:
+    from celery.signals import task_postrun, task_prerun
+
+    @task_prerun.connect(weak=False)
+    def _task_started(task_id=None, task=None, **kwargs):
+        _task_tokens[task_id] = start(f"task {task.name}")
+
+    @task_postrun.connect(weak=False)
+    def _task_finished(task_id=None, task=None, **kwargs):
+        token = _task_tokens.pop(task_id, None)
+        if token is not None:
+            stats = finish(token, settings.SLOW_TASK_MS)
+            logger.info("Finished %s", stats.summary())
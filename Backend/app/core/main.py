@@ -1,21 +1,34 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, APIRouter, Form, File
+import asyncio
+import logging
+import orjson
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, APIRouter, Form, File, Request, Response, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 from core.config import Settings
-from db.base import get_db, SessionLocal, Base, engine, get_supabase_client
+from core import instrumentation
+from db.base import get_async_db, SessionLocal, Base, engine, get_supabase_client
+from db.routing import SAFE_METHODS, arecord_write, get_replica_supabase_client
 from db.seed import create_initial_data
 from db.clean import clean_db_tables
-from auth.jwt import create_access_token, Token
-from auth.dependencies import get_current_user
+from auth.jwt import REFRESH_TOKEN_TYPE, RefreshTokenRequest, Token, create_token_pair, verify_access_token
+from auth.dependencies import get_current_user, with_roles
+from auth.passwords import verify_password
+from auth.permissions import Permission, require_permission
 
-from schemas.user import User, UserCreate, UserUpdate
-from schemas.document import Document, DocumentCreate, DocumentUpdate
+from schemas.user import User, UserCreate, UserUpdate, UserUploadedDocuments
+from schemas.document import Document, DocumentCreate, DocumentUpdate, DocumentDownloadStats, DocumentFilter, DocumentSortField
 from schemas.role import Role, RoleCreate, RoleUpdate
-from schemas.log import LogBase, Log, LogCreate, LogUpdate
+from schemas.log import LogBase, Log, LogCreate, LogFilter, LogUpdate
 from schemas.document_shared import DocumentShared, DocumentSharedCreate, DocumentSharedUpdate
 from schemas.user_role import UserRole, UserRoleCreate, UserRoleUpdate
+from schemas.dashboard import DashboardSummary
+from schemas.user_storage_usage import UserStorageUsage
+from schemas.pagination import Page, CountMode, SortOrder
+from schemas.field_selection import InvalidFieldsError, parse_fields, partial_schema
+from schemas.batch import BatchGetRequest, BatchGetResponse
 
 from models.user import User as UserModel # To query user for authentication
 
@@ -23,19 +36,26 @@ from services.document_service import DocumentService
 from services.user_service import UserService
 from services.role_service import RoleService
 from services.log_service import LogService
-from typing import List, Optional
+from services.dashboard_service import DashboardService
+from services.download_tracker import download_tracker
+from services.document_cache import document_etag, document_file_cache
+from services.pagination import InvalidCursorError
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from supabase import Client
 
 from celery import Celery
 from celery.schedules import crontab
 from datetime import date
-from passlib.context import CryptContext
 from gotrue.errors import AuthApiError
 
 
 settings = Settings()
 
+logger = logging.getLogger("instashare.api")
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -48,8 +68,117 @@ app.add_middleware(
         allow_credentials=True,
         allow_methods=["*"],  # Allows all HTTP methods (GET, POST, PUT, DELETE, etc.)
         allow_headers=["*"],  # Allows all headers
+        expose_headers=["X-Next-Cursor", "X-Total-Count", "Server-Timing"],  # Lets the browser read the pagination and timing headers
     )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    # SQL, PostgREST and storage calls made while handling the request, totals in Server-Timing.
+    # Streamed bodies are produced after the headers are sent, their calls are logged but not in the header.
+    token = instrumentation.start(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+        stats = instrumentation.current()
+        response.headers["Server-Timing"] = stats.server_timing()
+    finally:
+        instrumentation.finish(token, settings.SLOW_REQUEST_MS)
+    return response
+
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    # Read-your-writes for replica routing: the client's next reads go to the primary.
+    # Rejected requests (4xx) wrote nothing, failed ones may have written part of it.
+    response = await call_next(request)
+    if request.method not in SAFE_METHODS and not 400 <= response.status_code < 500:
+        await arecord_write(request)
+    return response
+
+# Listings are keyset-paginated, the cursor for the next page travels in a header,
+# as does the total row count when the client asked for one with `count=`
+MAX_PAGE_SIZE = 1000
+
+def _page_items(response: Response, page: Page) -> list:
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.total_count is not None:
+        response.headers["X-Total-Count"] = str(page.total_count)
+    return page.items
+
+# `fields=` selections never expose these
+USER_PRIVATE_FIELDS = ("password", "hashed_password")
+
+def _select_fields(response: Response, content, schema, fields: Optional[List[str]]):
+    """Serialize `content` with only the selected fields, or leave it to the route's response_model."""
+    if fields is None:
+        return content
+    model = partial_schema(schema, tuple(fields))
+    if isinstance(content, list):
+        data = [model.model_validate(item).model_dump(mode="json") for item in content]
+    else:
+        data = model.model_validate(content).model_dump(mode="json")
+    # Returning a response directly skips response_model, carry over headers set by the route
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return JSONResponse(data, headers=headers)
+
+
+# `Accept: application/x-ndjson` on a listing streams the whole listing from `cursor`
+# to the end, one JSON object per line, instead of returning a single page. The status
+# is sent before the rows, a failure midway ends the stream with one
+# {"error": ..., "cursor": ...} line, the cursor to resume from.
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH_SIZE = 1000
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def _ndjson_response(fetch_page: Callable[[Optional[str], str], Awaitable[Page]], cursor: Optional[str], count: str, schema, fields: Optional[List[str]], exclude: Iterable[str] = ()) -> StreamingResponse:
+    """Stream a keyset-paginated listing one batch at a time, only one batch is ever in memory."""
+    project = _row_projector(schema, fields, exclude)
+    # The first batch is read before responding so a bad cursor is still a 400
+    first_page = await fetch_page(cursor, count)
+    headers = {"X-Total-Count": str(first_page.total_count)} if first_page.total_count is not None else None
+
+    async def lines():
+        page = first_page
+        while True:
+            yield b"".join(orjson.dumps(project(row), default=str, option=orjson.OPT_APPEND_NEWLINE) for row in page.items)
+            if not page.next_cursor:
+                return
+            try:
+                page = await fetch_page(page.next_cursor, CountMode.none.value)
+            except Exception as e:
+                logger.exception("NDJSON listing failed at cursor %s", page.next_cursor)
+                yield orjson.dumps({"error": str(e), "cursor": page.next_cursor}, option=orjson.OPT_APPEND_NEWLINE)
+                return
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+# Listings skip model construction and response_model validation. Rows come from our own
+# tables through PostgREST, already JSON-typed, they are only trimmed to the schema's
+# fields and encoded with orjson.
+def _row_projector(schema, fields: Optional[List[str]], exclude: Iterable[str] = ()) -> Callable[[Any], dict]:
+    # Same keys as the response_model output: fields marked exclude=True are left out, and
+    # keys missing from a row take the field default as validation would give them
+    model_fields = schema.model_fields
+    names = fields or [name for name, field in model_fields.items() if not field.exclude]
+    columns = [name for name in names if name not in exclude]
+    defaults = {
+        name: None if model_fields[name].is_required() else model_fields[name].get_default(call_default_factory=True)
+        for name in columns
+    }
+
+    def project(row) -> dict:
+        if isinstance(row, dict):
+            return {column: row.get(column, defaults[column]) for column in columns}
+        return {column: getattr(row, column, defaults[column]) for column in columns}
+    return project
+
+def _rows_response(response: Response, rows: list, schema, fields: Optional[List[str]], exclude: Iterable[str] = ()) -> Response:
+    project = _row_projector(schema, fields, exclude)
+    content = orjson.dumps([project(row) for row in rows], default=str)
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content, media_type="application/json", headers=headers)
+
 
 @app.on_event("startup")
 def on_startup():
@@ -72,6 +201,21 @@ async def shutdown_event():
     finally:
         db.close()
 
+@app.on_event("startup")
+async def start_download_flusher():
+    app.state.download_flusher = asyncio.create_task(
+        download_tracker.run_periodic_flush(get_supabase_client, settings.DOWNLOAD_FLUSH_INTERVAL_SECONDS)
+    )
+
+@app.on_event("shutdown")
+async def stop_download_flusher():
+    app.state.download_flusher.cancel()
+    try:
+        # Don't lose the events buffered since the last periodic flush
+        await asyncio.to_thread(download_tracker.flush, get_supabase_client)
+    except Exception as e:
+        print(f"Error flushing download events on shutdown: {e}")
+
 @app.get("/", tags=["Health Check"])
 async def read_root():
     return {"message": "Welcome to InstaShare Backend!"}
@@ -86,34 +230,64 @@ async def health_check():
 
 # New Token Endpoint
 @app.post("/token", response_model=Token, tags=["Authentication"])
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserModel).filter(UserModel.email == form_data.username).first()
-    if not user or user.password != form_data.password: # In a real app, hash and verify passwords
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(with_roles(select(UserModel).where(UserModel.email == form_data.username, UserModel.deleted_at.is_(None))))
+    password_valid, new_hash = (False, None)
+    if user and user.is_active is not False:
+        password_valid, new_hash = await verify_password(form_data.password, user.hashed_password, user.password)
+    else:
+        # As slow as a wrong password, unknown and inactive emails can't be told apart by timing
+        await verify_password(form_data.password, None)
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    if new_hash:
+        # Legacy plaintext or outdated hash parameters, upgraded now that the password is known
+        user.hashed_password = new_hash
+        user.password = None
+        await db.commit()
+        # The stored token_version moves with the password columns
+        await db.refresh(user, ["token_version"])
+    return create_token_pair(user)
+
+@app.post("/token/refresh", response_model=Token, tags=["Authentication"])
+async def refresh_access_token(refresh_request: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_data = verify_access_token(refresh_request.refresh_token, credentials_exception, REFRESH_TOKEN_TYPE)
+    # Always against the database, the new access token carries the current roles
+    user = await db.scalar(with_roles(select(UserModel).where(UserModel.id == token_data.user_id, UserModel.deleted_at.is_(None))))
+    if not user or user.is_active is False or user.token_version != token_data.token_version:
+        raise credentials_exception
+    return create_token_pair(user)
 
 ###---  Main app services ------------------------------------------------------------
 
 # Dependency to get DocumentService
-async def get_document_service(supabase: Client = Depends(get_supabase_client)) -> DocumentService:
-    return DocumentService(supabase)
+async def get_document_service(supabase: Client = Depends(get_supabase_client), replica: Client = Depends(get_replica_supabase_client)) -> DocumentService:
+    return DocumentService(supabase, replica)
 
 # Dependency to get UserService
-async def get_user_service(supabase: Client = Depends(get_supabase_client)) -> UserService:
-    return UserService(supabase)
+async def get_user_service(supabase: Client = Depends(get_supabase_client), replica: Client = Depends(get_replica_supabase_client)) -> UserService:
+    return UserService(supabase, replica)
 
 # Dependency to get RoleService
 async def get_role_service(supabase: Client = Depends(get_supabase_client)) -> RoleService:
     return RoleService(supabase)
 
 # Dependency to get LogService
-async def get_log_service(supabase: Client = Depends(get_supabase_client)) -> LogService:
-    return LogService(supabase)
+async def get_log_service(supabase: Client = Depends(get_supabase_client), replica: Client = Depends(get_replica_supabase_client)) -> LogService:
+    return LogService(supabase, replica)
+
+# Dependency to get DashboardService
+async def get_dashboard_service(supabase: Client = Depends(get_supabase_client), replica: Client = Depends(get_replica_supabase_client)) -> DashboardService:
+    return DashboardService(supabase, replica)
 
 # Document Endpoints
 @app.post("/documents/upload_document/{document_id}", response_model=Document)
@@ -185,58 +359,213 @@ async def update_document_info_authenticated(document_id: int, document: Documen
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/documents/", response_model=List[Document])
-async def list_all_documents(document_service: DocumentService = Depends(get_document_service)):
+async def list_all_documents(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: DocumentFilter = Depends(), sort: DocumentSortField = DocumentSortField.id, order: SortOrder = SortOrder.asc, document_service: DocumentService = Depends(get_document_service)):
     try:
-        documents = await document_service.list_documents()
-        return documents
+        selected_fields = parse_fields(fields, Document)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: document_service.list_documents(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, sort=sort.value, descending=order == SortOrder.desc, raw=True), cursor, count.value, Document, selected_fields)
+        page = await document_service.list_documents(limit, cursor, fields=selected_fields, count=count.value, filters=filters, sort=sort.value, descending=order == SortOrder.desc, raw=True)
+        return _rows_response(response, _page_items(response, page), Document, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/documents/authenticated/", response_model=List[Document], tags=["Documents", "Authenticated"])
-async def list_all_documents_authenticated(document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+async def list_all_documents_authenticated(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: DocumentFilter = Depends(), sort: DocumentSortField = DocumentSortField.id, order: SortOrder = SortOrder.asc, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        selected_fields = parse_fields(fields, Document)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: document_service.list_documents(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, sort=sort.value, descending=order == SortOrder.desc, raw=True), cursor, count.value, Document, selected_fields)
+        page = await document_service.list_documents(limit, cursor, fields=selected_fields, count=count.value, filters=filters, sort=sort.value, descending=order == SortOrder.desc, raw=True)
+        return _rows_response(response, _page_items(response, page), Document, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+def _batch_get_response(ids: List[int], results: list) -> dict:
+    return {"items": results, "missing": [item_id for item_id, result in zip(ids, results) if result is None]}
+
+@app.post("/documents/batch_get", response_model=BatchGetResponse[Document])
+async def batch_get_documents(request: BatchGetRequest, document_service: DocumentService = Depends(get_document_service)):
+    try:
+        documents = await document_service.get_documents_by_ids(request.ids)
+        return _batch_get_response(request.ids, documents)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.post("/documents/authenticated/batch_get", response_model=BatchGetResponse[Document], tags=["Documents", "Authenticated"])
+async def batch_get_documents_authenticated(request: BatchGetRequest, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
     try:
-        documents = await document_service.list_documents()
-        return documents
+        documents = await document_service.get_documents_by_ids(request.ids)
+        return _batch_get_response(request.ids, documents)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/search", response_model=List[Document])
+async def search_documents(response: Response, q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, document_service: DocumentService = Depends(get_document_service)):
+    try:
+        page = await document_service.search_documents(q, limit, cursor)
+        return _page_items(response, page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/authenticated/search", response_model=List[Document], tags=["Documents", "Authenticated"])
+async def search_documents_authenticated(response: Response, q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        page = await document_service.search_documents(q, limit, cursor)
+        return _page_items(response, page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/authenticated/shared_with_me", response_model=List[Document], tags=["Documents", "Authenticated"])
+async def list_documents_shared_with_me(response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, count: CountMode = CountMode.none, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        page = await document_service.list_documents_shared_with_user(current_user.id, limit, cursor, count=count.value)
+        return _page_items(response, page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/documents/{document_id}", response_model=Document)
-async def get_document_by_id(document_id: int, document_service: DocumentService = Depends(get_document_service)):
+async def get_document_by_id(document_id: int, response: Response, fields: Optional[str] = None, document_service: DocumentService = Depends(get_document_service)):
     try:
-        document = await document_service.get_document(document_id)
+        selected_fields = parse_fields(fields, Document)
+        document = await document_service.get_document(document_id, fields=selected_fields)
         if not document:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
-        return document
+        return _select_fields(response, document, Document, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/documents/authenticated/{document_id}", response_model=Document, tags=["Documents", "Authenticated"])
-async def get_document_by_id_authenticated(document_id: int, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+async def get_document_by_id_authenticated(document_id: int, response: Response, fields: Optional[str] = None, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
     try:
-        document = await document_service.get_document(document_id)
+        selected_fields = parse_fields(fields, Document)
+        document = await document_service.get_document(document_id, fields=selected_fields)
         if not document:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
-        return document
+        return _select_fields(response, document, Document, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@app.get("/documents/{document_id}/shared_by/users", response_model=List[User])
+@app.get("/documents/{document_id}/shared_by/users", response_model=List[User], response_model_exclude={"__all__": set(USER_PRIVATE_FIELDS)})
 async def get_document_shared_users(document_id: int, document_service: DocumentService = Depends(get_document_service)):
     try:
         shared_info = await document_service.get_shared_users_for_document(document_id)
         if not shared_info:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found or not shared with any users")
         return shared_info
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@app.get("/documents/authenticated/{document_id}/shared_by/users", response_model=List[User], tags=["Documents", "Authenticated"])
+@app.get("/documents/authenticated/{document_id}/shared_by/users", response_model=List[User], tags=["Documents", "Authenticated"], response_model_exclude={"__all__": set(USER_PRIVATE_FIELDS)})
 async def get_document_shared_users_authenticated(document_id: int, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
     try:
         shared_info = await document_service.get_shared_users_for_document(document_id)
         if not shared_info:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found or not shared with any users")
         return shared_info
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison, a W/ prefix still matches
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+class _LeasedFileResponse(FileResponse):
+    """Serves a file leased from the document cache, the lease ends with the response."""
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            document_file_cache.release(self.path)
+
+async def _document_download_response(document_id: int, request: Request, document_service: DocumentService, user_id: Optional[int] = None) -> Response:
+    document = await document_service.get_document(document_id)
+    if not document or not document.file_url:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    etag = document_etag(document)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cached_file = await document_service.get_document_file(document)
+    filename = os.path.basename(document.file_url)
+    if isinstance(cached_file, bytes):
+        await document_service.record_document_download(document_id, user_id)
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return Response(cached_file, media_type="application/octet-stream", headers=headers)
+    try:
+        await document_service.record_document_download(document_id, user_id)
+    except Exception:
+        document_file_cache.release(cached_file)
+        raise
+    # FileResponse lets servers that support it send the file with zero-copy sendfile
+    return _LeasedFileResponse(cached_file, filename=filename, headers=headers)
+
+@app.get("/documents/{document_id}/download")
+async def download_document(document_id: int, request: Request, document_service: DocumentService = Depends(get_document_service)):
+    try:
+        return await _document_download_response(document_id, request, document_service)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/authenticated/{document_id}/download", tags=["Documents", "Authenticated"])
+async def download_document_authenticated(document_id: int, request: Request, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        return await _document_download_response(document_id, request, document_service, current_user.id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/{document_id}/downloads", response_model=DocumentDownloadStats)
+async def get_document_downloads(document_id: int, document_service: DocumentService = Depends(get_document_service)):
+    try:
+        stats = await document_service.get_document_download_stats(document_id)
+        if not stats:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+        return stats
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/documents/authenticated/{document_id}/downloads", response_model=DocumentDownloadStats, tags=["Documents", "Authenticated"])
+async def get_document_downloads_authenticated(document_id: int, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        stats = await document_service.get_document_download_stats(document_id)
+        if not stats:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+        return stats
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -258,39 +587,74 @@ async def inicialize_document_compresion_job_authenticated(document_id: int, doc
 
 # User Endpoints
 @app.get("/users/", response_model=List[User])
-async def list_all_users(offset: int = 0, limit: int = 100, user_service: UserService = Depends(get_user_service)):
+async def list_all_users(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, user_service: UserService = Depends(get_user_service)):
     try:
-        users = await user_service.list_users(offset, limit)
-        print(f"Retured result {users}")
-        return users
+        selected_fields = parse_fields(fields, User, exclude=USER_PRIVATE_FIELDS)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: user_service.list_users(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, raw=True), cursor, count.value, User, selected_fields, exclude=USER_PRIVATE_FIELDS)
+        page = await user_service.list_users(limit, cursor, fields=selected_fields, count=count.value, raw=True)
+        return _rows_response(response, _page_items(response, page), User, selected_fields, exclude=USER_PRIVATE_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/users/authenticated/", response_model=List[User], tags=["Users", "Authenticated"])
-async def list_all_users_authenticated(offset: int = 0, limit: int = 100, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def list_all_users_authenticated(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
     try:
-        users = await user_service.list_users(offset, limit)
-        return users
+        selected_fields = parse_fields(fields, User, exclude=USER_PRIVATE_FIELDS)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: user_service.list_users(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, raw=True), cursor, count.value, User, selected_fields, exclude=USER_PRIVATE_FIELDS)
+        page = await user_service.list_users(limit, cursor, fields=selected_fields, count=count.value, raw=True)
+        return _rows_response(response, _page_items(response, page), User, selected_fields, exclude=USER_PRIVATE_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.post("/users/batch_get", response_model=BatchGetResponse[User])
+async def batch_get_users(request: BatchGetRequest, user_service: UserService = Depends(get_user_service)):
+    try:
+        users = await user_service.get_users_by_ids(request.ids)
+        return _batch_get_response(request.ids, users)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.post("/users/authenticated/batch_get", response_model=BatchGetResponse[User], tags=["Users", "Authenticated"])
+async def batch_get_users_authenticated(request: BatchGetRequest, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+    try:
+        users = await user_service.get_users_by_ids(request.ids)
+        return _batch_get_response(request.ids, users)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/users/{user_id}", response_model=User)
-async def get_user_by_id(user_id: int, user_service: UserService = Depends(get_user_service)):
+async def get_user_by_id(user_id: int, response: Response, fields: Optional[str] = None, user_service: UserService = Depends(get_user_service)):
     try:
-        user = await user_service.get_user(user_id)
+        selected_fields = parse_fields(fields, User, exclude=USER_PRIVATE_FIELDS)
+        user = await user_service.get_user(user_id, fields=selected_fields)
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        return user
+        return _select_fields(response, user, User, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise e if e.status_code == status.HTTP_404_NOT_FOUND else  HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/users/authenticated/{user_id}", response_model=User, tags=["Users", "Authenticated"])
-async def get_user_by_id_authenticated(user_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def get_user_by_id_authenticated(user_id: int, response: Response, fields: Optional[str] = None, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
     try:
-        user = await user_service.get_user(user_id)
+        selected_fields = parse_fields(fields, User, exclude=USER_PRIVATE_FIELDS)
+        user = await user_service.get_user(user_id, fields=selected_fields)
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        return user
+        return _select_fields(response, user, User, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -305,14 +669,9 @@ async def create_new_user(user: UserCreate, user_service: UserService = Depends(
 
 
 @app.post("/users/authenticated/", response_model=User, status_code=status.HTTP_201_CREATED, tags=["Users", "Authenticated"])
-async def create_user_authenticated(user_create: UserCreate, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def create_user_authenticated(user_create: UserCreate, user_service: UserService = Depends(get_user_service), current_user: User = Depends(require_permission(Permission.MANAGE_USERS))):
    ## 
     try:
-        # Hash the password before passing to service
-        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")        
-        hashed_password = pwd_context.hash(user_create.password)
-        user_create.hashed_password = hashed_password
-
         # Call the service to create the user, which now includes Supabase auth signup
         created_user = await user_service.create_user(user_create)
         # For response, exclude sensitive password fields
@@ -333,7 +692,7 @@ async def update_existing_user(user_id: int, user: UserUpdate, user_service: Use
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.put("/users/authenticated/{user_id}", response_model=User, tags=["Users", "Authenticated"])
-async def update_existing_user_authenticated(user_id: int, user: UserUpdate, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def update_existing_user_authenticated(user_id: int, user: UserUpdate, user_service: UserService = Depends(get_user_service), current_user: User = Depends(require_permission(Permission.MANAGE_USERS))):
     try:
         updated_user = await user_service.update_user(user_id, user)
         if not updated_user:
@@ -351,35 +710,81 @@ async def delete_existing_user(user_id: int, user_service: UserService = Depends
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.delete("/users/authenticated/{user_id}", response_model=dict, tags=["Users", "Authenticated"])
-async def delete_existing_user_authenticated(user_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def delete_existing_user_authenticated(user_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(require_permission(Permission.MANAGE_USERS))):
     try:
         result = await user_service.delete_user(user_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@app.get("/users/{user_id}/uploaded_documents", response_model=dict)
-async def get_user_uploaded_documents(user_id: int, user_service: UserService = Depends(get_user_service)):
+@app.get("/users/{user_id}/uploaded_documents", response_model=UserUploadedDocuments)
+async def get_user_uploaded_documents(user_id: int, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, status_counts: bool = False, user_service: UserService = Depends(get_user_service)):
     try:
-        user_documents = await user_service.get_documents_uploaded_by_user(user_id)
+        user_documents = await user_service.get_documents_uploaded_by_user(user_id, limit, cursor, status_counts=status_counts)
         if not user_documents:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or no documents uploaded")
+        if user_documents.next_cursor:
+            response.headers["X-Next-Cursor"] = user_documents.next_cursor
         return user_documents
+    except HTTPException as e:
+        raise e
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        raise e if e.status_code == status.HTTP_404_NOT_FOUND else  HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-@app.get("/users/authenticated/{user_id}/uploaded_documents", response_model=dict, tags=["Users", "Authenticated"])
-async def get_user_uploaded_documents_authenticated(user_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+@app.get("/users/authenticated/{user_id}/uploaded_documents", response_model=UserUploadedDocuments, tags=["Users", "Authenticated"])
+async def get_user_uploaded_documents_authenticated(user_id: int, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, status_counts: bool = False, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
     try:
-        user_documents = await user_service.get_documents_uploaded_by_user(user_id)
+        user_documents = await user_service.get_documents_uploaded_by_user(user_id, limit, cursor, status_counts=status_counts)
         if not user_documents:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or no documents uploaded")
+        if user_documents.next_cursor:
+            response.headers["X-Next-Cursor"] = user_documents.next_cursor
         return user_documents
+    except HTTPException as e:
+        raise e
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/users/{user_id}/shared_documents", response_model=List[Document])
+async def list_user_shared_documents(user_id: int, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, count: CountMode = CountMode.none, document_service: DocumentService = Depends(get_document_service)):
+    try:
+        page = await document_service.list_documents_shared_with_user(user_id, limit, cursor, count=count.value)
+        return _page_items(response, page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/users/authenticated/{user_id}/shared_documents", response_model=List[Document], tags=["Users", "Authenticated"])
+async def list_user_shared_documents_authenticated(user_id: int, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, count: CountMode = CountMode.none, document_service: DocumentService = Depends(get_document_service), current_user: User = Depends(get_current_user)):
+    try:
+        page = await document_service.list_documents_shared_with_user(user_id, limit, cursor, count=count.value)
+        return _page_items(response, page)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/users/{user_id}/storage_usage", response_model=UserStorageUsage)
+async def get_user_storage_usage(user_id: int, user_service: UserService = Depends(get_user_service)):
+    try:
+        return await user_service.get_storage_usage(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/users/authenticated/{user_id}/storage_usage", response_model=UserStorageUsage, tags=["Users", "Authenticated"])
+async def get_user_storage_usage_authenticated(user_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+    try:
+        return await user_service.get_storage_usage(user_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.post("/users/{user_id}/assign_role/{role_id}", response_model=dict)
-async def assign_role_to_user(user_id: int, role_id: int, user_service: UserService = Depends(get_user_service)):
+async def assign_role_to_user(user_id: int, role_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(require_permission(Permission.MANAGE_USERS))):
     try:
         result = await user_service.assign_role_to_user(user_id, role_id)
         return result
@@ -387,7 +792,7 @@ async def assign_role_to_user(user_id: int, role_id: int, user_service: UserServ
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.post("/users/authenticated/{user_id}/assign_role/{role_id}", response_model=dict, tags=["Users", "Authenticated"])
-async def assign_role_to_user_authenticated(user_id: int, role_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(get_current_user)):
+async def assign_role_to_user_authenticated(user_id: int, role_id: int, user_service: UserService = Depends(get_user_service), current_user: User = Depends(require_permission(Permission.MANAGE_USERS))):
     try:
         result = await user_service.assign_role_to_user(user_id, role_id)
         return result
@@ -396,7 +801,7 @@ async def assign_role_to_user_authenticated(user_id: int, role_id: int, user_ser
 
 # Role Endpoints
 @app.post("/roles/", response_model=Role)
-async def create_new_role(role: RoleCreate, role_service: RoleService = Depends(get_role_service)):
+async def create_new_role(role: RoleCreate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         created_role = await role_service.create_role(role)
         return created_role
@@ -404,7 +809,7 @@ async def create_new_role(role: RoleCreate, role_service: RoleService = Depends(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.post("/roles/authenticated/", response_model=Role, tags=["Roles", "Authenticated"])
-async def create_new_role_authenticated(role: RoleCreate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(get_current_user)):
+async def create_new_role_authenticated(role: RoleCreate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         created_role = await role_service.create_role(role)
         return created_role
@@ -412,7 +817,7 @@ async def create_new_role_authenticated(role: RoleCreate, role_service: RoleServ
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.put("/roles/{role_id}", response_model=Role)
-async def update_existing_role(role_id: int, role: RoleUpdate, role_service: RoleService = Depends(get_role_service)):
+async def update_existing_role(role_id: int, role: RoleUpdate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         updated_role = await role_service.update_role(role_id, role)
         if not updated_role:
@@ -422,7 +827,7 @@ async def update_existing_role(role_id: int, role: RoleUpdate, role_service: Rol
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.put("/roles/authenticated/{role_id}", response_model=Role, tags=["Roles", "Authenticated"])
-async def update_existing_role_authenticated(role_id: int, role: RoleUpdate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(get_current_user)):
+async def update_existing_role_authenticated(role_id: int, role: RoleUpdate, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         updated_role = await role_service.update_role(role_id, role)
         if not updated_role:
@@ -432,7 +837,7 @@ async def update_existing_role_authenticated(role_id: int, role: RoleUpdate, rol
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.delete("/roles/{role_id}", response_model=dict)
-async def delete_existing_role(role_id: int, role_service: RoleService = Depends(get_role_service)):
+async def delete_existing_role(role_id: int, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         result = await role_service.delete_role(role_id)
         return result
@@ -440,7 +845,7 @@ async def delete_existing_role(role_id: int, role_service: RoleService = Depends
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.delete("/roles/authenticated/{role_id}", response_model=dict, tags=["Roles", "Authenticated"])
-async def delete_existing_role_authenticated(role_id: int, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(get_current_user)):
+async def delete_existing_role_authenticated(role_id: int, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.MANAGE_ROLES))):
     try:
         result = await role_service.delete_role(role_id)
         return result
@@ -456,7 +861,7 @@ async def create_new_role_event(event: str, user_id: int, event_description: Opt
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.post("/roles/authenticated/event", response_model=Log, tags=["Roles", "Authenticated"])
-async def create_new_role_event_authenticated(event: str, user_id: int, event_description: Optional[str] = None, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(get_current_user)):
+async def create_new_role_event_authenticated(event: str, user_id: int, event_description: Optional[str] = None, role_service: RoleService = Depends(get_role_service), current_user: User = Depends(require_permission(Permission.WRITE_LOGS))):
     try:
         log_entry = await role_service.create_role_event(event, user_id, event_description)
         return log_entry
@@ -475,7 +880,7 @@ async def create_new_log(log_item: LogBase, log_service: LogService = Depends(ge
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.post("/logs/authenticated/", response_model=Log, tags=["Logs", "Authenticated"])
-async def create_new_log_authenticated(log_item: LogBase, log_service: LogService = Depends(get_log_service), current_user: User = Depends(get_current_user)):
+async def create_new_log_authenticated(log_item: LogBase, log_service: LogService = Depends(get_log_service), current_user: User = Depends(require_permission(Permission.WRITE_LOGS))):
     try:
         log_entry = await log_service.create_log(log_item.event, log_item.user_id, log_item.event_description)
         return log_entry
@@ -483,54 +888,104 @@ async def create_new_log_authenticated(log_item: LogBase, log_service: LogServic
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/", response_model=List[Log])
-async def list_all_logs(offset: int = 0, limit: int = 100, log_service: LogService = Depends(get_log_service)):
+async def list_all_logs(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: LogFilter = Depends(), log_service: LogService = Depends(get_log_service)):
     try:
-        logs = await log_service.list_logs(offset, limit)
-        return logs
+        selected_fields = parse_fields(fields, Log)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: log_service.list_logs(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, raw=True), cursor, count.value, Log, selected_fields)
+        page = await log_service.list_logs(limit, cursor, fields=selected_fields, count=count.value, filters=filters, raw=True)
+        return _rows_response(response, _page_items(response, page), Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/authenticated/", response_model=List[Log], tags=["Logs", "Authenticated"])
-async def list_all_logs_authenticated(offset: int = 0, limit: int = 100, log_service: LogService = Depends(get_log_service), current_user: User = Depends(get_current_user)):
+async def list_all_logs_authenticated(response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: LogFilter = Depends(), log_service: LogService = Depends(get_log_service), current_user: User = Depends(require_permission(Permission.READ_LOGS))):
     try:
-        logs = await log_service.list_logs(offset, limit)
-        return logs
+        selected_fields = parse_fields(fields, Log)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: log_service.list_logs(NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, raw=True), cursor, count.value, Log, selected_fields)
+        page = await log_service.list_logs(limit, cursor, fields=selected_fields, count=count.value, filters=filters, raw=True)
+        return _rows_response(response, _page_items(response, page), Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/{log_id}", response_model=Log)
-async def get_log_by_id(log_id: int, log_service: LogService = Depends(get_log_service)):
+async def get_log_by_id(log_id: int, response: Response, fields: Optional[str] = None, log_service: LogService = Depends(get_log_service)):
     try:
-        log_entry = await log_service.get_log(log_id)
+        selected_fields = parse_fields(fields, Log)
+        log_entry = await log_service.get_log(log_id, fields=selected_fields)
         if not log_entry:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log entry not found")
-        return log_entry
+        return _select_fields(response, log_entry, Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/authenticated/{log_id}", response_model=Log, tags=["Logs", "Authenticated"])
-async def get_log_by_id_authenticated(log_id: int, log_service: LogService = Depends(get_log_service), current_user: User = Depends(get_current_user)):
+async def get_log_by_id_authenticated(log_id: int, response: Response, fields: Optional[str] = None, log_service: LogService = Depends(get_log_service), current_user: User = Depends(require_permission(Permission.READ_LOGS))):
     try:
-        log_entry = await log_service.get_log(log_id)
+        selected_fields = parse_fields(fields, Log)
+        log_entry = await log_service.get_log(log_id, fields=selected_fields)
         if not log_entry:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log entry not found")
-        return log_entry
+        return _select_fields(response, log_entry, Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/user/{user_id}", response_model=List[Log])
-async def get_logs_for_user(user_id: int, offset: int = 0, limit: int = 100, log_service: LogService = Depends(get_log_service)):
+async def get_logs_for_user(user_id: int, response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: LogFilter = Depends(), log_service: LogService = Depends(get_log_service)):
     try:
-        logs = await log_service.get_logs_by_user(user_id, offset, limit)
-        return logs
+        selected_fields = parse_fields(fields, Log)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: log_service.get_logs_by_user(user_id, NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, raw=True), cursor, count.value, Log, selected_fields)
+        page = await log_service.get_logs_by_user(user_id, limit, cursor, fields=selected_fields, count=count.value, filters=filters, raw=True)
+        return _rows_response(response, _page_items(response, page), Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @app.get("/logs/authenticated/user/{user_id}", response_model=List[Log], tags=["Logs", "Authenticated"])
-async def get_logs_for_user_authenticated(user_id: int, offset: int = 0, limit: int = 100, log_service: LogService = Depends(get_log_service), current_user: User = Depends(get_current_user)):
+async def get_logs_for_user_authenticated(user_id: int, response: Response, request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, fields: Optional[str] = None, count: CountMode = CountMode.none, filters: LogFilter = Depends(), log_service: LogService = Depends(get_log_service), current_user: User = Depends(require_permission(Permission.READ_LOGS))):
+    try:
+        selected_fields = parse_fields(fields, Log)
+        if _wants_ndjson(request):
+            return await _ndjson_response(lambda page_cursor, page_count: log_service.get_logs_by_user(user_id, NDJSON_BATCH_SIZE, page_cursor, fields=selected_fields, count=page_count, filters=filters, raw=True), cursor, count.value, Log, selected_fields)
+        page = await log_service.get_logs_by_user(user_id, limit, cursor, fields=selected_fields, count=count.value, filters=filters, raw=True)
+        return _rows_response(response, _page_items(response, page), Log, selected_fields)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+# Dashboard Endpoints
+@app.get("/dashboard/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(recent_limit: int = Query(10, ge=0, le=100), dashboard_service: DashboardService = Depends(get_dashboard_service)):
+    try:
+        return await dashboard_service.get_summary(recent_limit)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.get("/dashboard/authenticated/summary", response_model=DashboardSummary, tags=["Dashboard", "Authenticated"])
+async def get_dashboard_summary_authenticated(recent_limit: int = Query(10, ge=0, le=100), dashboard_service: DashboardService = Depends(get_dashboard_service), current_user: User = Depends(require_permission(Permission.VIEW_DASHBOARD))):
     try:
-        logs = await log_service.get_logs_by_user(user_id, offset, limit)
-        return logs
+        return await dashboard_service.get_summary(recent_limit)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -1,10 +1,13 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
+from sqlalchemy import URL, create_engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from core.config import Settings
+from core.instrumentation import instrument_supabase_client
 
 load_dotenv()
 
@@ -21,15 +24,26 @@ if not DATABASE_URL:
     
     DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# The sync and async engines each keep their own pool. Together they stay
+# within the 30 connections per process the sync engine alone used to open.
+SYNC_POOL_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+}
+ASYNC_POOL_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+}
+
 engine = create_engine(
     DATABASE_URL,
-    echo=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
+    echo=settings.SQL_ECHO,
     connect_args={
         "sslmode": "require",
-    }
+    },
+    **SYNC_POOL_OPTIONS,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -43,10 +57,43 @@ def get_db():
         db.close()
 
 
+def async_database_url(url: str) -> URL:
+    """`url` with the asyncpg driver, whichever Postgres driver it was written for."""
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+@lru_cache(maxsize=1)
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Sessions for the paths that run on the event loop on every request (token issuing, get_current_user).
+
+    Built on first use, so importing this module (Alembic, Celery, tests
+    overriding get_async_db) does not need asyncpg installed.
+    """
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        connect_args={
+            "ssl": "require",
+        },
+        **ASYNC_POOL_OPTIONS,
+    )
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
 def get_supabase_client() -> Client:
     supabase_url = settings.SUPABASE_URL
     supabase_key = settings.SUPABASE_KEY
     supabase_client: Client = create_client(supabase_url, supabase_key)
+    instrument_supabase_client(supabase_client)
+    return supabase_client
+
+
+def get_service_supabase_client() -> Client:
+    """Client with the service role key, for the maintenance RPCs only Celery tasks may call."""
+    supabase_client: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY or settings.SUPABASE_KEY)
+    instrument_supabase_client(supabase_client)
     return supabase_client
 
 
@@ -0,0 +1,345 @@
+"""Synthetic data at production scale for load testing and query benchmarks.
+
+Bulk-loads users, roles, documents, shares and logs with COPY, in committed
+batches, on top of whatever the database already holds. Distributions are
+configurable and every table draws from its own generator seeded with
+`--seed`, so the same seed on the same starting database gives the same rows.
+Run from Backend/app against a migrated database:
+
+    python -m db.generate --database-url postgresql://postgres@localhost/instashare_load --users 100000 --documents 2000000 --logs 5000000 --seed 1
+
+Triggers stay on, so user_storage_usage and token versions come out consistent.
+"""
+import argparse
+import csv
+import io
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+from sqlalchemy import create_engine, make_url
+
+from auth.passwords import pwd_context
+from auth.permissions import ALL_PERMISSIONS, STANDARD_USER_PERMISSIONS, Permission
+from db.base import DATABASE_URL, settings
+from models.document import DocumentStatus
+
+USER_COLUMNS = ("id", "email", "phone", "username", "responsability", "hashed_password", "is_active", "created_at", "updated_at")
+USER_ROLE_COLUMNS = ("id", "role_id", "user_id", "assigned_date", "updated_at")
+DOCUMENT_COLUMNS = (
+    "id", "name", "type", "size", "size_bytes", "status", "file_url", "download_count", "last_downloaded_at",
+    "user_id", "created_at", "uploaded_at", "updated_at", "deleted_at",
+)
+SHARE_COLUMNS = ("id", "document_id", "user_id", "shared_date", "updated_at", "deleted_at")
+LOG_COLUMNS = ("id", "event", "user_id", "event_description", "created_at", "updated_at")
+
+NAME_WORDS = ("report", "invoice", "contract", "budget", "minutes", "design", "backup", "photo", "notes", "plan", "summary", "draft")
+LOG_EVENTS = {
+    "LOGIN": 50,
+    "Document Upload": 20,
+    "Document Download": 20,
+    "Document Compression Success": 8,
+    "Scheduled Task Error": 2,
+}
+
+# Share of generated users given one of the extra roles on top of "User"
+EXTRA_ROLE_RATIO = 0.2
+
+
+class GeneratorConfig(BaseModel):
+    """What to generate. Counts are new rows, distributions are relative weights."""
+    users: int = Field(10_000, ge=0)
+    documents: int = Field(200_000, ge=0)
+    logs: int = Field(500_000, ge=0)
+    # Shares per document are Poisson distributed around this mean
+    shares_per_document: float = Field(0.5, ge=0)
+    extra_roles: int = Field(8, ge=0)
+    admin_ratio: float = Field(0.01, ge=0, le=1)
+    # Zipf exponent of documents and logs per user, 0 spreads them evenly
+    owner_skew: float = Field(1.1, ge=0)
+    # File sizes are log-normal around the median
+    size_median_bytes: int = Field(256 * 1024, gt=0)
+    size_sigma: float = Field(1.5, ge=0)
+    deleted_ratio: float = Field(0.05, ge=0, le=1)
+    statuses: Dict[DocumentStatus, float] = {DocumentStatus.uploaded: 6, DocumentStatus.process: 1, DocumentStatus.downloaded: 3}
+    types: Dict[str, float] = {"pdf": 35, "docx": 20, "xlsx": 10, "pptx": 5, "png": 15, "jpg": 10, "zip": 5}
+    # Rows are spread over the `days` days before `end`, ids increasing with time as in production
+    days: int = Field(365, gt=0)
+    end: datetime = Field(default_factory=lambda: datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0))
+    password: str = "load-test-password"
+    seed: int = 0
+    batch_rows: int = Field(50_000, gt=0)
+
+
+def table_rng(config: GeneratorConfig, table: str) -> random.Random:
+    """Generator of `table`, independent of how many rows the other tables get."""
+    return random.Random(f"{config.seed}:{table}")
+
+
+def _timestamps(rng: random.Random, config: GeneratorConfig, count: int) -> Iterator[datetime]:
+    """`count` increasing timestamps spread over the configured period."""
+    start = config.end - timedelta(days=config.days)
+    step = config.days * 86400 / max(count, 1)
+    for i in range(count):
+        yield start + timedelta(seconds=(i + rng.random()) * step)
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class _Weighted:
+    """Draws from a fixed population with relative weights."""
+
+    def __init__(self, population: Sequence, weights: Sequence[float]):
+        self.population = list(population)
+        self.cum_weights = list(accumulate(weights))
+
+    def draw(self, rng: random.Random):
+        return rng.choices(self.population, cum_weights=self.cum_weights)[0]
+
+
+def owners(rng: random.Random, user_ids: Sequence[int], skew: float) -> _Weighted:
+    """Zipf distributed users, which ones are the heavy ones is shuffled in."""
+    ranked = list(user_ids)
+    rng.shuffle(ranked)
+    return _Weighted(ranked, [1 / (rank + 1) ** skew for rank in range(len(ranked))])
+
+
+def generate_users(config: GeneratorConfig, first_id: int, hashed_password: str) -> Iterator[Tuple]:
+    rng = table_rng(config, "users")
+    for offset, created_at in enumerate(_timestamps(rng, config, config.users)):
+        user_id = first_id + offset
+        yield (
+            user_id, f"load-user-{user_id}@example.com", f"+1555{user_id:08d}", f"load-user-{user_id}", "User",
+            hashed_password, rng.random() >= 0.02, created_at, created_at,
+        )
+
+
+def generate_user_roles(config: GeneratorConfig, first_id: int, user_ids: Sequence[int], user_role_id: int, admin_role_id: int, extra_role_ids: Sequence[int]) -> Iterator[Tuple]:
+    rng = table_rng(config, "user_roles")
+    next_id = first_id
+    for user_id in user_ids:
+        role_ids = [user_role_id]
+        if rng.random() < config.admin_ratio:
+            role_ids.append(admin_role_id)
+        if extra_role_ids and rng.random() < EXTRA_ROLE_RATIO:
+            role_ids.append(rng.choice(extra_role_ids))
+        for role_id in role_ids:
+            yield (next_id, role_id, user_id, config.end, config.end)
+            next_id += 1
+
+
+def generate_documents(config: GeneratorConfig, first_id: int, user_ids: Sequence[int]) -> Iterator[Tuple]:
+    rng = table_rng(config, "documents")
+    owner = owners(rng, user_ids, config.owner_skew)
+    statuses = _Weighted([status.value for status in config.statuses], list(config.statuses.values()))
+    types = _Weighted(list(config.types), list(config.types.values()))
+    mu = math.log(config.size_median_bytes)
+    for offset, created_at in enumerate(_timestamps(rng, config, config.documents)):
+        document_id = first_id + offset
+        file_type = types.draw(rng)
+        size_bytes = max(1, int(rng.lognormvariate(mu, config.size_sigma)))
+        uploaded_at = created_at + timedelta(seconds=rng.uniform(0, 30))
+        download_count = int(rng.expovariate(1 / 3))
+        last_downloaded_at = uploaded_at + (config.end - uploaded_at) * rng.random() if download_count else None
+        deleted_at = uploaded_at + (config.end - uploaded_at) * rng.random() if rng.random() < config.deleted_ratio else None
+        yield (
+            document_id, f"{rng.choice(NAME_WORDS)}-{document_id}.{file_type}", file_type, str(size_bytes), size_bytes,
+            statuses.draw(rng), f"{settings.SUPABASE_URL}/storage/v1/object/public/documents/load/{document_id}.{file_type}",
+            download_count, last_downloaded_at, owner.draw(rng), created_at, uploaded_at, deleted_at or uploaded_at, deleted_at,
+        )
+
+
+def generate_shares(rng: random.Random, config: GeneratorConfig, first_id: int, documents: Iterable[Tuple], user_ids: Sequence[int]) -> List[Tuple]:
+    """Shares of `documents` (rows of generate_documents), made after each document's upload."""
+    rows = []
+    for document in documents:
+        document_id, owner_id, uploaded_at = document[0], document[9], document[11]
+        for _ in range(_poisson(rng, config.shares_per_document)):
+            user_id = rng.choice(user_ids)
+            if user_id == owner_id:
+                continue
+            shared_date = uploaded_at + (config.end - uploaded_at) * rng.random()
+            deleted_at = shared_date + (config.end - shared_date) * rng.random() if rng.random() < config.deleted_ratio else None
+            rows.append((first_id + len(rows), document_id, user_id, shared_date, deleted_at or shared_date, deleted_at))
+    return rows
+
+
+def generate_logs(config: GeneratorConfig, first_id: int, user_ids: Sequence[int]) -> Iterator[Tuple]:
+    rng = table_rng(config, "logs")
+    owner = owners(rng, user_ids, config.owner_skew)
+    events = _Weighted(list(LOG_EVENTS), list(LOG_EVENTS.values()))
+    for offset, created_at in enumerate(_timestamps(rng, config, config.logs)):
+        event = events.draw(rng)
+        yield (first_id + offset, event, owner.draw(rng), f"{event} (load test)", created_at, created_at)
+
+
+def _batches(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Loader:
+    """COPYs generated rows into the database, committing after each batch."""
+
+    def __init__(self, database_url: str, batch_rows: int):
+        # COPY goes through psycopg2, whichever driver the URL was written for
+        self.engine = create_engine(make_url(database_url).set(drivername="postgresql+psycopg2"))
+        self.connection = self.engine.raw_connection()
+        self.batch_rows = batch_rows
+
+    def close(self) -> None:
+        self.connection.close()
+        self.engine.dispose()
+
+    def execute(self, sql: str) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+        self.connection.commit()
+
+    def scalar(self, sql: str, params: Optional[tuple] = None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        self.connection.commit()
+        return row[0] if row else None
+
+    def column(self, sql: str) -> List:
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+            values = [row[0] for row in cursor.fetchall()]
+        self.connection.commit()
+        return values
+
+    def next_id(self, table: str) -> int:
+        return self.scalar(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+
+    def copy_batch(self, table: str, columns: Sequence[str], rows: Sequence[Tuple]) -> None:
+        buffer = io.StringIO()
+        # NULL is an unquoted empty field in CSV, None is written as exactly that
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        self.connection.commit()
+
+    def copy(self, table: str, columns: Sequence[str], rows: Iterable[Tuple]) -> int:
+        started, count = time.monotonic(), 0
+        for batch in _batches(rows, self.batch_rows):
+            self.copy_batch(table, columns, batch)
+            count += len(batch)
+        self.finish_table(table, count, started)
+        return count
+
+    def finish_table(self, table: str, count: int, started: float) -> None:
+        # Rows were copied with explicit ids, later inserts must not reuse them
+        self.scalar(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), max(id)) FROM {table}")
+        elapsed = time.monotonic() - started
+        print(f"{table}: {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def _ensure_roles(loader: Loader, config: GeneratorConfig) -> Tuple[int, int, List[int]]:
+    rng = table_rng(config, "roles")
+    roles = [("Admin", "Administrator role", ALL_PERMISSIONS), ("User", "Standard user role", STANDARD_USER_PERMISSIONS)]
+    for n in range(1, config.extra_roles + 1):
+        permissions = sum(int(bit) for bit in Permission if rng.random() < 0.5)
+        roles.append((f"load-role-{n}", "Load test role", permissions))
+    ids = {}
+    for role_name, description, permissions in roles:
+        ids[role_name] = loader.scalar("SELECT id FROM roles WHERE role_name = %s", (role_name,)) or loader.scalar(
+            "INSERT INTO roles (role_name, description, permissions, created_at, updated_at) VALUES (%s, %s, %s, now(), now()) RETURNING id",
+            (role_name, description, int(permissions)),
+        )
+    return ids.pop("User"), ids.pop("Admin"), list(ids.values())
+
+
+def _ensure_log_partitions(loader: Loader, config: GeneratorConfig) -> None:
+    # Monthly partitions of logs, see the partition_logs_by_month migration
+    if loader.scalar("SELECT to_regprocedure('create_log_partition(date)') IS NOT NULL"):
+        loader.scalar(
+            "SELECT count(create_log_partition(month::date)) FROM generate_series(date_trunc('month', %s::timestamp), %s::timestamp, interval '1 month') AS month",
+            (config.end - timedelta(days=config.days), config.end),
+        )
+
+
+def generate(config: GeneratorConfig, database_url: str) -> None:
+    loader = Loader(database_url, config.batch_rows)
+    try:
+        first_user_id = loader.next_id("users")
+        # One hash for every user, bcrypt would otherwise dominate the run
+        loader.copy("users", USER_COLUMNS, generate_users(config, first_user_id, pwd_context.hash(config.password)))
+        new_user_ids = range(first_user_id, first_user_id + config.users)
+        user_ids = loader.column("SELECT id FROM users WHERE deleted_at IS NULL ORDER BY id")
+
+        user_role_id, admin_role_id, extra_role_ids = _ensure_roles(loader, config)
+        loader.copy("user_roles", USER_ROLE_COLUMNS, generate_user_roles(config, loader.next_id("user_roles"), new_user_ids, user_role_id, admin_role_id, extra_role_ids))
+
+        if user_ids:
+            # Shares are generated from each batch of documents as it is loaded
+            started, documents, shares = time.monotonic(), 0, 0
+            share_rng, next_share_id = table_rng(config, "documents_shared"), loader.next_id("documents_shared")
+            for batch in _batches(generate_documents(config, loader.next_id("documents"), user_ids), config.batch_rows):
+                loader.copy_batch("documents", DOCUMENT_COLUMNS, batch)
+                share_rows = generate_shares(share_rng, config, next_share_id, batch, user_ids)
+                if share_rows:
+                    loader.copy_batch("documents_shared", SHARE_COLUMNS, share_rows)
+                documents, shares, next_share_id = documents + len(batch), shares + len(share_rows), next_share_id + len(share_rows)
+            loader.finish_table("documents", documents, started)
+            loader.finish_table("documents_shared", shares, started)
+
+            _ensure_log_partitions(loader, config)
+            loader.copy("logs", LOG_COLUMNS, generate_logs(config, loader.next_id("logs"), user_ids))
+
+        if loader.scalar("SELECT to_regclass('dashboard_summary_mv') IS NOT NULL"):
+            loader.execute("REFRESH MATERIALIZED VIEW dashboard_summary_mv")
+        # Fresh statistics, so benchmarked plans are the ones production data would get
+        loader.execute("ANALYZE")
+    finally:
+        loader.close()
+
+
+def _weights(value: str) -> Dict[str, float]:
+    """`name=weight,name=weight` from the command line."""
+    try:
+        return {name.strip(): float(weight) for name, weight in (item.split("=", 1) for item in value.split(","))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected name=weight,name=weight, got {value!r}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    defaults = GeneratorConfig()
+    parser = argparse.ArgumentParser(prog="python -m db.generate", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--documents", type=int, default=defaults.documents)
+    parser.add_argument("--logs", type=int, default=defaults.logs)
+    parser.add_argument("--shares-per-document", type=float, default=defaults.shares_per_document, help="mean of the Poisson distributed shares of each document")
+    parser.add_argument("--extra-roles", type=int, default=defaults.extra_roles)
+    parser.add_argument("--admin-ratio", type=float, default=defaults.admin_ratio)
+    parser.add_argument("--owner-skew", type=float, default=defaults.owner_skew, help="Zipf exponent of documents and logs per user, 0 for uniform")
+    parser.add_argument("--size-median-bytes", type=int, default=defaults.size_median_bytes)
+    parser.add_argument("--size-sigma", type=float, default=defaults.size_sigma, help="sigma of the log-normal file sizes")
+    parser.add_argument("--deleted-ratio", type=float, default=defaults.deleted_ratio)
+    parser.add_argument("--statuses", type=_weights, default=defaults.statuses, help="e.g. uploaded=6,process=1,downloaded=3")
+    parser.add_argument("--types", type=_weights, default=defaults.types, help="e.g. pdf=35,docx=20,png=15")
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=defaults.end, help="end of the generated period, defaults to today")
+    parser.add_argument("--batch-rows", type=int, default=defaults.batch_rows)
+    args = vars(parser.parse_args(argv))
+    database_url = args.pop("database_url")
+    generate(GeneratorConfig(**args), database_url)
+
+
+if __name__ == "__main__":
+    main()
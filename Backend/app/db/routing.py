@@ -0,0 +1,151 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Depends, Request
+from supabase import Client, create_client
+
+from auth.jwt import verify_access_token
+from core.instrumentation import instrument_supabase_client
+from db.base import get_supabase_client, settings
+
+# Requests that never write, everything else marks its client as having written
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class WriteMarkers:
+    """Wall clock time until which each client reads from the primary, keyed by client_key.
+
+    Kept out of the entity cache, whose LRU eviction and namespace
+    invalidations could drop a marker early and send the client's next read
+    to a replica that hasn't seen its write. Every marker lasts the same
+    READ_YOUR_WRITES_SECONDS, so the local dict is in expiry order: each write
+    prunes the expired ones from its front, and it never holds more than that
+    window's writers. With a Redis URL the markers are also Redis keys that
+    expire on their own, so a write through one process counts in all of them.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+        self._redis = None
+        self._redis_url = redis_url
+
+    def _redis_client(self):
+        if not self._redis_url:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self._redis_url, socket_timeout=0.5)
+        return self._redis
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"instashare:read-your-writes:{key}"
+
+    def _mark_local(self, key: str, seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._until[key] = now + seconds
+            self._until.move_to_end(key)
+            while self._until:
+                oldest = next(iter(self._until))
+                if self._until[oldest] > now:
+                    break
+                del self._until[oldest]
+
+    def mark(self, key: str, seconds: float) -> None:
+        self._mark_local(key, seconds)
+        client = self._redis_client()
+        if client is None or seconds <= 0:
+            return
+        try:
+            client.set(self._redis_key(key), 1, px=int(seconds * 1000) or 1)
+        except Exception as e:
+            print(f"Read-your-writes Redis write error: {e}")
+
+    async def amark(self, key: str, seconds: float) -> None:
+        if not self._redis_url:
+            self._mark_local(key, seconds)
+            return
+        await asyncio.to_thread(self.mark, key, seconds)
+
+    def is_marked(self, key: str) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+        if until is not None and until > time.time():
+            return True
+        client = self._redis_client()
+        if client is None:
+            return False
+        try:
+            return bool(client.exists(self._redis_key(key)))
+        except Exception as e:
+            print(f"Read-your-writes Redis read error: {e}")
+            # The primary always has the client's writes
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._until.clear()
+
+
+write_markers = WriteMarkers(settings.REDIS_CACHE_URL)
+
+
+def replica_urls() -> List[str]:
+    return [url.strip() for url in (settings.SUPABASE_REPLICA_URLS or "").split(",") if url.strip()]
+
+
+class _NoUser(Exception):
+    pass
+
+
+def client_key(request: Request) -> str:
+    """Who made `request`: the user of its bearer token, or its address when there is none."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            token_data = verify_access_token(token, _NoUser())
+            # Tokens issued before the uid claim only carry the email
+            return f"user:{token_data.user_id or token_data.username}"
+        except _NoUser:
+            pass
+    # Clients behind the same proxy share a key, a write by one keeps them all on the primary for a while
+    return f"address:{request.client.host if request.client else 'unknown'}"
+
+
+def record_write(request: Request) -> None:
+    """Keep the reads of `request`'s client on the primary until replicas have caught up with its write."""
+    if not replica_urls():
+        return
+    write_markers.mark(client_key(request), settings.READ_YOUR_WRITES_SECONDS)
+
+
+async def arecord_write(request: Request) -> None:
+    """`record_write` for the event loop, Redis roundtrips run on a worker thread."""
+    if not replica_urls():
+        return
+    await write_markers.amark(client_key(request), settings.READ_YOUR_WRITES_SECONDS)
+
+
+def reads_from_primary(request: Request) -> bool:
+    if request.method not in SAFE_METHODS:
+        return True
+    return write_markers.is_marked(client_key(request))
+
+
+def get_replica_supabase_client(request: Request, supabase: Client = Depends(get_supabase_client)) -> Client:
+    """Client for the read-only calls of `request`, a replica unless it has to see its own writes.
+
+    Falls back to the primary client when no replicas are configured.
+    """
+    urls = replica_urls()
+    if not urls or reads_from_primary(request):
+        return supabase
+    replica: Client = create_client(random.choice(urls), settings.SUPABASE_KEY)
+    instrument_supabase_client(replica)
+    return replica
@@ -6,6 +6,7 @@ from models.role import Role
 from models.document_shared import DocumentShared
 from models.user_role import UserRole
 from models.log import Log
+from auth.permissions import ALL_PERMISSIONS, STANDARD_USER_PERMISSIONS
 from datetime import datetime
 
 def create_initial_data(db: Session):
@@ -21,8 +22,8 @@ def create_initial_data(db: Session):
     # Check and insert initial data for Document
     if db.query(Document).count() == 0:
         print("Inserting initial Document data...")
-        doc1 = Document(name="Report.pdf", type="pdf", size="10MB", status=DocumentStatus.uploaded)
-        doc2 = Document(name="Presentation.pptx", type="pptx", size="20MB", status=DocumentStatus.process)
+        doc1 = Document(name="Report.pdf", type="pdf", size="10MB", size_bytes=10 * 1024 * 1024, status=DocumentStatus.uploaded)
+        doc2 = Document(name="Presentation.pptx", type="pptx", size="20MB", size_bytes=20 * 1024 * 1024, status=DocumentStatus.process)
         db.add_all([doc1, doc2])
         db.commit()
         print("Initial Document data inserted.")
@@ -30,8 +31,8 @@ def create_initial_data(db: Session):
     # Check and insert initial data for Role
     if db.query(Role).count() == 0:
         print("Inserting initial Role data...")
-        role_admin = Role(role_name="Admin", description="Administrator role")
-        role_user = Role(role_name="User", description="Standard user role")
+        role_admin = Role(role_name="Admin", description="Administrator role", permissions=ALL_PERMISSIONS)
+        role_user = Role(role_name="User", description="Standard user role", permissions=STANDARD_USER_PERMISSIONS)
         db.add_all([role_admin, role_user])
         db.commit()
         print("Initial Role data inserted.")
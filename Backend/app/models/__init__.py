@@ -4,6 +4,7 @@ from .role import Role
 from .document_shared import DocumentShared
 from .user_role import UserRole
 from .log import Log
+from .user_storage_usage import UserStorageUsage
 
 
 
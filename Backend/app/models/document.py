@@ -1,5 +1,5 @@
 from db.base import Base
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Enum, ForeignKey, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -11,16 +11,28 @@ class DocumentStatus(str, enum.Enum):
 
 class Document(Base):
     __tablename__ = "documents"
+    # Filtered and sorted listings over live rows, see DocumentService.list_documents
+    __table_args__ = (
+        Index("ix_documents_live_status", "status", "id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_live_type", "type", "id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_live_user_id_id", "user_id", "id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_live_user_id_created_at", "user_id", "created_at", "id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_live_created_at", "created_at", "id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_live_uploaded_at", "uploaded_at", "id", postgresql_where=text("deleted_at IS NULL")),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     type = Column(String, index=True)
     size = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    size_bytes = Column(BigInteger, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     status = Column(Enum(DocumentStatus), default=DocumentStatus.uploaded)
     file_url = Column(String, nullable=True)
+    download_count = Column(Integer, default=0, nullable=False)
+    last_downloaded_at = Column(DateTime, nullable=True)
 
     user_id = Column(Integer, ForeignKey('users.id'))
     user = relationship("User", back_populates="documents")
@@ -1,14 +1,18 @@
 from db.base import Base
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 class DocumentShared(Base):
     __tablename__ = "documents_shared"
+    __table_args__ = (
+        Index("ix_documents_shared_live_user_id_shared_date", "user_id", "shared_date", "document_id", postgresql_where=text("deleted_at IS NULL")),
+        Index("ix_documents_shared_live_document_id", "document_id", postgresql_where=text("deleted_at IS NULL")),
+    )
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
-    shared_date = Column(DateTime, default=datetime.utcnow)
+    shared_date = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
     downloaded_at = Column(DateTime, nullable=True)
@@ -1,26 +1,34 @@
 from db.base import Base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import DDL, Column, Integer, String, DateTime, ForeignKey, Index, Sequence, func
+from sqlalchemy.event import listen
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 class Log(Base):
     __tablename__ = "logs"
-    id = Column(Integer, primary_key=True, index=True)
+    # Entries of one user, newest first, see LogService.get_logs_by_user
+    __table_args__ = (
+        Index("ix_logs_user_id_id", "user_id", "id"),
+        # Monthly partitions, created and expired by the maintain_log_partitions() function
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # Part of a composite primary key, so it is no SERIAL, its default is set below
+    id = Column(Integer, Sequence("logs_id_seq"), primary_key=True, index=True)
     event = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"))
     event_description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Partition key, part of the primary key
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow, server_default=func.now())
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="logs")
 
 
+# PostgREST inserts don't go through SQLAlchemy and need the sequence default on the column itself,
+# as the migrations create it
+listen(Log.__table__, "after_create", DDL("ALTER TABLE logs ALTER COLUMN id SET DEFAULT nextval('logs_id_seq'::regclass)").execute_if(dialect="postgresql"))
 
-
-
-
-
-
-
-
+# Tables made by create_all instead of the migrations get neither monthly partitions nor the
+# maintenance functions creating them, every row goes to a DEFAULT partition. Migrated databases have none.
+listen(Log.__table__, "after_create", DDL("CREATE TABLE logs_default PARTITION OF logs DEFAULT").execute_if(dialect="postgresql"))
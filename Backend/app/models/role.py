@@ -1,5 +1,5 @@
 from db.base import Base
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -8,6 +8,8 @@ class Role(Base):
     id = Column(Integer, primary_key=True, index=True)
     role_name = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
+    # auth.permissions.Permission bits granted to every user with this role
+    permissions = Column(BigInteger, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -13,6 +13,8 @@ class User(Base):
     hashed_password = Column(String)
     password = Column(String)
     is_active = Column(Boolean, default=True)
+    # Bumped by a trigger whenever issued tokens must stop working (roles, password, deactivation)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -0,0 +1,11 @@
+from db.base import Base
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, func
+from datetime import datetime
+
+# Maintained by the documents_user_storage_usage trigger, never written by the app
+class UserStorageUsage(Base):
+    __tablename__ = "user_storage_usage"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bytes = Column(BigInteger, default=0, server_default="0", nullable=False)
+    documents = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
@@ -1,9 +1,10 @@
-from .user import UserBase, UserCreate, UserUpdate, User
-from .document import Document, DocumentBase, DocumentCreate, DocumentUpdate
+from .user import UserBase, UserCreate, UserUpdate, User, UserUploadedDocuments
+from .document import Document, DocumentBase, DocumentCreate, DocumentUpdate, DocumentDownloadStats, DocumentFilter, DocumentSortField
 from .role import Role, RoleBase, RoleCreate, RoleUpdate
 from .document_shared import DocumentShared, DocumentSharedBase, DocumentSharedCreate, DocumentSharedUpdate
 from .user_role import UserRole, UserRoleBase, UserRoleCreate, UserRoleUpdate
 from .log import Log, LogBase, LogCreate, LogUpdate
+from .user_storage_usage import UserStorageUsage
 
 
 
@@ -0,0 +1,14 @@
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+MAX_BATCH_GET_IDS = 5000
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_GET_IDS)
+
+class BatchGetResponse(BaseModel, Generic[T]):
+    # Aligned with the requested ids, null where the id was not found
+    items: List[Optional[T]]
+    missing: List[int]
@@ -0,0 +1,32 @@
+from typing import Dict, List, Optional
+from datetime import date, datetime
+from pydantic import BaseModel
+
+class UserStorage(BaseModel):
+    user_id: int
+    bytes: int
+    documents: int
+
+class DailyUploads(BaseModel):
+    day: date
+    uploads: int
+
+class ActivityEntry(BaseModel):
+    id: int
+    event: str
+    user_id: Optional[int] = None
+    event_description: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class DashboardSummary(BaseModel):
+    total_documents: int = 0
+    documents_by_status: Dict[str, int] = {}
+    total_users: int = 0
+    total_storage_bytes: int = 0
+    # Users with the most stored bytes, largest first
+    storage_by_user: List[UserStorage] = []
+    # Last 30 days, days without uploads are left out
+    uploads_per_day: List[DailyUploads] = []
+    recent_activity: List[ActivityEntry] = []
+    # When the aggregates were last recomputed, recent_activity is always live
+    refreshed_at: Optional[datetime] = None
@@ -12,6 +12,7 @@ class DocumentBase(BaseModel):
     name: str
     type: str
     size: Optional[str] = None
+    size_bytes: int = 0
     status: DocumentStatusSchema = DocumentStatusSchema.uploaded
     file_url: Optional[str] = None
 
@@ -22,6 +23,7 @@ class DocumentUpdate(DocumentBase):
     name: Optional[str] = None
     type: Optional[str] = None
     size: Optional[str] = None
+    size_bytes: Optional[int] = None
     status: Optional[DocumentStatusSchema] = None
 
 class Document(DocumentBase):
@@ -34,3 +36,25 @@ class Document(DocumentBase):
 
     class Config:
         from_attributes = True
+
+class DocumentDownloadStats(BaseModel):
+    document_id: int
+    download_count: int = 0
+    last_downloaded_at: Optional[datetime] = None
+
+# Columns a listing can be ordered by, each backed by a (column, id) index on live rows
+class DocumentSortField(str, Enum):
+    id = "id"
+    created_at = "created_at"
+    uploaded_at = "uploaded_at"
+
+class DocumentFilter(BaseModel):
+    status: Optional[DocumentStatusSchema] = None
+    type: Optional[str] = None
+    user_id: Optional[int] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    min_size_bytes: Optional[int] = None
+    max_size_bytes: Optional[int] = None
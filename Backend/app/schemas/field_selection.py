@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Type, get_args
+from pydantic import BaseModel, ConfigDict, create_model
+
+
+class InvalidFieldsError(ValueError):
+    pass
+
+
+def _is_relationship(annotation: Any) -> bool:
+    # Nested models are embedded resources, not columns PostgREST can select by name
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_is_relationship(arg) for arg in get_args(annotation))
+
+
+@lru_cache(maxsize=64)
+def selectable_fields(schema: Type[BaseModel]) -> Tuple[str, ...]:
+    """Fields of `schema` a selection may name: serialized and not a nested model."""
+    return tuple(
+        name for name, field in schema.model_fields.items()
+        if not field.exclude and not _is_relationship(field.annotation)
+    )
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel], exclude: Iterable[str] = ()) -> Optional[List[str]]:
+    """Turn a `fields=a,b,c` query value into a validated column list.
+
+    `id` is always included since cursors and clients rely on it. Returns None
+    when no selection was asked for, meaning the full row.
+    """
+    if not fields:
+        return None
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    allowed = set(selectable_fields(schema)) - set(exclude)
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(sorted(allowed))}")
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return requested
+
+
+def select_columns(fields: Optional[List[str]]) -> str:
+    """PostgREST select list for a parsed field selection."""
+    return ",".join(fields) if fields else "*"
+
+
+@lru_cache(maxsize=256)
+def partial_schema(schema: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Response model with only `fields` of `schema`, built once per field set."""
+    definitions = {
+        name: (Optional[schema.model_fields[name].annotation], None)
+        for name in fields
+    }
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
@@ -23,3 +23,8 @@ class Log(LogBase):
 
     class Config:
         from_attributes = True
+
+# Time bounds of a listing, logs is partitioned by month of created_at so only the months in range are read
+class LogFilter(BaseModel):
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
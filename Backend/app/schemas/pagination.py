@@ -0,0 +1,20 @@
+from enum import Enum
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class CountMode(str, Enum):
+    exact = "exact"
+    planned = "planned"
+    estimated = "estimated"
+    none = "none"
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total_count: Optional[int] = None
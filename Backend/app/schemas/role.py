@@ -5,6 +5,7 @@ from pydantic import BaseModel
 class RoleBase(BaseModel):
     role_name: str
     description: Optional[str] = None
+    permissions: int = 0
 
 class RoleCreate(RoleBase):
     pass
@@ -12,6 +13,7 @@ class RoleCreate(RoleBase):
 class RoleUpdate(RoleBase):
     role_name: Optional[str] = None
     description: Optional[str] = None
+    permissions: Optional[int] = None
 
 class Role(RoleBase):
     id: int
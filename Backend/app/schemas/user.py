@@ -1,6 +1,7 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
+from .document import Document
 
 class UserBase(BaseModel):
     username:  Optional[str] = None
@@ -25,10 +26,21 @@ class User(UserBase):
     updated_at: Optional[datetime] = None
     deleted_at: Optional[datetime] = None
     is_active: Optional[bool] = True
+    # Left out of responses and of the sharing views
+    password: Optional[str] = None
     
 
     role:  Optional[str] = None
+    # Every role name of the authenticated user, from the access token. Never serialized.
+    roles: List[str] = Field(default=[], exclude=True)
     hashed_password: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+class UserUploadedDocuments(User):
+    upload_documents: List[Document] = []
+    # Live documents per status over all of the user's uploads, only when asked for
+    status_counts: Optional[Dict[str, int]] = None
+    next_cursor: Optional[str] = None
+
@@ -0,0 +1,12 @@
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel
+
+class UserStorageUsage(BaseModel):
+    user_id: int
+    bytes: int = 0
+    documents: int = 0
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,18 @@
+from typing import Optional
+from supabase import Client
+from schemas.dashboard import DashboardSummary
+
+
+class DashboardService:
+    def __init__(self, supabase: Client, replica: Optional[Client] = None):
+        self.supabase: Client = supabase
+        # The summary is read from `replica`, it is a periodically refreshed view anyway
+        self.replica: Client = replica or supabase
+
+    async def get_summary(self, recent_limit: int = 10) -> DashboardSummary:
+        # One RPC call reading the single-row dashboard_summary_mv materialized view
+        data, count = self.replica.rpc('dashboard_summary', {"recent_limit": recent_limit}).execute()
+        return DashboardSummary(**(data[1] or {}))
+
+    def refresh_summary(self) -> None:
+        self.supabase.rpc('refresh_dashboard_summary', {}).execute()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from core.config import Settings
+
+settings = Settings()
+
+
+def _timestamp_key(value: Union[str, datetime, None]) -> str:
+    # Rows built from PostgREST data carry timestamps as ISO strings, schemas as datetimes,
+    # both have to give the same text
+    if not value:
+        return ""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def document_version(document) -> str:
+    """Identifies the stored bytes of a document, changes on re-upload and compression."""
+    return hashlib.sha256(f"{document.file_url}|{_timestamp_key(document.updated_at)}".encode()).hexdigest()[:20]
+
+
+def document_etag(document) -> str:
+    return f'"{document.id}-{document_version(document)}"'
+
+
+class DocumentFileCache:
+    """Read-through cache of document files on local disk.
+
+    Entries are keyed by (document id, version) so a new upload or a finished
+    compression never serves stale bytes, old versions simply age out.
+    Total size is kept under `max_bytes` by evicting the least recently used
+    entries. Paths handed out by `get_or_fetch` are leased until `release`,
+    an entry evicted in the meantime keeps its file until the last lease ends.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        # Per key fetch lock and the number of requests holding or waiting on it
+        self._fetch_locks: Dict[Tuple[int, str], List] = {}
+        self._leases: Dict[str, int] = {}
+        self._unlink_on_release: Set[str] = set()
+
+    def _path(self, key: Tuple[int, str]) -> str:
+        document_id, version = key
+        return os.path.join(self.directory, f"{document_id}-{version}")
+
+    def _load_existing(self) -> None:
+        # Re-index files left by a previous process, oldest access first
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            document_id, _, version = name.partition("-")
+            if not document_id.isdigit() or not version or name.endswith(".tmp"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_atime, (int(document_id), version), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._loaded = True
+        self._evict()
+
+    def _remove(self, key: Tuple[int, str]) -> None:
+        # Called with the lock held, a file still being served goes once its last lease ends
+        path = self._path(key)
+        if path in self._leases:
+            self._unlink_on_release.add(path)
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _lease(self, path: str) -> str:
+        self._leases[path] = self._leases.get(path, 0) + 1
+        return path
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._remove(key)
+
+    def get(self, key: Tuple[int, str], lease: bool = False) -> Optional[str]:
+        with self._lock:
+            if not self._loaded:
+                self._load_existing()
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._lease(self._path(key)) if lease else self._path(key)
+
+    def put(self, key: Tuple[int, str], content: bytes, lease: bool = False) -> Optional[str]:
+        """Store `content` and return its path, or None if it exceeds the byte budget."""
+        if len(content) > self.max_bytes:
+            return None
+        path = self._path(key)
+        with self._lock:
+            if not self._loaded:
+                self._load_existing()
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._unlink_on_release.discard(path)
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+            self._entries[key] = len(content)
+            self._total_bytes += len(content)
+            self._evict()
+            # The new entry itself is never evicted here, it is the most recent one
+            return self._lease(path) if lease else path
+
+    def release(self, path: str) -> None:
+        """End a lease taken by `get_or_fetch`, paths that were never leased are ignored."""
+        with self._lock:
+            readers = self._leases.get(path)
+            if readers is None:
+                return
+            if readers > 1:
+                self._leases[path] = readers - 1
+                return
+            del self._leases[path]
+            if path in self._unlink_on_release:
+                self._unlink_on_release.discard(path)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def discard_document(self, document_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == document_id]:
+                self._total_bytes -= self._entries.pop(key)
+                self._remove(key)
+
+    async def get_or_fetch(self, key: Tuple[int, str], fetch: Callable[[], Awaitable[bytes]]) -> Union[str, bytes]:
+        """Return the cached file path, fetching and storing it on a miss.
+
+        The path is leased, pass it to `release` once it has been served.
+        Concurrent misses for the same key share one fetch. When the file is
+        larger than the whole budget the raw bytes are returned instead.
+        """
+        path = self.get(key, lease=True)
+        if path:
+            return path
+        fetch_lock = self._fetch_locks.setdefault(key, [asyncio.Lock(), 0])
+        fetch_lock[1] += 1
+        try:
+            async with fetch_lock[0]:
+                path = self.get(key, lease=True)
+                if path:
+                    return path
+                content = await fetch()
+                path = await asyncio.to_thread(self.put, key, content, True)
+                return path if path else content
+        finally:
+            # Dropped only once nobody waits on it, a later miss would otherwise fetch again
+            fetch_lock[1] -= 1
+            if not fetch_lock[1]:
+                del self._fetch_locks[key]
+
+
+document_file_cache = DocumentFileCache(settings.DOCUMENT_CACHE_DIR, settings.DOCUMENT_CACHE_MAX_BYTES)
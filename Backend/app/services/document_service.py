@@ -1,18 +1,56 @@
 from fastapi import UploadFile
-from typing import List, Optional
+from typing import List, Optional, Union
 from supabase import create_client, Client
-from models import Document as  DocumentModel, DocumentStatus
-from schemas import DocumentCreate, DocumentUpdate, Document, DocumentShared
+from models import Document as  DocumentModel, DocumentStatus, User as UserModel
+from schemas import DocumentCreate, DocumentUpdate, Document, DocumentShared, DocumentDownloadStats, DocumentFilter
+from services.download_tracker import download_tracker
+from services.document_cache import document_file_cache, document_version
+from services.pagination import fetch_page, encode_rank_cursor, decode_rank_cursor
+from services.entity_cache import entity_cache
+from schemas.pagination import Page
+from schemas.field_selection import select_columns
 import os
+import asyncio
 from datetime import datetime
 
 
+# Columns the sharing views add next to the user or document columns
+SHARE_COLUMNS = ("document_id", "shared_with_id", "shared_date", "shared_downloaded_at")
+
+
+def _apply_document_filter(query, filters: Optional[DocumentFilter]):
+    if filters is None:
+        return query
+    if filters.status is not None:
+        query = query.eq("status", filters.status.value)
+    if filters.type is not None:
+        query = query.eq("type", filters.type)
+    if filters.user_id is not None:
+        query = query.eq("user_id", filters.user_id)
+    if filters.created_after is not None:
+        query = query.gte("created_at", filters.created_after.isoformat())
+    if filters.created_before is not None:
+        query = query.lt("created_at", filters.created_before.isoformat())
+    if filters.uploaded_after is not None:
+        query = query.gte("uploaded_at", filters.uploaded_after.isoformat())
+    if filters.uploaded_before is not None:
+        query = query.lt("uploaded_at", filters.uploaded_before.isoformat())
+    if filters.min_size_bytes is not None:
+        query = query.gte("size_bytes", filters.min_size_bytes)
+    if filters.max_size_bytes is not None:
+        query = query.lte("size_bytes", filters.max_size_bytes)
+    return query
+
+
 class DocumentService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: Client, replica: Optional[Client] = None):
         #supabase_url = os.getenv("SUPABASE_URL")
         #supabase_key = os.getenv("SUPABASE_KEY")
         #self.supabase: Client = create_client(supabase_url, supabase_key)
         self.supabase: Client = supabase
+        # Read-only calls whose results aren't cached go to `replica`, see db.routing.
+        # Cache fills stay on the primary, a lagging read would be served to everyone until it expires.
+        self.replica: Client = replica or supabase
 
     async def upload_document_info(self, document: DocumentCreate) -> Document:
         data, count = self.supabase.from_('documents').insert(document.model_dump(by_alias=True)).execute()
@@ -36,6 +74,7 @@ class DocumentService:
                             name = name, 
                             type = file_type, 
                             size = str(file_size),  
+                            size_bytes = file_size,
                             status = DocumentStatus.uploaded, 
                             file_url = public_url
                     )
@@ -49,46 +88,113 @@ class DocumentService:
     async def delete_document(self, document_id: int) -> Document:
         # Perform a soft delete by updating 'deleted_at'
         data, count = self.supabase.from_('documents').update({"deleted_at": datetime.utcnow().isoformat()}).eq("id", document_id).execute()
+        await entity_cache.ainvalidate("document", document_id)
+        document_file_cache.discard_document(document_id)
         return {"action": "deleted", "message": "Document deleted"}
 
     async def update_document(self, document_id: int, document_update_data: DocumentUpdate) -> DocumentModel:
         print(f"\n\n\n <==== Updating document {document_id} with data: {document_update_data.model_dump(exclude_unset=True)}===>\n\n\n")
         data, count = self.supabase.from_('documents').update(document_update_data.model_dump(exclude_unset=True)).eq("id", document_id).execute()
+        await entity_cache.ainvalidate("document", document_id)
         return DocumentModel(**data[1][0])
 
-    async def list_documents(self) -> List[Document]:
-        data, count = self.supabase.from_('documents').select("*", count='exact').is_("deleted_at", None).execute()
-        return [DocumentModel(**item) for item in data[1]]
-
-    async def get_document(self, document_id: int) -> Document:
-        data, count = self.supabase.from_('documents').select("*", count='exact').eq("id", document_id).is_("deleted_at", None).execute()
-        if data[1]:
-            return DocumentModel(**data[1][0])
-        return None
-
-    async def get_shared_users_for_document(self, document_id: int) -> DocumentShared:
-        # This requires joining documents with document_shared and users. Supabase client might not directly support complex joins in a single call.
-        # This is a simplified approach, a more robust solution would involve views or stored procedures in Supabase, or multiple queries.
-        data, count = self.supabase.from_('documents_shared').select("*, users(*)").eq("document_id", document_id).execute()
-        shared_with_users = []
-        for item in data[1]:
-            user_info = item.get('users', {})
-            if user_info:
-                shared_with_users.append({
-                    "id": user_info.get("id"),
-                    "name": user_info.get("name"),
-                    "email": user_info.get("email"),
-                    "phone": user_info.get("phone"),
-                    "shared_date": item.get("shared_date")
-                })
-        
-        document_data, count = self.supabase.from_('documents').select("*").eq("id", document_id).execute()
-        document_info = DocumentModel(**document_data[1][0]) if document_data[1] else {}
+    async def list_documents(self, limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None, count: Optional[str] = None, filters: Optional[DocumentFilter] = None, sort: str = "id", descending: bool = False, raw: bool = False) -> Page[Document]:
+        def base_query(columns: str, **select_options):
+            query = self.replica.from_('documents').select(columns, **select_options).is_("deleted_at", None)
+            return _apply_document_filter(query, filters)
+        if fields is not None and sort not in fields:
+            # The next cursor is built from the sort column of the last row
+            fields = [*fields, sort]
+        return fetch_page(base_query, select_columns(fields), limit, cursor, None if raw else lambda item: DocumentModel(**item), count, descending, sort)
+
+    async def search_documents(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Page[Document]:
+        """Documents whose name or type match `query` by word prefix or by similarity, best matches first."""
+        params = {"search_query": query, "max_results": limit + 1}
+        if cursor:
+            params["after_rank"], params["after_id"] = decode_rank_cursor(cursor)
+        data, count = self.replica.rpc('search_documents', params).execute()
+        rows = data[1]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_rank_cursor(rows[-1]["rank"], rows[-1]["document"]["id"])
+        return Page(items=[DocumentModel(**row["document"]) for row in rows], next_cursor=next_cursor)
+
+    async def get_document(self, document_id: int, fields: Optional[List[str]] = None) -> Document:
+        row = await entity_cache.aget("document", document_id)
+        if row is None:
+            generation = entity_cache.generation()
+            data, count = self.supabase.from_('documents').select(select_columns(fields)).eq("id", document_id).is_("deleted_at", None).execute()
+            if not data[1]:
+                return None
+            row = data[1][0]
+            if fields is None:
+                # Only complete rows are cached, a cached one also serves any field selection
+                await entity_cache.aset("document", document_id, row, generation)
+        return DocumentModel(**row)
+
+    async def get_documents_by_ids(self, document_ids: List[int]) -> List[Optional[Document]]:
+        """Documents in the order of `document_ids`, None where there is no such document."""
+        def load(chunk: List[int]) -> List[dict]:
+            data, count = self.supabase.from_('documents').select("*").in_("id", chunk).is_("deleted_at", None).execute()
+            return data[1]
+
+        rows = await entity_cache.aget_many("document", document_ids, load)
+        return [DocumentModel(**rows[document_id]) if document_id in rows else None for document_id in document_ids]
+
+    async def get_shared_users_for_document(self, document_id: int) -> List[UserModel]:
+        # One query against the document_shared_users view, which joins the live shares with their users
+        data, count = self.replica.from_('document_shared_users').select("*").eq("document_id", document_id).order("shared_date").execute()
+        return [
+            UserModel(**{k: v for k, v in item.items() if k not in SHARE_COLUMNS})
+            for item in data[1]
+        ]
+
+    async def list_documents_shared_with_user(self, user_id: int, limit: int = 100, cursor: Optional[str] = None, count: Optional[str] = None) -> Page[Document]:
+        """Documents shared with `user_id`, most recently shared first."""
+        def base_query(columns: str, **select_options):
+            return self.replica.from_('user_shared_documents').select(columns, **select_options).eq("shared_with_id", user_id)
+        return fetch_page(
+            base_query, "*", limit, cursor,
+            lambda item: DocumentModel(**{k: v for k, v in item.items() if k not in SHARE_COLUMNS}),
+            count, descending=True, sort="shared_date",
+        )
+
+    async def record_document_download(self, document_id: int, user_id: Optional[int] = None) -> None:
+        # Counters, `downloaded_at` and the `downloaded` status are written in batches by the tracker
+        download_tracker.record(document_id, user_id)
+
+    async def get_document_file(self, document: Document) -> Union[str, bytes]:
+        """Local path of the document's file, read through the disk cache.
+
+        Files larger than the whole cache budget come back as raw bytes.
+        """
+        async def fetch() -> bytes:
+            path_parts = document.file_url.split('/public/')
+            if len(path_parts) < 2:
+                raise ValueError(f"Invalid file_url for document {document.id}: {document.file_url}")
+            bucket_name, _, file_in_bucket_path = path_parts[1].partition('/')
+            # The storage client is synchronous, keep the transfer off the event loop
+            return await asyncio.to_thread(self.supabase.storage.from_(bucket_name).download, file_in_bucket_path)
+
+        return await document_file_cache.get_or_fetch((document.id, document_version(document)), fetch)
 
-        return {
-            **document_info.model_dump(),
-            "shared_with": shared_with_users
-        }
+    async def get_document_download_stats(self, document_id: int) -> DocumentDownloadStats:
+        data, count = self.supabase.from_('documents').select("id, download_count, last_downloaded_at").eq("id", document_id).is_("deleted_at", None).execute()
+        if not data[1]:
+            return None
+        stored = data[1][0]
+        last_downloaded_at = stored.get("last_downloaded_at")
+        if last_downloaded_at:
+            last_downloaded_at = datetime.fromisoformat(last_downloaded_at)
+        pending_last_downloaded_at = download_tracker.pending_last_downloaded_at(document_id)
+        if pending_last_downloaded_at and (last_downloaded_at is None or pending_last_downloaded_at > last_downloaded_at):
+            last_downloaded_at = pending_last_downloaded_at
+        return DocumentDownloadStats(
+            document_id=document_id,
+            download_count=(stored.get("download_count") or 0) + download_tracker.pending_count(document_id),
+            last_downloaded_at=last_downloaded_at,
+        )
 
     async def inicialize_document_compresion_job(self, document_id: int) -> Document:
         # This would typically trigger an external job/queue. For now, a placeholder.
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+from supabase import Client
+from services.entity_cache import entity_cache
+
+
+class DownloadTracker:
+    """Buffers download events in memory and writes them to the DB in batches.
+
+    Recording a download is a dict update under a lock, so the download path
+    never waits on a DB write. `flush` sends everything buffered so far in a
+    single `record_document_downloads` RPC call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = defaultdict(int)
+        self._last_downloaded_at: Dict[int, datetime] = {}
+        self._shared_downloaded_at: Dict[Tuple[int, int], datetime] = {}
+
+    def record(self, document_id: int, user_id: Optional[int] = None, downloaded_at: Optional[datetime] = None) -> None:
+        downloaded_at = downloaded_at or datetime.utcnow()
+        with self._lock:
+            self._counts[document_id] += 1
+            last = self._last_downloaded_at.get(document_id)
+            if last is None or downloaded_at > last:
+                self._last_downloaded_at[document_id] = downloaded_at
+            if user_id is not None:
+                key = (document_id, user_id)
+                last = self._shared_downloaded_at.get(key)
+                if last is None or downloaded_at > last:
+                    self._shared_downloaded_at[key] = downloaded_at
+
+    def pending_count(self, document_id: int) -> int:
+        with self._lock:
+            return self._counts.get(document_id, 0)
+
+    def pending_last_downloaded_at(self, document_id: int) -> Optional[datetime]:
+        with self._lock:
+            return self._last_downloaded_at.get(document_id)
+
+    def drain(self) -> Optional[dict]:
+        """Swap out the buffers and return them as an RPC payload, or None if empty."""
+        with self._lock:
+            if not self._counts:
+                return None
+            counts, self._counts = self._counts, defaultdict(int)
+            last_downloaded_at, self._last_downloaded_at = self._last_downloaded_at, {}
+            shared_downloaded_at, self._shared_downloaded_at = self._shared_downloaded_at, {}
+
+        return {
+            "documents": [
+                {"document_id": document_id, "downloads": count, "downloaded_at": last_downloaded_at[document_id].isoformat()}
+                for document_id, count in counts.items()
+            ],
+            "shares": [
+                {"document_id": document_id, "user_id": user_id, "downloaded_at": downloaded_at.isoformat()}
+                for (document_id, user_id), downloaded_at in shared_downloaded_at.items()
+            ],
+        }
+
+    def restore(self, payload: dict) -> None:
+        """Put a drained payload back into the buffers after a failed flush."""
+        for item in payload["documents"]:
+            downloaded_at = datetime.fromisoformat(item["downloaded_at"])
+            with self._lock:
+                self._counts[item["document_id"]] += item["downloads"]
+                last = self._last_downloaded_at.get(item["document_id"])
+                if last is None or downloaded_at > last:
+                    self._last_downloaded_at[item["document_id"]] = downloaded_at
+        for item in payload["shares"]:
+            downloaded_at = datetime.fromisoformat(item["downloaded_at"])
+            key = (item["document_id"], item["user_id"])
+            with self._lock:
+                last = self._shared_downloaded_at.get(key)
+                if last is None or downloaded_at > last:
+                    self._shared_downloaded_at[key] = downloaded_at
+
+    def flush(self, supabase_factory: Callable[[], Client]) -> int:
+        """Write buffered downloads with one RPC call. Returns the number of documents flushed."""
+        payload = self.drain()
+        if payload is None:
+            return 0
+        try:
+            supabase_factory().rpc('record_document_downloads', payload).execute()
+        except Exception:
+            self.restore(payload)
+            raise
+        # The flush may have moved documents to the `downloaded` status
+        for item in payload["documents"]:
+            entity_cache.invalidate("document", item["document_id"])
+        return len(payload["documents"])
+
+    async def run_periodic_flush(self, supabase_factory: Callable[[], Client], interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # The supabase client is synchronous, keep it off the event loop
+                await asyncio.to_thread(self.flush, supabase_factory)
+            except Exception as e:
+                print(f"Error flushing download events: {e}")
+
+
+download_tracker = DownloadTracker()
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from core.config import Settings
+
+settings = Settings()
+
+INVALIDATION_CHANNEL = "instashare:entity-cache:invalidate"
+
+# Users resolved from access tokens, keyed by token subject (email). Dropped as a
+# whole on any user write, since writes only know the user id and can change the email.
+AUTH_USER_NAMESPACE = "auth_user"
+
+# Current token_version per user id, checked against the claim of every access token
+TOKEN_VERSION_NAMESPACE = "token_version"
+
+# Permission bits of every live role, see auth.permissions
+ROLE_PERMISSIONS_NAMESPACE = "role_permissions"
+
+# Ids per `in.(...)` filter, keeps the PostgREST request URL well under proxy limits
+BATCH_LOAD_CHUNK_SIZE = 500
+
+
+class EntityCache:
+    """Cache of single rows returned by PostgREST, keyed by (namespace, id).
+
+    The local tier is a bounded TTL/LRU dict in each process. When a Redis URL
+    is configured, rows are also shared through Redis and invalidations are
+    broadcast so every process drops its local copy right away.
+
+    Rows are stored as plain dicts and turned into models by the caller, so a
+    cached entry can never be mutated by whoever reads it.
+
+    The Redis client is synchronous. Code running on the event loop uses the
+    `aget`/`aset`/`aget_many`/`ainvalidate` variants, which serve local hits
+    inline and make Redis roundtrips on a worker thread.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, redis_url: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Any], Tuple[float, dict]]" = OrderedDict()
+        self._invalidations = 0
+        self._redis = None
+        self._redis_url = redis_url
+        self._listener_started = False
+
+    def _redis_client(self):
+        if not self._redis_url:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(self._redis_url, socket_timeout=0.5)
+        if not self._listener_started:
+            self._listener_started = True
+            threading.Thread(target=self._listen_for_invalidations, daemon=True).start()
+        return self._redis
+
+    def _listen_for_invalidations(self) -> None:
+        import redis
+        # A connection of its own: the shared client's short socket_timeout would end every
+        # idle listen() after half a second. Dead sockets are found by the health checks instead.
+        client = redis.Redis.from_url(self._redis_url, socket_timeout=None, health_check_interval=30)
+        pubsub = None
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    namespace, _, key = message["data"].decode().partition(":")
+                    self._invalidate_local(namespace, json.loads(key) if key else None)
+            except redis.exceptions.TimeoutError:
+                # Nothing was published for a while, the subscription is still there
+                continue
+            except Exception as e:
+                print(f"Entity cache invalidation listener error: {e}")
+                # Whatever was missed while disconnected can't be trusted anymore
+                self._invalidate_local(None, None)
+                if pubsub is not None:
+                    pubsub.close()
+                    pubsub = None
+                time.sleep(1)
+
+    @staticmethod
+    def _redis_key(namespace: str, key: Any) -> str:
+        return f"instashare:entity:{namespace}:{key}"
+
+    def generation(self) -> int:
+        """Take before loading a row, pass to `set` so a concurrent write wins."""
+        return self._invalidations
+
+    def _get_local(self, namespace: str, key: Any) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires_at, row = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end((namespace, key))
+                return row
+            del self._entries[(namespace, key)]
+            return None
+
+    def get(self, namespace: str, key: Any) -> Optional[dict]:
+        row = self._get_local(namespace, key)
+        if row is not None:
+            return row
+
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._redis_key(namespace, key))
+        except Exception as e:
+            print(f"Entity cache Redis read error: {e}")
+            return None
+        if raw is None:
+            return None
+        row = json.loads(raw)
+        self._set_local(namespace, key, row)
+        return row
+
+    def _set_local(self, namespace: str, key: Any, row: dict) -> None:
+        with self._lock:
+            self._entries[(namespace, key)] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, namespace: str, key: Any, row: dict, generation: Optional[int] = None) -> None:
+        with self._lock:
+            # Skip rows read before an invalidation that happened while they were loading
+            if generation is not None and generation != self._invalidations:
+                return
+        self._set_local(namespace, key, row)
+
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.set(self._redis_key(namespace, key), json.dumps(row, default=str), ex=int(self.ttl) or 1)
+        except Exception as e:
+            print(f"Entity cache Redis write error: {e}")
+
+    def get_many(self, namespace: str, keys: List[Any], load: Callable[[List[Any]], List[dict]]) -> Dict[Any, dict]:
+        """Rows for `keys`, loading the ones not cached with `load(chunk)` calls.
+
+        `load` must return the rows for a chunk of keys in one query. Keys with
+        no row are simply absent from the result.
+        """
+        rows = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            row = self._get_local(namespace, key)
+            if row is None:
+                missing.append(key)
+            else:
+                rows[key] = row
+
+        client = self._redis_client()
+        if client is not None and missing:
+            try:
+                # One MGET for the whole batch instead of a roundtrip per key
+                raw_rows = client.mget([self._redis_key(namespace, key) for key in missing])
+            except Exception as e:
+                print(f"Entity cache Redis read error: {e}")
+                raw_rows = [None] * len(missing)
+            still_missing = []
+            for key, raw in zip(missing, raw_rows):
+                if raw is None:
+                    still_missing.append(key)
+                else:
+                    rows[key] = json.loads(raw)
+                    self._set_local(namespace, key, rows[key])
+            missing = still_missing
+
+        generation = self.generation()
+        for start in range(0, len(missing), BATCH_LOAD_CHUNK_SIZE):
+            for row in load(missing[start:start + BATCH_LOAD_CHUNK_SIZE]):
+                rows[row["id"]] = row
+                self.set(namespace, row["id"], row, generation)
+        return rows
+
+    async def aget(self, namespace: str, key: Any) -> Optional[dict]:
+        row = self._get_local(namespace, key)
+        if row is not None or not self._redis_url:
+            return row
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: Any, row: dict, generation: Optional[int] = None) -> None:
+        if not self._redis_url:
+            return self.set(namespace, key, row, generation)
+        await asyncio.to_thread(self.set, namespace, key, row, generation)
+
+    async def aget_many(self, namespace: str, keys: List[Any], load: Callable[[List[Any]], List[dict]]) -> Dict[Any, dict]:
+        if not self._redis_url:
+            return self.get_many(namespace, keys, load)
+        return await asyncio.to_thread(self.get_many, namespace, keys, load)
+
+    def _invalidate_local(self, namespace: Optional[str], key: Any) -> None:
+        with self._lock:
+            self._invalidations += 1
+            if namespace is None:
+                self._entries.clear()
+            elif key is None:
+                for cached_key in [cached_key for cached_key in self._entries if cached_key[0] == namespace]:
+                    del self._entries[cached_key]
+            else:
+                self._entries.pop((namespace, key), None)
+
+    def invalidate(self, namespace: str, key: Any = None) -> None:
+        """Drop one row, or the whole namespace when `key` is None, in every process."""
+        self._invalidate_local(namespace, key)
+
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            if key is None:
+                redis_keys = list(client.scan_iter(match=self._redis_key(namespace, "*")))
+                if redis_keys:
+                    client.delete(*redis_keys)
+            else:
+                client.delete(self._redis_key(namespace, key))
+            client.publish(INVALIDATION_CHANNEL, f"{namespace}:{json.dumps(key) if key is not None else ''}")
+        except Exception as e:
+            print(f"Entity cache Redis invalidation error: {e}")
+
+    async def ainvalidate(self, namespace: str, key: Any = None) -> None:
+        if not self._redis_url:
+            return self.invalidate(namespace, key)
+        # The local copy goes right away, the request's next read must not see it
+        self._invalidate_local(namespace, key)
+        await asyncio.to_thread(self.invalidate, namespace, key)
+
+
+entity_cache = EntityCache(settings.ENTITY_CACHE_TTL_SECONDS, settings.ENTITY_CACHE_MAX_ENTRIES, settings.REDIS_CACHE_URL)
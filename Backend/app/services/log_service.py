@@ -1,33 +1,66 @@
 from typing import List, Optional
 from supabase import create_client, Client
 from models.log import Log as LogModel
-from schemas.log import Log as LogSchema, LogCreate, LogUpdate
+from schemas.log import Log as LogSchema, LogCreate, LogFilter, LogUpdate
+from schemas.pagination import Page
+from schemas.field_selection import select_columns
+from services.pagination import fetch_page
+from services.entity_cache import entity_cache
 import os
 from datetime import datetime
 
 
+def _apply_log_filter(query, filters: Optional[LogFilter]):
+    if filters is None:
+        return query
+    if filters.created_after is not None:
+        query = query.gte("created_at", filters.created_after.isoformat())
+    if filters.created_before is not None:
+        query = query.lt("created_at", filters.created_before.isoformat())
+    return query
+
+
 class LogService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: Client, replica: Optional[Client] = None):
         #supabase_url = os.getenv("SUPABASE_URL")
         #supabase_key = os.getenv("SUPABASE_KEY")
         #self.supabase: Client = create_client(supabase_url, supabase_key)
         self.supabase: Client = supabase
+        # Listings go to `replica`, see DocumentService for what stays on the primary
+        self.replica: Client = replica or supabase
 
     async def create_log(self, event: str, user_id: Optional[int] = None, event_description: Optional[str] = None) -> LogSchema:
         log_data = {"event": event, "user_id": user_id, "event_description": event_description, "created_at": str(datetime.utcnow())}
         data, count = self.supabase.from_('logs').insert(log_data).execute()
         return LogModel(**data[1][0])
 
-    async def list_logs(self, offset: int = 0, limit: int = 100) -> List[LogSchema]:
-        data, count = self.supabase.from_('logs').select("*", count='exact').range(offset, offset + limit - 1).execute()
-        return [LogModel(**item) for item in data[1]]
+    async def list_logs(self, limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None, count: Optional[str] = None, filters: Optional[LogFilter] = None, raw: bool = False) -> Page[LogSchema]:
+        def base_query(columns: str, **select_options):
+            return _apply_log_filter(self.replica.from_('logs').select(columns, **select_options), filters)
+        # Newest entries first
+        return fetch_page(base_query, select_columns(fields), limit, cursor, None if raw else lambda item: LogModel(**item), count, descending=True)
+
+    async def get_log(self, log_id: int, fields: Optional[List[str]] = None) -> LogSchema:
+        # Log entries are never updated, a cached row stays valid until it expires
+        row = await entity_cache.aget("log", log_id)
+        if row is None:
+            data, count = self.supabase.from_('logs').select(select_columns(fields)).eq("id", log_id).execute()
+            if not data[1]:
+                return None
+            row = data[1][0]
+            if fields is None:
+                await entity_cache.aset("log", log_id, row)
+        return LogModel(**row)
+
+    async def get_logs_by_user(self, user_id: int, limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None, count: Optional[str] = None, filters: Optional[LogFilter] = None, raw: bool = False) -> Page[LogSchema]:
+        def base_query(columns: str, **select_options):
+            return _apply_log_filter(self.replica.from_('logs').select(columns, **select_options).eq("user_id", user_id), filters)
+        return fetch_page(base_query, select_columns(fields), limit, cursor, None if raw else lambda item: LogModel(**item), count, descending=True)
 
-    async def get_log(self, log_id: int) -> LogSchema:
-        data, count = self.supabase.from_('logs').select("*", count='exact').eq("id", log_id).execute()
-        if data[1]:
-            return LogModel(**data[1][0])
-        return None
+    def maintain_partitions(self, months_ahead: int, retention_months: int, archive: bool = False) -> dict:
+        """Create the monthly partitions of the next `months_ahead` months and expire the ones past retention.
 
-    async def get_logs_by_user(self, user_id: int, offset: int = 0, limit: int = 100) -> List[LogSchema]:
-        data, count = self.supabase.from_('logs').select("*", count='exact').eq("user_id", user_id).range(offset, offset + limit - 1).execute()
-        return [LogModel(**item) for item in data[1]]
+        Returns the names of the partitions created and expired, under "created" and "expired".
+        """
+        data, count = self.supabase.rpc('maintain_log_partitions', {"months_ahead": months_ahead, "retention_months": retention_months, "archive": archive}).execute()
+        return data[1]
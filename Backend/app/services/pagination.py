@@ -0,0 +1,121 @@
+import base64
+import json
+from typing import Any, Callable, List, Optional, Tuple
+from postgrest.types import CountMethod
+from schemas.pagination import Page
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def _encode(position: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded))
+
+
+def encode_cursor(last_id: int) -> str:
+    return _encode({"id": last_id})
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(_decode(cursor)["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_sort_cursor(sort: str, value: Any, last_id: int) -> str:
+    """Cursor for listings ordered by `sort`, ties broken on id."""
+    return _encode({"sort": sort, "value": value, "id": last_id})
+
+
+def decode_sort_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        position = _decode(cursor)
+        if position["sort"] != sort:
+            raise ValueError("cursor belongs to another sort order")
+        return position["value"], int(position["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def encode_rank_cursor(rank: float, last_id: int) -> str:
+    """Cursor for listings ordered by a relevance rank, ties broken on id."""
+    return _encode({"rank": rank, "id": last_id})
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        position = _decode(cursor)
+        return float(position["rank"]), int(position["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def _filter_value(value: Any) -> str:
+    # Values inside or=(...) must be quoted, timestamps carry ':' and '.'
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def apply_keyset(query, cursor: Optional[str], limit: int, descending: bool = False, sort: str = "id"):
+    """Seek past the cursor on the primary key instead of skipping rows with OFFSET.
+
+    Ids follow creation order, so this is also created_at order, and every page
+    is a single index range scan no matter how deep it is. One extra row is
+    fetched to know whether there is a next page.
+
+    Ordering on another column seeks on (sort, id). That column must be NOT NULL
+    and covered by an index on (sort, id) for the page to stay a range scan.
+    """
+    if sort == "id":
+        if cursor:
+            last_id = decode_cursor(cursor)
+            query = query.lt("id", last_id) if descending else query.gt("id", last_id)
+        return query.order("id", desc=descending).limit(limit + 1)
+
+    if cursor:
+        value, last_id = decode_sort_cursor(cursor, sort)
+        # The plain range bound is what the index scan starts from, the or= settles ties
+        if descending:
+            query = query.lte(sort, value).or_(f"{sort}.lt.{_filter_value(value)},id.lt.{last_id}")
+        else:
+            query = query.gte(sort, value).or_(f"{sort}.gt.{_filter_value(value)},id.gt.{last_id}")
+    return query.order(sort, desc=descending).order("id", desc=descending).limit(limit + 1)
+
+
+def build_page(rows: List[dict], limit: int, make_item: Optional[Callable[[dict], Any]], sort: str = "id") -> Page:
+    """Page of `make_item(row)`, or of the rows themselves when `make_item` is None."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["id"]) if sort == "id" else encode_sort_cursor(sort, last[sort], last["id"])
+    items = rows if make_item is None else [make_item(row) for row in rows]
+    return Page.model_construct(items=items, next_cursor=next_cursor, total_count=None)
+
+
+def fetch_page(base_query: Callable[..., Any], columns: str, limit: int, cursor: Optional[str], make_item: Optional[Callable[[dict], Any]], count: Optional[str] = None, descending: bool = False, sort: str = "id") -> Page:
+    """Run a keyset-paginated listing, counting the rows only when asked to.
+
+    `base_query(columns, **select_options)` must return the filtered select for
+    the listing. `count` is "exact", "planned" (from planner statistics, cheap
+    on big tables), "estimated" (exact below a threshold, planned above) or
+    None/"none" to skip the COUNT entirely.
+    """
+    count_method = CountMethod(count) if count and count != "none" else None
+    # On the first page the listing query itself can carry the count
+    data, total = apply_keyset(base_query(columns, count=count_method if cursor is None else None), cursor, limit, descending, sort).execute()
+    page = build_page(data[1], limit, make_item, sort)
+    if count_method is None:
+        return page
+    if cursor is not None:
+        # Later pages are narrowed by the cursor, count the whole listing with a HEAD request
+        _, total = base_query("id", count=count_method, head=True).execute()
+    page.total_count = total[1]
+    return page
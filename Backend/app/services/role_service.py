@@ -4,6 +4,7 @@ from models.role import Role as RoleModel
 from models.user import User as UserModel # Import for create_role_event if it logs user actions
 from schemas.role import Role as RoleSchema, RoleCreate, RoleUpdate
 from schemas.log import Log as LogSchema # Assuming role_service can create logs
+from services.entity_cache import ROLE_PERMISSIONS_NAMESPACE, TOKEN_VERSION_NAMESPACE, entity_cache
 import os
 from datetime import datetime
 
@@ -17,14 +18,22 @@ class RoleService:
 
     async def create_role(self, role: RoleModel) -> RoleSchema:
         data, count = self.supabase.from_('roles').insert(role.model_dump()).execute()
+        await entity_cache.ainvalidate(ROLE_PERMISSIONS_NAMESPACE)
         return RoleModel(**data[1][0])
 
     async def update_role(self, role_id: int, role: RoleModel) -> RoleSchema:
         data, count = self.supabase.from_('roles').update(role.model_dump(exclude_unset=True)).eq("id", role_id).execute()
+        # Cached users and issued access tokens embed their role names
+        await entity_cache.ainvalidate("user")
+        await entity_cache.ainvalidate(TOKEN_VERSION_NAMESPACE)
+        await entity_cache.ainvalidate(ROLE_PERMISSIONS_NAMESPACE)
         return RoleModel(**data[1][0])
 
     async def delete_role(self, role_id: int) -> RoleSchema:
         data, count = self.supabase.from_('roles').update({"deleted_at": datetime.utcnow()}).eq("id", role_id).execute()
+        await entity_cache.ainvalidate("user")
+        await entity_cache.ainvalidate(TOKEN_VERSION_NAMESPACE)
+        await entity_cache.ainvalidate(ROLE_PERMISSIONS_NAMESPACE)
         return {"action": "deleted", "message": "Role deleted"}
 
     async def create_role_event(self, event: str, user_id: int, event_description: Optional[str] = None) -> RoleSchema:
@@ -1,17 +1,46 @@
 from typing import List, Optional
 from supabase import create_client, Client
 from models.user import User as UserModel
-from models.document import Document as DocumentModel
-from schemas.user import User as UserSchema, UserCreate, UserUpdate
+from models.document import Document as DocumentModel, DocumentStatus
+from schemas.user import User as UserSchema, UserCreate, UserUpdate, UserUploadedDocuments
 from schemas.document import Document as DocumentSchema
+from schemas.user_storage_usage import UserStorageUsage
+from schemas.pagination import Page
+from services.pagination import build_page, decode_cursor, fetch_page
+from services.entity_cache import AUTH_USER_NAMESPACE, TOKEN_VERSION_NAMESPACE, entity_cache
 from gotrue.errors import AuthApiError
+from auth.passwords import hash_password
 #from sqlalchemy.orm import Session
 import os
 from datetime import datetime
 
 
+def _user_select(fields: Optional[List[str]]) -> str:
+    if fields is None:
+        return "*, user_roles(*, roles(*))"
+    # `role` is not a column, it comes from the role embed
+    columns = [field for field in fields if field != "role"]
+    if "role" in fields:
+        columns.append("user_roles(roles(role_name))")
+    return ",".join(columns)
+
+
+def _user_with_role(item: dict) -> UserModel:
+    user_data = {k: v for k, v in item.items() if k not in ["user_roles"]}
+    user_model = UserModel(**user_data)
+    user_model.role = item['user_roles'][0]['roles']['role_name'] if item.get('user_roles') else None # Assign the role name
+    return user_model
+
+
+def _user_row(item: dict) -> dict:
+    """Row with the role name flattened like `_user_with_role`, without building a model."""
+    row = {k: v for k, v in item.items() if k != "user_roles"}
+    row["role"] = item['user_roles'][0]['roles']['role_name'] if item.get('user_roles') else None
+    return row
+
+
 class UserService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: Client, replica: Optional[Client] = None):
         #supabase_url = os.getenv("SUPABASE_URL")
         #supabase_key = os.getenv("SUPABASE_KEY")
         
@@ -20,25 +49,34 @@ class UserService:
         #print(f"SUPABASE_KEY: {supabase_key}")
         
         self.supabase: Client = supabase
-
-    async def list_users(self, offset: int = 0, limit: int = 100) -> List[UserSchema]:
-        data, count = self.supabase.from_('users').select("*, user_roles(*, roles(*))").is_("deleted_at", None).range(offset, offset + limit - 1).execute()
-        users_with_roles = []
-        for item in data[1]:
-            user_data = {k: v for k, v in item.items() if k not in ["user_roles"]}
-            user_model = UserModel(**user_data)
-            user_model.role = item['user_roles'][0]['roles']['role_name'] if item['user_roles'] else None # Assign the role name
-            users_with_roles.append(user_model)
-        return users_with_roles
-
-    async def get_user(self, user_id: int) -> UserSchema:
-        data, count = self.supabase.from_('users').select("*, user_roles(*, roles(*))").eq("id", user_id).is_("deleted_at", None).execute()
-        if data[1]:
-            user_data = {k: v for k, v in data[1][0].items() if k not in ["user_roles"]}
-            user_model = UserModel(**user_data)
-            user_model.role = data[1][0]['user_roles'][0]['roles']['role_name'] if data[1][0]['user_roles'] else None
-            return user_model
-        return None
+        # Listings and usage reads go to `replica`, single users are cached and read from the primary
+        self.replica: Client = replica or supabase
+
+    async def list_users(self, limit: int = 100, cursor: Optional[str] = None, fields: Optional[List[str]] = None, count: Optional[str] = None, raw: bool = False) -> Page[UserSchema]:
+        def base_query(columns: str, **select_options):
+            return self.replica.from_('users').select(columns, **select_options).is_("deleted_at", None)
+        return fetch_page(base_query, _user_select(fields), limit, cursor, _user_row if raw else _user_with_role, count)
+
+    async def get_user(self, user_id: int, fields: Optional[List[str]] = None) -> UserSchema:
+        row = await entity_cache.aget("user", user_id)
+        if row is None:
+            generation = entity_cache.generation()
+            data, count = self.supabase.from_('users').select(_user_select(fields)).eq("id", user_id).is_("deleted_at", None).execute()
+            if not data[1]:
+                return None
+            row = data[1][0]
+            if fields is None:
+                await entity_cache.aset("user", user_id, row, generation)
+        return _user_with_role(row)
+
+    async def get_users_by_ids(self, user_ids: List[int]) -> List[Optional[UserSchema]]:
+        """Users in the order of `user_ids`, None where there is no such user."""
+        def load(chunk: List[int]) -> List[dict]:
+            data, count = self.supabase.from_('users').select(_user_select(None)).in_("id", chunk).is_("deleted_at", None).execute()
+            return data[1]
+
+        rows = await entity_cache.aget_many("user", user_ids, load)
+        return [_user_with_role(rows[user_id]) if user_id in rows else None for user_id in user_ids]
 
     async def create_user(self, user: UserCreate) -> UserSchema:
         try:
@@ -51,14 +89,10 @@ class UserService:
             if auth_response.user is None:
                 raise AuthApiError("Supabase sign up failed", "", 400)
 
-            # Hash the password for your database (this should be done before passing to service)
-            # For now, let's assume user.hashed_password is already set if coming from an endpoint
-            # Or, if user.password is provided, you would hash it here.
-            # For simplicity, I'm using the passed hashed_password, but in a real app, hash user.password
-
-            # Create user in your database
-            user_data = user.model_dump() # Exclude password from database insert
-            user_data['hashed_password'] = user.hashed_password # Ensure hashed password is used
+            # Create user in your database, only the hash of the password is stored. A hash sent
+            # by the client is never trusted, it is always computed here.
+            user_data = user.model_dump(exclude={"password", "hashed_password"})
+            user_data['hashed_password'] = await hash_password(user.password)
                    
             
             data, count = self.supabase.from_('users').insert(user_data).execute()
@@ -73,30 +107,59 @@ class UserService:
             raise e
 
     async def update_user(self, user_id: int, user: UserModel) -> UserSchema:
-        data, count = self.supabase.from_('users').update(user.model_dump(exclude_unset=True)).eq("id", user_id).execute()
+        changes = user.model_dump(exclude_unset=True)
+        if changes.get("password"):
+            changes["hashed_password"] = await hash_password(changes["password"])
+            changes["password"] = None
+        data, count = self.supabase.from_('users').update(changes).eq("id", user_id).execute()
+        await entity_cache.ainvalidate("user", user_id)
+        await entity_cache.ainvalidate(AUTH_USER_NAMESPACE)
+        await entity_cache.ainvalidate(TOKEN_VERSION_NAMESPACE, user_id)
         return UserModel(**data[1][0])
 
     async def delete_user(self, user_id: int) -> UserSchema:
         data, count = self.supabase.from_('users').update({"deleted_at":str( datetime.utcnow())}).eq("id", user_id).execute()
+        await entity_cache.ainvalidate("user", user_id)
+        await entity_cache.ainvalidate(AUTH_USER_NAMESPACE)
+        await entity_cache.ainvalidate(TOKEN_VERSION_NAMESPACE, user_id)
         return {"action": "deleted", "message": "User deleted"}
 
-    async def get_documents_uploaded_by_user(self, user_id: int) -> list[DocumentSchema]:
-        user_data, count = self.supabase.from_('users').select("*, user_roles(*, roles(*))").eq("id", user_id).is_("deleted_at", None).execute()
-        
-        if not user_data[1]:
+    async def get_documents_uploaded_by_user(self, user_id: int, limit: int = 100, cursor: Optional[str] = None, status_counts: bool = False) -> Optional[UserUploadedDocuments]:
+        """The user with one page of their live documents, fetched in a single embedded query."""
+        count_aliases = [f"{status.value}_count" for status in DocumentStatus] if status_counts else []
+        # `!user_id` picks the owner FK over the many-to-many path through documents_shared
+        select = ",".join(["*", "user_roles(*, roles(*))", "documents!user_id(*)", *(f"{alias}:documents!user_id(count)" for alias in count_aliases)])
+        query = self.replica.from_('users').select(select).eq("id", user_id).is_("deleted_at", None)
+        query = query.is_("documents.deleted_at", None)
+        if cursor:
+            query = query.gt("documents.id", decode_cursor(cursor))
+        query = query.order("id", foreign_table="documents").limit(limit + 1, foreign_table="documents")
+        for status, alias in zip(DocumentStatus, count_aliases):
+            query = query.eq(f"{alias}.status", status.value).is_(f"{alias}.deleted_at", None)
+        data, count = query.execute()
+
+        if not data[1]:
             return None
 
-        user_info = user_data[1][0]
-        user_model = UserModel(**{k: v for k, v in user_info.items() if k not in ["user_roles"]})
-        user_model.role = user_info['user_roles'][0]['roles']['role_name'] if user_info['user_roles'] else None
-
-        documents_data, count = self.supabase.from_('documents').select("*").eq("uploaded_by_user_id", user_id).is_("deleted_at", None).execute() # Assuming a foreign key 'uploaded_by_user_id' in documents table
-        uploaded_documents = [DocumentModel(**item) for item in documents_data[1]]
-
-        return {
-            **user_model.model_dump(),
-            "upload_documents": uploaded_documents
-        }
+        user_info = data[1][0]
+        page = build_page(user_info["documents"], limit, lambda item: DocumentModel(**item))
+        user_model = _user_with_role({k: v for k, v in user_info.items() if k not in ["documents", *count_aliases]})
+        result = UserUploadedDocuments.model_validate(user_model)
+        result.upload_documents = page.items
+        result.next_cursor = page.next_cursor
+        if status_counts:
+            result.status_counts = {
+                status.value: user_info[alias][0]["count"] if user_info[alias] else 0
+                for status, alias in zip(DocumentStatus, count_aliases)
+            }
+        return result
+
+    async def get_storage_usage(self, user_id: int) -> UserStorageUsage:
+        # Kept current by a trigger on documents, so this is a primary key lookup instead of a SUM
+        data, count = self.replica.from_('user_storage_usage').select("*").eq("user_id", user_id).execute()
+        if not data[1]:
+            return UserStorageUsage(user_id=user_id)
+        return UserStorageUsage(**data[1][0])
 
     async def assign_role_to_user(self, user_id: int, role_id: int) -> dict:
         # Check if the user and role exist
@@ -109,4 +172,7 @@ class UserService:
         # Create a new entry in the UserRole table
         user_role_data = {"user_id": user_id, "role_id": role_id}
         data, count = self.supabase.from_('user_roles').insert(user_role_data).execute()
+        await entity_cache.ainvalidate("user", user_id)
+        await entity_cache.ainvalidate(AUTH_USER_NAMESPACE)
+        await entity_cache.ainvalidate(TOKEN_VERSION_NAMESPACE, user_id)
         return {"message": "Role assigned successfully"}
@@ -1,5 +1,7 @@
 from sheduler_app import app as celery_app
-from db.base import get_supabase_client, create_client, Client
+from db.base import get_service_supabase_client, get_supabase_client, create_client, Client
+from core.config import Settings
+from core.instrumentation import instrument_celery
 from services.log_service import LogService
 from schemas.log import LogCreate
 from schemas.document import DocumentUpdate
@@ -8,6 +10,7 @@ from datetime import datetime
 
 from models.document import Document as DocumentModel, DocumentStatus
 from services.document_service import DocumentService
+from services.dashboard_service import DashboardService
 import os
 import io
 import zipfile
@@ -17,6 +20,9 @@ from dotenv import load_dotenv
 
 COMPRESSED_FILES_DIR = "./compressed_files"
 
+# Counts and times the SQL, PostgREST and storage calls of every task
+instrument_celery()
+
 load_dotenv()
 
 
@@ -95,6 +101,8 @@ async def _run_compression_logic(mensaje: str):
             document_update = DocumentUpdate(
                 status=DocumentStatus.process,
                 file_url=new_public_url,
+                size=str(len(zip_buffer.getvalue())),
+                size_bytes=len(zip_buffer.getvalue()),
                 updated_at=datetime.now().isoformat()
             )
             await document_service.update_document(
@@ -135,6 +143,18 @@ def mi_tarea_planificada(mensaje):
     print(f"La tarea planificada se ha ejecutado. Mensaje: {mensaje}")
     asyncio.run(_run_compression_logic(mensaje))
 
+@celery_app.task
+def refresh_dashboard_summary():
+    # Recomputes the dashboard_summary_mv materialized view served by /dashboard/summary
+    DashboardService(get_service_supabase_client()).refresh_summary()
+
+@celery_app.task
+def maintain_log_partitions():
+    # Monthly partitions of logs: the coming months are created, the expired ones dropped or archived
+    settings = Settings()
+    result = LogService(get_service_supabase_client()).maintain_partitions(settings.LOG_PARTITIONS_AHEAD, settings.LOG_RETENTION_MONTHS, settings.LOG_ARCHIVE_EXPIRED)
+    print(f"Log partitions created: {result['created']}, expired: {result['expired']}")
+
 # @celery_app.task
 # async def mi_tarea_planificada(mssg):
     # print(f"La tarea planificada se ha ejecutado. Mensaje: {mssg}")
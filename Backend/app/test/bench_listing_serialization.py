@@ -0,0 +1,80 @@
+"""Serialization cost of a 10k-row document listing, ORM round trip vs. the row fast path.
+
+Run from Backend/app with the same environment as the app:
+
+    python -m test.bench_listing_serialization
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from core.main import _rows_response
+from models.document import Document as DocumentModel
+from schemas.document import Document
+
+ROWS = 10_000
+ROUNDS = 5
+
+
+def make_rows(count: int) -> List[dict]:
+    # Shaped like PostgREST output, timestamps are ISO strings
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "id": i,
+            "name": f"document-{i}.pdf",
+            "type": "application/pdf",
+            "size": str(1000 + i),
+            "size_bytes": 1000 + i,
+            "status": "uploaded",
+            "file_url": f"https://example.supabase.co/storage/v1/object/public/documents/{i}/document-{i}.pdf",
+            "created_at": (start + timedelta(seconds=i)).isoformat(),
+            "updated_at": (start + timedelta(seconds=i)).isoformat(),
+            "deleted_at": None,
+            "uploaded_at": (start + timedelta(seconds=i)).isoformat(),
+            "user_id": i % 100,
+            "download_count": 0,
+            "last_downloaded_at": None,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def orm_path(rows: List[dict]) -> bytes:
+    # What listings did before: a model per row, then response_model validation and stdlib json
+    models = [DocumentModel(**row) for row in rows]
+    adapter = TypeAdapter(List[Document])
+    content = adapter.dump_python(adapter.validate_python(models, from_attributes=True), mode="json")
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def fast_path(rows: List[dict]) -> bytes:
+    return _rows_response(Response(), rows, Document, None).body
+
+
+def best_of(function, rows: List[dict]) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        function(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    rows = make_rows(ROWS)
+    assert json.loads(orm_path(rows)) == json.loads(fast_path(rows))
+    orm_seconds = best_of(orm_path, rows)
+    fast_seconds = best_of(fast_path, rows)
+    print(f"{ROWS} rows, best of {ROUNDS}")
+    print(f"  ORM + response_model + json: {orm_seconds * 1000:8.1f} ms")
+    print(f"  rows + orjson:               {fast_seconds * 1000:8.1f} ms")
+    print(f"  speedup:                     {orm_seconds / fast_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
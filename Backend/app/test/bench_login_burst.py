@@ -0,0 +1,87 @@
+"""Latency of /health while a burst of logins is being verified.
+
+Compares password verification on the dedicated executor with the same work
+done inline in the handler. Run from Backend/app with the same environment as the app:
+
+    python -m test.bench_login_burst
+"""
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import core.main
+from auth.passwords import _verify_and_update, pwd_context
+from core.main import app
+from db.base import Base, get_async_db
+from models.user import User as UserModel
+
+LOGINS = 40
+PASSWORD = "burst-password"
+PROBE_INTERVAL = 0.01
+
+
+async def setup_database() -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with Session() as session:
+        session.add(UserModel(id=1, email="burst@example.com", hashed_password=pwd_context.hash(PASSWORD)))
+        await session.commit()
+
+    async def override_get_async_db():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+
+async def verify_inline(password, hashed_password, legacy_password=None):
+    # What an async handler calling passlib directly would do
+    return _verify_and_update(password, hashed_password, legacy_password)
+
+
+async def burst(client: httpx.AsyncClient) -> List[float]:
+    # Time from asking for a probe to getting its answer, including any wait for the loop
+    latencies = []
+    logins = [
+        asyncio.create_task(client.post("/token", data={"username": "burst@example.com", "password": PASSWORD}))
+        for _ in range(LOGINS)
+    ]
+    while not all(login.done() for login in logins):
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        await client.get("/health")
+        latencies.append(time.perf_counter() - started - PROBE_INTERVAL)
+    assert all(login.result().status_code == 200 for login in logins)
+    return latencies
+
+
+def report(label: str, seconds: float, latencies: List[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<10} burst {seconds:6.2f} s, /health probes {len(latencies):4d}, "
+          f"median {statistics.median(latencies) * 1000:7.1f} ms, p99 {p99 * 1000:7.1f} ms, max {latencies[-1] * 1000:7.1f} ms")
+
+
+async def main() -> None:
+    await setup_database()
+    print(f"{LOGINS} concurrent logins, bcrypt rounds {pwd_context.to_dict()['bcrypt__rounds']}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        verify_password = core.main.verify_password
+        for label, verifier in (("executor", verify_password), ("inline", verify_inline)):
+            core.main.verify_password = verifier
+            started = time.perf_counter()
+            latencies = await burst(client)
+            report(label, time.perf_counter() - started, latencies)
+        core.main.verify_password = verify_password
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
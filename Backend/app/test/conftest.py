@@ -2,10 +2,11 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
 
-from core.main import app, get_document_service, get_user_service, get_role_service, get_log_service
-from db.base import Base, get_db, get_supabase_client
+from core.main import app, get_document_service, get_user_service, get_role_service, get_log_service, get_dashboard_service
+from db.base import Base, get_async_db, get_db, get_supabase_client
 
 from unittest.mock import AsyncMock
 from core.main import app
@@ -13,15 +14,19 @@ from services.document_service import DocumentService
 from services.user_service import UserService
 from services.role_service import RoleService
 from services.log_service import LogService
-from auth.jwt import create_access_token, Token
+from services.dashboard_service import DashboardService
+from auth.jwt import create_access_token, create_token_pair, Token
+from auth.permissions import ALL_PERMISSIONS
+from services.entity_cache import AUTH_USER_NAMESPACE, ROLE_PERMISSIONS_NAMESPACE, TOKEN_VERSION_NAMESPACE, entity_cache
 from schemas.user import UserCreate
 
 from supabase import Client
 from datetime import datetime
-from models import User
+from models import Role, User, UserRole
 
-# Use an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Use an in-memory SQLite database for testing, shared so the async engine sees the same tables
+SQLALCHEMY_DATABASE_URL = "sqlite:///file:instashare_test?mode=memory&cache=shared&uri=true"
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///file:instashare_test?mode=memory&cache=shared&uri=true"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -30,6 +35,11 @@ engine = create_engine(
 )
 SessionTesting = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# No pooling, each TestClient runs its own event loop. The sync engine's
+# connection keeps the in-memory database alive.
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncSessionTesting = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(name="session")
 def session_fixture():
@@ -44,7 +54,12 @@ def client_fixture(session: SessionTesting):
     def override_get_db():
         yield session
 
+    async def override_get_async_db():
+        async with AsyncSessionTesting() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as client:
         yield client
     app.dependency_overrides.clear()
@@ -74,16 +89,21 @@ def dummy_user_fixture():
 
 @pytest.fixture(name="authenticated_client")
 def authenticated_client_fixture(client: TestClient, mock_supabase_client: AsyncMock, dummy_user: dict, session: SessionTesting):
-    # Add the dummy user to the session
+    # Users, versions and roles resolved by earlier tests are still in the process wide cache
+    for namespace in (AUTH_USER_NAMESPACE, TOKEN_VERSION_NAMESPACE, ROLE_PERMISSIONS_NAMESPACE):
+        entity_cache.invalidate(namespace)
+
+    # Add the dummy user to the session, as an admin
     user_model = User(**dummy_user)
-    session.add(user_model)
+    admin_role = Role(role_name="Admin", description="Administrator role", permissions=ALL_PERMISSIONS)
+    session.add_all([user_model, admin_role, UserRole(user=user_model, role=admin_role)])
     session.commit()
     session.refresh(user_model)
 
     # Mock the user query in the Supabase client mock
     mock_supabase_client.from_.return_value.select.return_value.eq.return_value.is_.return_value.execute.return_value.data = [dummy_user]
     
-    access_token = create_access_token(data={"sub": dummy_user["email"]})
+    access_token = create_token_pair(user_model).access_token
     
     client.headers = {
         "Authorization": f"Bearer {access_token}"
@@ -122,3 +142,12 @@ def mock_log_service(mock_supabase_client):
     app.dependency_overrides[get_log_service] = lambda: service
     yield service
     app.dependency_overrides = {}
+
+@pytest.fixture
+def mock_dashboard_service(mock_supabase_client):
+    service = AsyncMock(spec=DashboardService)
+    service.supabase = mock_supabase_client # Ensure mock_supabase_client is accessible if needed
+    app.dependency_overrides[get_dashboard_service] = lambda: service
+    yield service
+    app.dependency_overrides = {}
+
@@ -0,0 +1,47 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from schemas.dashboard import DashboardSummary
+from unittest.mock import AsyncMock, MagicMock
+from services.dashboard_service import DashboardService
+from core.main import app
+
+
+# All fixtures (client, mock_dashboard_service, authenticated_client, dummy_user) are in conftest.py
+
+SUMMARY_ROW = {
+    "total_documents": 3,
+    "documents_by_status": {"uploaded": 2, "process": 1},
+    "total_users": 2,
+    "total_storage_bytes": 4096,
+    "storage_by_user": [{"user_id": 1, "bytes": 4000, "documents": 2}, {"user_id": 2, "bytes": 96, "documents": 1}],
+    "uploads_per_day": [{"day": "2025-09-03", "uploads": 1}, {"day": "2025-09-04", "uploads": 2}],
+    "recent_activity": [{"id": 9, "event": "Document Compression Success", "user_id": 1, "event_description": None, "created_at": "2025-09-04T10:58:36"}],
+    "refreshed_at": "2025-09-04T11:00:00+00:00",
+}
+
+@pytest.mark.asyncio
+async def test_get_dashboard_summary(client: TestClient, mock_dashboard_service: AsyncMock):
+    mock_dashboard_service.get_summary.return_value = DashboardSummary(**SUMMARY_ROW)
+    response = client.get("/dashboard/summary")
+    assert response.status_code == 200
+    assert response.json()["documents_by_status"] == {"uploaded": 2, "process": 1}
+    assert response.json()["uploads_per_day"][1] == {"day": "2025-09-04", "uploads": 2}
+    mock_dashboard_service.get_summary.assert_called_once_with(10)
+
+@pytest.mark.asyncio
+async def test_get_dashboard_summary_authenticated(authenticated_client: TestClient, mock_dashboard_service: AsyncMock, dummy_user: dict):
+    mock_dashboard_service.get_summary.return_value = DashboardSummary(**SUMMARY_ROW)
+    response = authenticated_client.get("/dashboard/authenticated/summary", params={"recent_limit": 5})
+    assert response.status_code == 200
+    assert response.json()["total_storage_bytes"] == 4096
+    mock_dashboard_service.get_summary.assert_called_once_with(5)
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_is_one_rpc_call():
+    supabase = MagicMock()
+    supabase.rpc.return_value.execute.return_value = (("data", SUMMARY_ROW), ("count", None))
+    summary = await DashboardService(supabase).get_summary(10)
+    supabase.rpc.assert_called_once_with("dashboard_summary", {"recent_limit": 10})
+    assert summary.storage_by_user[0].bytes == 4000
+    assert summary.recent_activity[0].event == "Document Compression Success"
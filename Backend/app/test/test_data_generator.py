@@ -0,0 +1,49 @@
+from collections import Counter
+from datetime import datetime
+
+from db.generate import GeneratorConfig, generate_documents, generate_logs, generate_shares, generate_user_roles, generate_users, table_rng
+from models.document import DocumentStatus
+
+END = datetime(2026, 10, 1)
+
+
+def test_same_seed_same_rows():
+    config = GeneratorConfig(users=50, documents=500, logs=500, end=END, seed=3)
+    assert list(generate_documents(config, 1, range(1, 51))) == list(generate_documents(config, 1, range(1, 51)))
+    assert list(generate_logs(config, 1, range(1, 51))) == list(generate_logs(config, 1, range(1, 51)))
+    other = config.model_copy(update={"seed": 4})
+    assert list(generate_documents(config, 1, range(1, 51))) != list(generate_documents(other, 1, range(1, 51)))
+
+def test_tables_do_not_depend_on_each_others_counts():
+    config = GeneratorConfig(users=50, documents=200, end=END)
+    more_users = config.model_copy(update={"users": 5000})
+    assert list(generate_documents(config, 1, range(1, 51))) == list(generate_documents(more_users, 1, range(1, 51)))
+
+def test_documents_follow_configured_distributions():
+    config = GeneratorConfig(documents=20000, statuses={"uploaded": 1, "process": 0, "downloaded": 3}, types={"pdf": 1}, size_median_bytes=1000, end=END, days=30)
+    rows = list(generate_documents(config, 101, range(1, 11)))
+    assert [row[0] for row in rows] == list(range(101, 20101))
+    statuses = Counter(row[5] for row in rows)
+    assert statuses[DocumentStatus.process.value] == 0
+    assert 2.7 < statuses[DocumentStatus.downloaded.value] / statuses[DocumentStatus.uploaded.value] < 3.3
+    assert {row[2] for row in rows} == {"pdf"}
+    sizes = sorted(row[4] for row in rows)
+    assert 900 < sizes[len(sizes) // 2] < 1100
+    # Ids follow creation time, as with real inserts
+    assert [row[10] for row in rows] == sorted(row[10] for row in rows)
+    assert rows[-1][10] < END
+
+def test_users_roles_and_shares():
+    config = GeneratorConfig(users=1000, documents=2000, admin_ratio=0.5, shares_per_document=2, end=END)
+    users = list(generate_users(config, 10, "hash"))
+    assert len({row[1] for row in users}) == 1000
+    user_roles = list(generate_user_roles(config, 1, [row[0] for row in users], 2, 1, [3, 4]))
+    assert Counter(row[1] for row in user_roles)[2] == 1000
+    assert 400 < Counter(row[1] for row in user_roles)[1] < 600
+
+    documents = list(generate_documents(config, 1, range(10, 1010)))
+    shares = generate_shares(table_rng(config, "documents_shared"), config, 1, documents, range(10, 1010))
+    owner_of = {row[0]: row[9] for row in documents}
+    assert 3000 < len(shares) < 5000
+    assert all(owner_of[document_id] != user_id for _, document_id, user_id, *_ in shares)
+    assert [row[0] for row in shares] == list(range(1, len(shares) + 1))
@@ -1,13 +1,20 @@
 import pytest
+import asyncio
+import json
 import os
 from datetime import datetime
 from fastapi.testclient import TestClient
 
 from models.document import Document as DocumentModel, DocumentStatus
-from schemas.document import Document as DocumentSchema, DocumentCreate, DocumentUpdate, DocumentStatusSchema
+from models.user import User as UserModel
+from schemas.document import Document as DocumentSchema, DocumentCreate, DocumentUpdate, DocumentStatusSchema, DocumentDownloadStats, DocumentFilter
 from schemas.user import User as UserSchema # For document shared users
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 from services.document_service import DocumentService
+from schemas.pagination import Page
+from services.download_tracker import DownloadTracker
+from services.document_cache import DocumentFileCache, document_etag, document_version
+from services.pagination import InvalidCursorError, encode_sort_cursor
 from core.main import app
 
 # All fixtures (client, mock_document_service) are in conftest.py
@@ -63,10 +70,10 @@ async def test_update_document_info(client: TestClient, mock_document_service: A
 
 # @pytest.mark.asyncio
 async def test_list_all_documents(client: TestClient, mock_document_service: AsyncMock):
-    mock_document_service.list_documents.return_value = [
+    mock_document_service.list_documents.return_value = Page(items=[
         DocumentSchema(id=1, name="doc1", type="pdf", size="100", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
         DocumentSchema(id=2, name="doc2", type="docx", size="200", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
-    ]
+    ])
     response = client.get("/documents/")
     assert response.status_code == 200
     assert len(response.json()) == 2
@@ -80,7 +87,7 @@ async def test_get_document_by_id(client: TestClient, mock_document_service: Asy
     response = client.get("/documents/1")
     assert response.status_code == 200
     assert response.json()["name"] == "doc1"
-    mock_document_service.get_document.assert_called_once_with(1)
+    mock_document_service.get_document.assert_called_once_with(1, fields=None)
 
 @pytest.mark.asyncio
 async def test_get_document_shared_users(client: TestClient, mock_document_service: AsyncMock):
@@ -93,6 +100,94 @@ async def test_get_document_shared_users(client: TestClient, mock_document_servi
     assert response.json()[0]["email"] == "user1@example.com"
     mock_document_service.get_shared_users_for_document.assert_called_once_with(1)
 
+@pytest.mark.asyncio
+async def test_get_document_shared_users_without_passwords(client: TestClient, mock_document_service: AsyncMock):
+    # Rows of the document_shared_users view, which has no password columns
+    mock_document_service.get_shared_users_for_document.return_value = [
+        UserModel(id=4, email="user4@example.com", username="User4", created_at=datetime.utcnow()),
+    ]
+    response = client.get("/documents/1/shared_by/users")
+    assert response.status_code == 200
+    assert response.json()[0]["email"] == "user4@example.com"
+    assert "password" not in response.json()[0]
+    assert "hashed_password" not in response.json()[0]
+
+@pytest.mark.asyncio
+async def test_get_shared_users_is_a_single_query():
+    supabase = MagicMock()
+    query = supabase.from_.return_value.select.return_value.eq.return_value.order.return_value
+    query.execute.return_value = (("data", [
+        {"document_id": 1, "shared_date": "2025-03-01T10:00:00", "shared_downloaded_at": None, "id": 4, "email": "user4@example.com", "username": "User4"},
+    ]), ("count", None))
+    document_service = DocumentService(supabase)
+
+    users = await document_service.get_shared_users_for_document(1)
+    supabase.from_.assert_called_once_with("document_shared_users")
+    assert [user.email for user in users] == ["user4@example.com"]
+
+@pytest.mark.asyncio
+async def test_get_document_shared_users_not_shared(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.get_shared_users_for_document.return_value = []
+    response = client.get("/documents/1/shared_by/users")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_list_documents_shared_with_me(authenticated_client: TestClient, mock_document_service: AsyncMock, dummy_user: dict):
+    mock_document_service.list_documents_shared_with_user.return_value = Page(items=[
+        DocumentSchema(id=2, name="doc2", type="pdf", size="100", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
+    ], next_cursor="next")
+    response = authenticated_client.get("/documents/authenticated/shared_with_me", params={"limit": 1})
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "doc2"
+    assert response.headers["X-Next-Cursor"] == "next"
+    mock_document_service.list_documents_shared_with_user.assert_called_once_with(dummy_user["id"], 1, None, count="none")
+
+@pytest.mark.asyncio
+async def test_batch_get_documents(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.get_documents_by_ids.return_value = [
+        None,
+        DocumentSchema(id=2, name="doc2", type="pdf", size="100", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
+    ]
+    response = client.post("/documents/batch_get", json={"ids": [1, 2]})
+    assert response.status_code == 200
+    assert response.json()["items"][0] is None
+    assert response.json()["items"][1]["name"] == "doc2"
+    assert response.json()["missing"] == [1]
+    mock_document_service.get_documents_by_ids.assert_called_once_with([1, 2])
+
+    response = client.post("/documents/batch_get", json={"ids": []})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_search_documents(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.search_documents.return_value = Page(items=[
+        DocumentSchema(id=3, name="report", type="pdf", size="100", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
+    ], next_cursor="abc")
+    response = client.get("/documents/search", params={"q": "repo", "limit": 1})
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "report"
+    assert response.headers["X-Next-Cursor"] == "abc"
+    mock_document_service.search_documents.assert_called_once_with("repo", 1, None)
+
+@pytest.mark.asyncio
+async def test_search_documents_paginates_on_rank():
+    supabase = MagicMock()
+    rows = [
+        {"document": {"id": 9, "name": "report", "type": "pdf"}, "rank": 0.9},
+        {"document": {"id": 4, "name": "reports", "type": "pdf"}, "rank": 0.5},
+        {"document": {"id": 7, "name": "repo", "type": "txt"}, "rank": 0.5},
+    ]
+    supabase.rpc.return_value.execute.side_effect = [(("data", rows), ("count", None)), (("data", rows[2:]), ("count", None))]
+    document_service = DocumentService(supabase)
+
+    page = await document_service.search_documents("repo", limit=2)
+    assert [document.id for document in page.items] == [9, 4]
+
+    page = await document_service.search_documents("repo", limit=2, cursor=page.next_cursor)
+    assert supabase.rpc.call_args.args == ("search_documents", {"search_query": "repo", "max_results": 3, "after_rank": 0.5, "after_id": 4})
+    assert [document.id for document in page.items] == [7]
+    assert page.next_cursor is None
+
 @pytest.mark.asyncio
 async def test_inicialize_document_compresion_job(client: TestClient, mock_document_service: AsyncMock):
     mock_document_service.inicialize_document_compresion_job.return_value = {
@@ -153,9 +248,9 @@ async def test_update_document_info_authenticated(authenticated_client: TestClie
 
 @pytest.mark.asyncio
 async def test_list_all_documents_authenticated(authenticated_client: TestClient, mock_document_service: AsyncMock, dummy_user: dict):
-    mock_document_service.list_documents.return_value = [
+    mock_document_service.list_documents.return_value = Page(items=[
         DocumentSchema(id=1, name="auth_doc1", type="pdf", size="100", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.uploaded),
-    ]
+    ])
     response = authenticated_client.get("/documents/authenticated/")
     assert response.status_code == 200
     assert len(response.json()) == 1
@@ -170,7 +265,7 @@ async def test_get_document_by_id_authenticated(authenticated_client: TestClient
     response = authenticated_client.get("/documents/authenticated/1")
     assert response.status_code == 200
     assert response.json()["name"] == "auth_doc1"
-    mock_document_service.get_document.assert_called_once_with(1)
+    mock_document_service.get_document.assert_called_once_with(1, fields=None)
 
 @pytest.mark.asyncio
 async def test_get_document_shared_users_authenticated(authenticated_client: TestClient, mock_document_service: AsyncMock, dummy_user: dict):
@@ -192,3 +287,191 @@ async def test_inicialize_document_compresion_job_authenticated(authenticated_cl
     assert response.status_code == 200
     assert response.json()["idjob"] == 2
     mock_document_service.inicialize_document_compresion_job.assert_called_once_with(2)
+
+# --- Download accounting ---
+@pytest.mark.asyncio
+async def test_download_document(client: TestClient, mock_document_service: AsyncMock, tmp_path):
+    document = DocumentSchema(
+        id=1, name="doc1", type="pdf", size="100", file_url="https://storage.example.com/object/public/documents/1/doc1.zip", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, uploaded_at=datetime.utcnow(), status=DocumentStatusSchema.process
+    )
+    cached_file = tmp_path / "1-version"
+    cached_file.write_bytes(b"zip content")
+    mock_document_service.get_document.return_value = document
+    mock_document_service.get_document_file.return_value = str(cached_file)
+
+    response = client.get("/documents/1/download")
+    assert response.status_code == 200
+    assert response.content == b"zip content"
+    assert response.headers["etag"] == document_etag(document)
+    mock_document_service.record_document_download.assert_called_once_with(1, None)
+
+    revalidation = client.get("/documents/1/download", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidation.status_code == 304
+    assert mock_document_service.get_document_file.call_count == 1
+    assert mock_document_service.record_document_download.call_count == 1
+
+@pytest.mark.asyncio
+async def test_download_document_not_found(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.get_document.return_value = None
+    response = client.get("/documents/1/download")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_get_document_downloads(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.get_document_download_stats.return_value = DocumentDownloadStats(document_id=1, download_count=42, last_downloaded_at=datetime.utcnow())
+    response = client.get("/documents/1/downloads")
+    assert response.status_code == 200
+    assert response.json()["download_count"] == 42
+    mock_document_service.get_document_download_stats.assert_called_once_with(1)
+
+def test_download_tracker_batches_events():
+    tracker = DownloadTracker()
+    tracker.record(1, user_id=7)
+    tracker.record(1, user_id=7)
+    tracker.record(2)
+    assert tracker.pending_count(1) == 2
+
+    payload = tracker.drain()
+    assert sorted((item["document_id"], item["downloads"]) for item in payload["documents"]) == [(1, 2), (2, 1)]
+    assert [(item["document_id"], item["user_id"]) for item in payload["shares"]] == [(1, 7)]
+    assert tracker.drain() is None
+
+    tracker.restore(payload)
+    assert tracker.pending_count(1) == 2
+
+def test_document_file_cache_evicts_least_recently_used(tmp_path):
+    cache = DocumentFileCache(str(tmp_path), max_bytes=10)
+    cache.put((1, "a"), b"12345")
+    cache.put((2, "a"), b"12345")
+    assert cache.get((1, "a")) is not None
+    cache.put((3, "a"), b"12345")
+
+    assert cache.get((2, "a")) is None
+    assert cache.get((1, "a")) is not None
+    assert cache.put((4, "a"), b"x" * 11) is None
+
+def test_document_version_same_for_string_and_datetime_timestamps():
+    from_row = DocumentModel(id=1, file_url="https://storage.example.com/object/public/documents/1/doc1.zip", updated_at="2026-10-01T12:00:00.5+00:00")
+    from_schema = DocumentModel(id=1, file_url=from_row.file_url, updated_at=datetime(2026, 10, 1, 12, 0, 0, 500000))
+    assert document_version(from_row) == document_version(from_schema)
+
+def test_document_file_cache_keeps_leased_files_until_released(tmp_path):
+    cache = DocumentFileCache(str(tmp_path), max_bytes=10)
+    path = cache.put((1, "a"), b"12345", lease=True)
+    cache.put((2, "a"), b"12345")
+    cache.put((3, "a"), b"12345")
+    assert cache.get((1, "a")) is None
+    assert os.path.exists(path)
+    cache.release(path)
+    assert not os.path.exists(path)
+
+@pytest.mark.asyncio
+async def test_document_file_cache_fetches_once_for_concurrent_misses(tmp_path):
+    cache = DocumentFileCache(str(tmp_path), max_bytes=100)
+    fetches = 0
+    async def fetch():
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.01)
+        return b"12345"
+    paths = await asyncio.gather(*(cache.get_or_fetch((1, "a"), fetch) for _ in range(3)))
+    assert fetches == 1
+    assert len(set(paths)) == 1
+    assert not cache._fetch_locks
+
+# --- Sparse field selection ---
+@pytest.mark.asyncio
+async def test_list_all_documents_with_fields(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.list_documents.return_value = Page(items=[
+        DocumentModel(id=1, name="doc1", status=DocumentStatus.uploaded),
+    ])
+    response = client.get("/documents/", params={"fields": "name,status"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "doc1", "status": "uploaded"}]
+    mock_document_service.list_documents.assert_called_once_with(100, None, fields=["id", "name", "status"], count="none", filters=DocumentFilter(), sort="id", descending=False, raw=True)
+
+@pytest.mark.asyncio
+async def test_list_all_documents_with_unknown_fields(client: TestClient, mock_document_service: AsyncMock):
+    response = client.get("/documents/", params={"fields": "name,owner_password"})
+    assert response.status_code == 400
+    mock_document_service.list_documents.assert_not_called()
+
+# --- Filtering and sorting ---
+@pytest.mark.asyncio
+async def test_list_all_documents_filtered_and_sorted(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.list_documents.return_value = Page(items=[])
+    response = client.get("/documents/", params={"status": "process", "user_id": 3, "created_after": "2025-01-01T00:00:00", "sort": "created_at", "order": "desc"})
+    assert response.status_code == 200
+    mock_document_service.list_documents.assert_called_once_with(
+        100, None, fields=None, count="none",
+        filters=DocumentFilter(status=DocumentStatusSchema.process, user_id=3, created_after=datetime(2025, 1, 1)),
+        sort="created_at", descending=True, raw=True,
+    )
+
+    response = client.get("/documents/", params={"sort": "size"})
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_list_documents_seeks_on_sort_column():
+    supabase = MagicMock()
+    query = supabase.from_.return_value.select.return_value.is_.return_value
+    query.eq.return_value = query
+    query.lte.return_value = query
+    query.or_.return_value = query
+    query.order.return_value = query
+    query.limit.return_value.execute.return_value = (("data", [
+        {"id": 8, "name": "a", "created_at": "2025-03-01T10:00:00"},
+        {"id": 5, "name": "b", "created_at": "2025-02-01T10:00:00"},
+    ]), ("count", None))
+    document_service = DocumentService(supabase)
+
+    cursor = encode_sort_cursor("created_at", "2025-04-01T10:00:00", 12)
+    page = await document_service.list_documents(1, cursor, fields=["id", "name"], filters=DocumentFilter(type="pdf"), sort="created_at", descending=True)
+
+    supabase.from_.return_value.select.assert_called_once_with("id,name,created_at", count=None)
+    query.eq.assert_called_once_with("type", "pdf")
+    query.lte.assert_called_once_with("created_at", "2025-04-01T10:00:00")
+    query.or_.assert_called_once_with('created_at.lt."2025-04-01T10:00:00",id.lt.12')
+    assert [call.args[0] for call in query.order.call_args_list] == ["created_at", "id"]
+    assert [document.id for document in page.items] == [8]
+    assert page.next_cursor == encode_sort_cursor("created_at", "2025-03-01T10:00:00", 8)
+
+# --- NDJSON streaming ---
+@pytest.mark.asyncio
+async def test_list_all_documents_ndjson_streams_every_batch(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.list_documents.side_effect = [
+        Page(items=[DocumentModel(id=1, name="doc1", type="pdf", status=DocumentStatus.uploaded)], next_cursor="c1", total_count=2),
+        Page(items=[DocumentModel(id=2, name="doc2", type="pdf", status=DocumentStatus.uploaded)]),
+    ]
+    response = client.get("/documents/", params={"fields": "name", "count": "exact"}, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.text == '{"id":1,"name":"doc1"}\n{"id":2,"name":"doc2"}\n'
+    calls = mock_document_service.list_documents.call_args_list
+    assert calls[0].args == (1000, None) and calls[0].kwargs["count"] == "exact"
+    assert calls[1].args == (1000, "c1") and calls[1].kwargs["count"] == "none"
+
+@pytest.mark.asyncio
+async def test_list_all_documents_ndjson_invalid_cursor(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.list_documents.side_effect = InvalidCursorError("Invalid cursor: x")
+    response = client.get("/documents/", params={"cursor": "x"}, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_list_all_documents_ndjson_failure_midway_ends_with_error_line(client: TestClient, mock_document_service: AsyncMock):
+    mock_document_service.list_documents.side_effect = [
+        Page(items=[DocumentModel(id=1, name="doc1", type="pdf", status=DocumentStatus.uploaded)], next_cursor="c1"),
+        RuntimeError("connection reset"),
+    ]
+    response = client.get("/documents/", params={"fields": "name"}, headers={"Accept": "application/x-ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{"id": 1, "name": "doc1"}, {"error": "connection reset", "cursor": "c1"}]
+
+
+def test_rows_fast_path_matches_response_model():
+    from fastapi import Response
+    from core.main import _rows_response
+    from test.bench_listing_serialization import make_rows, orm_path
+    rows = make_rows(3)
+    assert json.loads(_rows_response(Response(), rows, DocumentSchema, None).body) == json.loads(orm_path(rows))
@@ -0,0 +1,72 @@
+import logging
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+from supabase import create_client
+
+from core import instrumentation
+
+
+def test_server_timing_counts_sql_of_the_request(client: TestClient, session):
+    response = client.post("/token", data={"username": "nobody@example.com", "password": "x"})
+    assert response.status_code == 401
+    timing = response.headers["Server-Timing"]
+    assert 'sql;desc="sql x1"' in timing
+    assert "total;dur=" in timing
+
+def test_supabase_calls_are_timed_per_kind():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=[]))
+    supabase = SimpleNamespace(
+        postgrest=SimpleNamespace(session=httpx.Client(transport=transport, base_url="http://rest")),
+        storage=SimpleNamespace(session=httpx.Client(transport=transport, base_url="http://storage")),
+        auth=SimpleNamespace(on_auth_state_change=lambda callback: None),
+    )
+    instrumentation.instrument_supabase_client(supabase)
+
+    token = instrumentation.start("test")
+    supabase.postgrest.session.get("/documents")
+    supabase.postgrest.session.get("/users")
+    supabase.storage.session.get("/object/documents/1")
+    stats = instrumentation.current()
+    instrumentation.finish(token, slow_ms=float("inf"))
+    assert stats.counts == {"sql": 0, "postgrest": 2, "storage": 1}
+    assert instrumentation.current() is None
+
+def test_supabase_clients_rebuilt_after_sign_in_stay_timed():
+    supabase = create_client("http://supabase.test", "anon-key")
+    instrumentation.instrument_supabase_client(supabase)
+    before = supabase.postgrest.session
+
+    supabase.auth._notify_all_subscribers("SIGNED_IN", None)
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=[]))
+    supabase.postgrest.session._transport = transport
+    supabase.storage.session._transport = transport
+    assert supabase.postgrest.session is not before
+
+    token = instrumentation.start("test")
+    supabase.table("documents").select("*").execute()
+    stats = instrumentation.current()
+    instrumentation.finish(token, slow_ms=float("inf"))
+    assert stats.counts["postgrest"] == 1
+
+def test_timing_a_response_leaves_its_body_unread():
+    session = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=iter([b"x" * 10]))))
+    on_request, on_response = instrumentation._timed_hooks(instrumentation.STORAGE)
+    session.event_hooks = {"request": [on_request], "response": [on_response]}
+    token = instrumentation.start("test")
+    with session.stream("GET", "http://storage/object/documents/1") as response:
+        assert not response.is_stream_consumed
+        stats = instrumentation.current()
+    instrumentation.finish(token, slow_ms=float("inf"))
+    assert stats.counts["storage"] == 1
+
+def test_slow_calls_and_chatty_requests_are_logged(caplog):
+    caplog.set_level(logging.WARNING, logger="instashare.instrumentation")
+    token = instrumentation.start("GET /documents/")
+    instrumentation.record("postgrest", instrumentation.SLOW_CALL_THRESHOLDS_MS["postgrest"] + 1, "GET /rest/v1/documents 200")
+    instrumentation.record("sql", 0.1, "SELECT 1")
+    instrumentation.finish(token, slow_ms=0)
+    assert "Slow postgrest call" in caplog.text
+    assert "Slow GET /documents/" in caplog.text
+    assert "sql=1/" in caplog.text
@@ -3,9 +3,12 @@ from datetime import datetime
 from fastapi.testclient import TestClient
 
 from models.log import Log as LogModel
-from schemas.log import Log , LogBase, LogCreate, LogUpdate
-from unittest.mock import AsyncMock
+from schemas.log import Log , LogBase, LogCreate, LogFilter, LogUpdate
+from unittest.mock import AsyncMock, MagicMock
 from services.log_service import LogService
+from schemas.pagination import Page
+from services.pagination import InvalidCursorError, build_page, decode_cursor, encode_cursor, fetch_page
+from postgrest.types import CountMethod
 from core.main import app
 
 # All fixtures (client, mock_log_service) are in conftest.py
@@ -24,14 +27,14 @@ async def test_create_new_log(client: TestClient, mock_log_service: AsyncMock):
 
 @pytest.mark.asyncio
 async def test_list_all_logs(client: TestClient, mock_log_service: AsyncMock):
-    mock_log_service.list_logs.return_value = [
+    mock_log_service.list_logs.return_value = Page(items=[
         Log(id=1, event="user_login", user_id=1, event_description="User logged in", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
         Log(id=2, event="document_upload", user_id=1, event_description="Document uploaded", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
-    ]
+    ])
     response = client.get("/logs/")
     assert response.status_code == 200
     assert len(response.json()) == 2
-    mock_log_service.list_logs.assert_called_once_with(0, 100)
+    mock_log_service.list_logs.assert_called_once_with(100, None, fields=None, count="none", filters=LogFilter(), raw=True)
 
 @pytest.mark.asyncio
 async def test_get_log_by_id(client: TestClient, mock_log_service: AsyncMock):
@@ -41,18 +44,87 @@ async def test_get_log_by_id(client: TestClient, mock_log_service: AsyncMock):
     response = client.get("/logs/1")
     assert response.status_code == 200
     assert response.json()["event"] == "user_login"
-    mock_log_service.get_log.assert_called_once_with(1)
+    mock_log_service.get_log.assert_called_once_with(1, fields=None)
 
 @pytest.mark.asyncio
 async def test_get_logs_for_user(client: TestClient, mock_log_service: AsyncMock):
-    mock_log_service.get_logs_by_user.return_value = [
+    mock_log_service.get_logs_by_user.return_value = Page(items=[
         Log(id=1, event="user_login", user_id=1, event_description="User logged in", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
-    ]
+    ])
     response = client.get("/logs/user/1")
     assert response.status_code == 200
     assert len(response.json()) == 1
     assert response.json()[0]["user_id"] == 1
-    mock_log_service.get_logs_by_user.assert_called_once_with(1, 0, 100)
+    mock_log_service.get_logs_by_user.assert_called_once_with(1, 100, None, fields=None, count="none", filters=LogFilter(), raw=True)
+
+@pytest.mark.asyncio
+async def test_list_all_logs_next_cursor(client: TestClient, mock_log_service: AsyncMock):
+    mock_log_service.list_logs.return_value = Page(items=[
+        Log(id=5, event="user_login", user_id=1, event_description="User logged in", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
+    ], next_cursor=encode_cursor(5))
+    response = client.get("/logs/", params={"limit": 1, "cursor": encode_cursor(6)})
+    assert response.status_code == 200
+    assert response.headers["x-next-cursor"] == encode_cursor(5)
+    mock_log_service.list_logs.assert_called_once_with(1, encode_cursor(6), fields=None, count="none", filters=LogFilter(), raw=True)
+
+@pytest.mark.asyncio
+async def test_list_all_logs_invalid_cursor(client: TestClient, mock_log_service: AsyncMock):
+    mock_log_service.list_logs.side_effect = InvalidCursorError("Invalid cursor: abc")
+    response = client.get("/logs/", params={"cursor": "abc"})
+    assert response.status_code == 400
+
+def test_keyset_page_from_rows():
+    page = build_page([{"id": 3}, {"id": 2}, {"id": 1}], 2, lambda row: row["id"])
+    assert page.items == [3, 2]
+    assert decode_cursor(page.next_cursor) == 2
+    assert build_page([{"id": 1}], 2, lambda row: row["id"]).next_cursor is None
+
+@pytest.mark.asyncio
+async def test_list_all_logs_total_count(client: TestClient, mock_log_service: AsyncMock):
+    mock_log_service.list_logs.return_value = Page(items=[], total_count=1200)
+    response = client.get("/logs/", params={"count": "planned"})
+    assert response.status_code == 200
+    assert response.headers["x-total-count"] == "1200"
+    mock_log_service.list_logs.assert_called_once_with(100, None, fields=None, count="planned", filters=LogFilter(), raw=True)
+
+def test_fetch_page_counts_only_when_asked():
+    base_query = MagicMock()
+    base_query.return_value.order.return_value.limit.return_value.execute.return_value = (("data", [{"id": 1}]), ("count", 1))
+    page = fetch_page(base_query, "*", 10, None, lambda row: row)
+    assert page.total_count is None
+    base_query.assert_called_once_with("*", count=None)
+
+    base_query.reset_mock()
+    base_query.return_value.lt.return_value.order.return_value.limit.return_value.execute.return_value = (("data", [{"id": 1}]), ("count", None))
+    base_query.return_value.execute.return_value = (("data", []), ("count", 40))
+    page = fetch_page(base_query, "*", 10, encode_cursor(2), lambda row: row, count="exact", descending=True)
+    assert page.total_count == 40
+    base_query.assert_called_with("id", count=CountMethod.exact, head=True)
+
+@pytest.mark.asyncio
+async def test_get_logs_for_user_time_bounds(client: TestClient, mock_log_service: AsyncMock):
+    mock_log_service.get_logs_by_user.return_value = Page(items=[])
+    response = client.get("/logs/user/1", params={"created_after": "2026-09-01T00:00:00", "created_before": "2026-10-01T00:00:00"})
+    assert response.status_code == 200
+    filters = LogFilter(created_after=datetime(2026, 9, 1), created_before=datetime(2026, 10, 1))
+    mock_log_service.get_logs_by_user.assert_called_once_with(1, 100, None, fields=None, count="none", filters=filters, raw=True)
+
+@pytest.mark.asyncio
+async def test_logs_by_user_bounded_on_created_at():
+    supabase = MagicMock()
+    query = supabase.from_.return_value.select.return_value.eq.return_value.gte.return_value.lt.return_value
+    query.order.return_value.limit.return_value.execute.return_value = (("data", []), ("count", None))
+    filters = LogFilter(created_after=datetime(2026, 9, 1), created_before=datetime(2026, 10, 1))
+    await LogService(supabase).get_logs_by_user(1, filters=filters)
+    supabase.from_.return_value.select.return_value.eq.return_value.gte.assert_called_once_with("created_at", "2026-09-01T00:00:00")
+    supabase.from_.return_value.select.return_value.eq.return_value.gte.return_value.lt.assert_called_once_with("created_at", "2026-10-01T00:00:00")
+
+def test_maintain_partitions_is_one_rpc_call():
+    supabase = MagicMock()
+    supabase.rpc.return_value.execute.return_value = (("data", {"created": ["logs_2027_01"], "expired": ["logs_2025_09"]}), ("count", None))
+    result = LogService(supabase).maintain_partitions(3, 12, archive=True)
+    supabase.rpc.assert_called_once_with("maintain_log_partitions", {"months_ahead": 3, "retention_months": 12, "archive": True})
+    assert result["expired"] == ["logs_2025_09"]
 
 # --- Authenticated Endpoints Tests ---
 @pytest.mark.asyncio
@@ -71,14 +143,14 @@ async def test_create_new_log_authenticated(authenticated_client: TestClient, mo
 
 @pytest.mark.asyncio
 async def test_list_all_logs_authenticated(authenticated_client: TestClient, mock_log_service: AsyncMock, dummy_user: dict):
-    mock_log_service.list_logs.return_value = [
+    mock_log_service.list_logs.return_value = Page(items=[
         Log(id=3, event="auth_user_login", user_id=dummy_user["id"], event_description="Auth User logged in", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
-    ]
+    ])
     response = authenticated_client.get("/logs/authenticated/")
     assert response.status_code == 200
     assert len(response.json()) == 1
     assert response.json()[0]["event"] == "auth_user_login"
-    mock_log_service.list_logs.assert_called_once_with(0, 100)
+    mock_log_service.list_logs.assert_called_once_with(100, None, fields=None, count="none", filters=LogFilter(), raw=True)
 
 @pytest.mark.asyncio
 async def test_get_log_by_id_authenticated(authenticated_client: TestClient, mock_log_service: AsyncMock, dummy_user: dict):
@@ -88,15 +160,15 @@ async def test_get_log_by_id_authenticated(authenticated_client: TestClient, moc
     response = authenticated_client.get(f"/logs/authenticated/{3}")
     assert response.status_code == 200
     assert response.json()["event"] == "auth_user_login"
-    mock_log_service.get_log.assert_called_once_with(3)
+    mock_log_service.get_log.assert_called_once_with(3, fields=None)
 
 @pytest.mark.asyncio
 async def test_get_logs_for_user_authenticated(authenticated_client: TestClient, mock_log_service: AsyncMock, dummy_user: dict):
-    mock_log_service.get_logs_by_user.return_value = [
+    mock_log_service.get_logs_by_user.return_value = Page(items=[
         Log(id=3, event="auth_user_login", user_id=dummy_user["id"], event_description="Auth User logged in", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None),
-    ]
+    ])
     response = authenticated_client.get(f"/logs/authenticated/user/{dummy_user["id"]}")
     assert response.status_code == 200
     assert len(response.json()) == 1
     assert response.json()[0]["user_id"] == dummy_user["id"]
-    mock_log_service.get_logs_by_user.assert_called_once_with(dummy_user["id"], 0, 100)
+    mock_log_service.get_logs_by_user.assert_called_once_with(dummy_user["id"], 100, None, fields=None, count="none", filters=LogFilter(), raw=True)
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from unittest.mock import AsyncMock, MagicMock
+
+from auth.jwt import create_access_token
+from db import routing
+from db.routing import get_replica_supabase_client, record_write, write_markers
+from schemas.log import Log, LogCreate
+from services.dashboard_service import DashboardService
+from services.entity_cache import entity_cache
+from datetime import datetime
+
+
+def _request(method: str = "GET", host: str = "testclient", token: str = None) -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "method": method, "path": "/", "query_string": b"", "headers": headers, "client": (host, 50000)})
+
+@pytest.fixture
+def replica(monkeypatch):
+    replica = MagicMock()
+    monkeypatch.setattr(routing.settings, "SUPABASE_REPLICA_URLS", "http://replica-1, http://replica-2")
+    monkeypatch.setattr(routing, "create_client", lambda url, key: replica)
+    monkeypatch.setattr(routing, "instrument_supabase_client", lambda client: None)
+    write_markers.clear()
+    yield replica
+    write_markers.clear()
+
+def test_reads_go_to_a_replica(replica):
+    primary = MagicMock()
+    assert get_replica_supabase_client(_request("GET"), primary) is replica
+    assert get_replica_supabase_client(_request("POST"), primary) is primary
+
+def test_reads_stay_on_primary_without_replicas(monkeypatch):
+    monkeypatch.setattr(routing.settings, "SUPABASE_REPLICA_URLS", None)
+    primary = MagicMock()
+    assert get_replica_supabase_client(_request("GET"), primary) is primary
+
+@pytest.mark.asyncio
+async def test_reads_after_own_write_go_to_primary(client: TestClient, mock_log_service: AsyncMock, replica):
+    mock_log_service.create_log.return_value = Log(id=1, event="Test Event", user_id=1, event_description=None, created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+    response = client.post("/logs/", json=LogCreate(event="Test Event", user_id=1).model_dump())
+    assert response.status_code == 200
+
+    primary = MagicMock()
+    assert get_replica_supabase_client(_request("GET", host="testclient"), primary) is primary
+    # Other clients haven't written anything
+    assert get_replica_supabase_client(_request("GET", host="10.0.0.2"), primary) is replica
+
+def test_write_stickiness_follows_the_token_user(replica):
+    token = create_access_token({"sub": "test@example.com", "uid": 7})
+    record_write(_request("PATCH", host="10.0.0.1", token=token))
+
+    primary = MagicMock()
+    assert get_replica_supabase_client(_request("GET", host="10.0.0.2", token=token), primary) is primary
+    assert get_replica_supabase_client(_request("GET", host="10.0.0.1"), primary) is replica
+
+def test_write_stickiness_survives_entity_cache_invalidation(replica):
+    record_write(_request("POST"))
+    entity_cache.invalidate("user")
+    entity_cache._invalidate_local(None, None)
+    assert get_replica_supabase_client(_request("GET"), MagicMock()) is not replica
+
+def test_write_stickiness_expires(monkeypatch, replica):
+    monkeypatch.setattr(routing.settings, "READ_YOUR_WRITES_SECONDS", 0.0)
+    record_write(_request("POST"))
+    assert get_replica_supabase_client(_request("GET"), MagicMock()) is replica
+
+@pytest.mark.asyncio
+async def test_read_only_service_calls_use_the_replica():
+    primary, replica = MagicMock(), MagicMock()
+    replica.rpc.return_value.execute.return_value = (("data", None), ("count", None))
+    await DashboardService(primary, replica).get_summary(10)
+    replica.rpc.assert_called_once_with("dashboard_summary", {"recent_limit": 10})
+    primary.rpc.assert_not_called()
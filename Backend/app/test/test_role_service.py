@@ -7,7 +7,11 @@ from models.log import Log as LogModel
 from schemas.role import Role as RoleSchema, RoleCreate, RoleUpdate
 from schemas.log import Log as LogSchema
 from schemas.user import User as UserSchema # For authenticated client fixture
-from unittest.mock import AsyncMock
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from auth.jwt import create_access_token
+from auth.permissions import ROLE_PERMISSIONS_KEY, STANDARD_USER_PERMISSIONS, Permission, user_permissions
+from services.entity_cache import ROLE_PERMISSIONS_NAMESPACE, entity_cache
 from services.role_service import RoleService
 from core.main import app
 
@@ -16,35 +20,43 @@ from core.main import app
 
 # Test Role Endpoints
 @pytest.mark.asyncio
-async def test_create_new_role(client: TestClient, mock_role_service: AsyncMock):
+async def test_create_new_role(authenticated_client: TestClient, mock_role_service: AsyncMock):
     role_create_data = RoleCreate(role_name="admin", description="Administrator role")
     mock_role_service.create_role.return_value = RoleSchema(
         id=1, created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None, **role_create_data.model_dump()
     )
-    response = client.post("/roles/", json=role_create_data.model_dump())
+    response = authenticated_client.post("/roles/", json=role_create_data.model_dump())
     assert response.status_code == 200
     assert response.json()["role_name"] == "admin"
     mock_role_service.create_role.assert_called_once_with(role_create_data)
 
 @pytest.mark.asyncio
-async def test_update_existing_role(client: TestClient, mock_role_service: AsyncMock):
+async def test_update_existing_role(authenticated_client: TestClient, mock_role_service: AsyncMock):
     role_update_data = RoleUpdate(role_name="super_admin")
     mock_role_service.update_role.return_value = RoleSchema(
         id=1, role_name="super_admin", description="Administrator role", created_at=datetime.utcnow(), updated_at=datetime.utcnow(), deleted_at=None
     )
-    response = client.put("/roles/1", json=role_update_data.model_dump(exclude_unset=True))
+    response = authenticated_client.put("/roles/1", json=role_update_data.model_dump(exclude_unset=True))
     assert response.status_code == 200
     assert response.json()["role_name"] == "super_admin"
     mock_role_service.update_role.assert_called_once_with(1, role_update_data)
 
 @pytest.mark.asyncio
-async def test_delete_existing_role(client: TestClient, mock_role_service: AsyncMock):
+async def test_delete_existing_role(authenticated_client: TestClient, mock_role_service: AsyncMock):
     mock_role_service.delete_role.return_value = {"action": "deleted", "message": "Role deleted"}
-    response = client.delete("/roles/1")
+    response = authenticated_client.delete("/roles/1")
     assert response.status_code == 200
     assert response.json()["action"] == "deleted"
     mock_role_service.delete_role.assert_called_once_with(1)
 
+def test_role_mutations_require_authentication(client: TestClient, mock_role_service: AsyncMock):
+    assert client.post("/roles/", json={"role_name": "admin", "permissions": -1}).status_code == 401
+    assert client.put("/roles/1", json={"permissions": -1}).status_code == 401
+    assert client.delete("/roles/1").status_code == 401
+    mock_role_service.create_role.assert_not_called()
+    mock_role_service.update_role.assert_not_called()
+    mock_role_service.delete_role.assert_not_called()
+
 @pytest.mark.asyncio
 async def test_create_new_role_event(client: TestClient, mock_role_service: AsyncMock):
     mock_role_service.create_role_event.return_value = LogSchema(
@@ -95,3 +107,37 @@ async def test_create_new_role_event_authenticated(authenticated_client: TestCli
     assert response.status_code == 200
     assert response.json()["event"] == "auth_role_assigned"
     mock_role_service.create_role_event.assert_called_once_with("auth_role_assigned", dummy_user["id"], "Authenticated Role assigned")
+
+# --- Permissions ---
+@pytest.mark.asyncio
+async def test_role_permissions_are_cached_until_a_role_changes(authenticated_client: TestClient, mock_role_service: AsyncMock, session):
+    mock_role_service.delete_role.return_value = {"action": "deleted", "message": "Role deleted"}
+    assert authenticated_client.delete("/roles/authenticated/2").status_code == 200
+
+    session.query(RoleModel).update({"permissions": int(STANDARD_USER_PERMISSIONS)})
+    session.commit()
+    assert authenticated_client.delete("/roles/authenticated/2").status_code == 200
+
+    supabase = MagicMock()
+    supabase.from_.return_value.update.return_value.eq.return_value.execute.return_value = (("data", [{"id": 1, "role_name": "Admin"}]), ("count", None))
+    await RoleService(supabase).update_role(1, RoleUpdate(permissions=int(STANDARD_USER_PERMISSIONS)))
+    response = authenticated_client.delete("/roles/authenticated/2")
+    assert response.status_code == 403
+    assert mock_role_service.delete_role.call_count == 2
+
+def test_permissions_from_token_issued_without_claims(authenticated_client: TestClient, mock_role_service: AsyncMock, dummy_user: dict):
+    mock_role_service.delete_role.return_value = {"action": "deleted", "message": "Role deleted"}
+    access_token = create_access_token(data={"sub": dummy_user["email"]})
+    response = authenticated_client.delete("/roles/authenticated/2", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 200
+
+def test_user_permissions_combine_roles():
+    user = UserSchema(id=1, email="test@example.com", password="", roles=["Reader", "Auditor"])
+    permissions = {"Reader": int(Permission.READ_DOCUMENTS), "Auditor": int(Permission.READ_LOGS)}
+    entity_cache.set(ROLE_PERMISSIONS_NAMESPACE, ROLE_PERMISSIONS_KEY, permissions)
+    try:
+        granted = asyncio.run(user_permissions(user, None))
+    finally:
+        entity_cache.invalidate(ROLE_PERMISSIONS_NAMESPACE)
+    assert granted == Permission.READ_DOCUMENTS | Permission.READ_LOGS
+    assert not Permission.MANAGE_ROLES & granted
@@ -1,14 +1,24 @@
 import pytest
+import json
+import threading
+import time
 from models import User, Document as DocumentModel
+from models.user import User as UserModel
+from models.role import Role as RoleModel
 from schemas import  UserCreate, UserUpdate, Document as DocumentSchema
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 from services.user_service import UserService
+from schemas.pagination import Page
+from services.entity_cache import EntityCache, TOKEN_VERSION_NAMESPACE, entity_cache
 from core.main import app
 from schemas.user import UserCreate, UserUpdate, User
 from schemas.role import Role
+from schemas.user_storage_usage import UserStorageUsage
 from datetime import datetime
 from passlib.context import CryptContext
+from auth.passwords import pwd_context
 from fastapi.testclient import TestClient
+from jose import jwt
 
 
 # All fixtures (client, mock_user_service) are in conftest.py
@@ -29,7 +39,7 @@ from fastapi.testclient import TestClient
 #     response = client.get("/users/")
 #     assert response.status_code == 200
 #     assert response.json() == []
-#     mock_user_service.list_users.assert_called_once_with(0, 100)
+#     mock_user_service.list_users.assert_called_once_with(100, None)
 
 # def test_get_user_by_id_unauthenticated(client: TestClient, mock_user_service: AsyncMock):
 #     mock_user_service.get_user.return_value = None
@@ -68,11 +78,16 @@ def test_get_user_uploaded_documents_unauthenticated(client: TestClient, mock_us
     response = client.get("/users/1/uploaded_documents")
     assert response.status_code == 404
     assert response.json() == {"detail": "User not found or no documents uploaded"}
-    mock_user_service.get_documents_uploaded_by_user.assert_called_once_with(1)
+    mock_user_service.get_documents_uploaded_by_user.assert_called_once_with(1, 100, None, status_counts=False)
 
 def test_assign_role_to_user_unauthenticated(client: TestClient, mock_user_service: AsyncMock):
-    mock_user_service.assign_role_to_user.return_value = {"message": "Role assigned successfully"}
     response = client.post("/users/1/assign_role/1")
+    assert response.status_code == 401
+    mock_user_service.assign_role_to_user.assert_not_called()
+
+def test_assign_role_to_user(authenticated_client: TestClient, mock_user_service: AsyncMock):
+    mock_user_service.assign_role_to_user.return_value = {"message": "Role assigned successfully"}
+    response = authenticated_client.post("/users/1/assign_role/1")
     assert response.status_code == 200
     assert response.json() == {"message": "Role assigned successfully"}
     mock_user_service.assign_role_to_user.assert_called_once_with(1, 1)
@@ -93,20 +108,92 @@ def test_login_for_access_token(authenticated_client: TestClient, mock_supabase_
     assert "access_token" in response.json()
     assert response.json()["token_type"] == "bearer"
 
+def test_access_token_carries_claims_and_is_revoked_by_version(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict, session):
+    tokens = authenticated_client.post("/token", data={"username": dummy_user["email"], "password": dummy_user["password"]}).json()
+    claims = jwt.get_unverified_claims(tokens["access_token"])
+    assert (claims["uid"], claims["roles"], claims["ver"], claims["type"]) == (dummy_user["id"], ["Admin"], 0, "access")
+    mock_user_service.get_storage_usage.return_value = UserStorageUsage(user_id=dummy_user["id"])
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert authenticated_client.get("/users/authenticated/1/storage_usage", headers=headers).status_code == 200
+
+    # A refresh token is not an access token
+    assert authenticated_client.get("/users/authenticated/1/storage_usage", headers={"Authorization": f"Bearer {tokens['refresh_token']}"}).status_code == 401
+
+    refreshed = authenticated_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert refreshed.status_code == 200
+
+    # What the database trigger does on a password or role change
+    session.query(UserModel).update({"token_version": 1})
+    session.commit()
+    entity_cache.invalidate(TOKEN_VERSION_NAMESPACE, dummy_user["id"])
+    assert authenticated_client.get("/users/authenticated/1/storage_usage", headers=headers).status_code == 401
+    assert authenticated_client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+def test_soft_deleted_role_is_left_out_of_claims(authenticated_client: TestClient, dummy_user: dict, session):
+    session.query(RoleModel).update({"deleted_at": datetime.utcnow()})
+    session.commit()
+    tokens = authenticated_client.post("/token", data={"username": dummy_user["email"], "password": dummy_user["password"]}).json()
+    assert jwt.get_unverified_claims(tokens["access_token"])["roles"] == []
+
+def test_login_upgrades_plaintext_password_to_hash(client: TestClient, dummy_user: dict, session):
+    session.add(UserModel(**{**dummy_user, "hashed_password": None}))
+    session.commit()
+    credentials = {"username": dummy_user["email"], "password": dummy_user["password"]}
+    assert client.post("/token", data=credentials).status_code == 200
+
+    user = session.query(UserModel).one()
+    session.refresh(user)
+    assert user.password is None
+    assert pwd_context.identify(user.hashed_password) == "bcrypt"
+    assert client.post("/token", data=credentials).status_code == 200
+    assert client.post("/token", data={**credentials, "password": "wrong"}).status_code == 401
+
+def test_login_does_bcrypt_work_for_unknown_email(client: TestClient, monkeypatch):
+    verify = MagicMock(wraps=pwd_context.verify)
+    monkeypatch.setattr(pwd_context, "verify", verify)
+    response = client.post("/token", data={"username": "nobody@example.com", "password": "whatever"})
+    assert response.status_code == 401
+    verify.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_create_user_ignores_client_supplied_hash(dummy_user: dict):
+    supabase = MagicMock()
+    supabase.from_.return_value.insert.return_value.execute.return_value = (("data", [dummy_user]), ("count", None))
+    user = UserCreate(email="new@example.com", password="new-password", hashed_password="$2b$12$planted")
+    await UserService(supabase).create_user(user)
+    stored = supabase.from_.return_value.insert.call_args.args[0]
+    assert stored["hashed_password"] != "$2b$12$planted"
+    assert pwd_context.verify("new-password", stored["hashed_password"])
+
+@pytest.mark.asyncio
+async def test_update_user_stores_only_password_hash(dummy_user: dict):
+    supabase = MagicMock()
+    supabase.from_.return_value.update.return_value.eq.return_value.execute.return_value = (("data", [dummy_user]), ("count", None))
+    await UserService(supabase).update_user(dummy_user["id"], UserUpdate(password="new-password"))
+    changes = supabase.from_.return_value.update.call_args.args[0]
+    assert changes["password"] is None
+    assert pwd_context.verify("new-password", changes["hashed_password"])
+
 def test_list_all_users_authenticated(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
     # Mock user service to return the dummy user in a list
-    mock_user_service.list_users.return_value = [User(**dummy_user)]
+    mock_user_service.list_users.return_value = Page(items=[User(**dummy_user)])
     response = authenticated_client.get("/users/authenticated/")
     assert response.status_code == 200
     assert response.json()[0]["email"] == dummy_user["email"]
-    mock_user_service.list_users.assert_called_once_with(0, 100)
+    mock_user_service.list_users.assert_called_once_with(100, None, fields=None, count="none", raw=True)
+
+def test_list_users_rejects_fields_that_are_not_columns(authenticated_client: TestClient, mock_user_service: AsyncMock):
+    for fields in ("roles", "email,hashed_password"):
+        response = authenticated_client.get("/users/authenticated/", params={"fields": fields})
+        assert response.status_code == 400
+    mock_user_service.list_users.assert_not_called()
 
 def test_get_user_by_id_authenticated(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
     mock_user_service.get_user.return_value = User(**dummy_user)
     response = authenticated_client.get(f"/users/authenticated/{dummy_user["id"]}")
     assert response.status_code == 200
     assert response.json()["email"] == dummy_user["email"]
-    mock_user_service.get_user.assert_called_once_with(dummy_user["id"])
+    mock_user_service.get_user.assert_called_once_with(dummy_user["id"], fields=None)
 
 def test_create_new_user_authenticated(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
     new_user_data = UserCreate(username="New User", email="auth_new@example.com", password="newpassword", phone="1112223333", responsability="Editor")
@@ -142,3 +229,210 @@ def test_delete_existing_user_authenticated(authenticated_client: TestClient, mo
     assert response.status_code == 200
     assert response.json() == {"action": "deleted", "message": "User deleted"}
     mock_user_service.delete_user.assert_called_once_with(dummy_user["id"])
+
+def test_list_all_users_ndjson_hides_passwords(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
+    mock_user_service.list_users.return_value = Page(items=[User(**dummy_user)])
+    response = authenticated_client.get("/users/authenticated/", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert len(lines) == 1
+    assert '"email":"test@example.com"' in lines[0]
+    assert "password" not in lines[0]
+
+def test_list_all_users_json_and_ndjson_hide_passwords(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
+    mock_user_service.list_users.return_value = Page(items=[dict(dummy_user)])
+    for path in ("/users/", "/users/authenticated/"):
+        listed = authenticated_client.get(path).json()[0]
+        streamed = json.loads(authenticated_client.get(path, headers={"Accept": "application/x-ndjson"}).text.splitlines()[0])
+        assert "password" not in listed and "hashed_password" not in listed
+        assert listed.keys() == streamed.keys()
+
+def test_user_rows_fast_path_matches_response_model(dummy_user: dict):
+    from fastapi import Response
+    from core.main import _rows_response
+    # Raw PostgREST rows carry no `roles`, and may lack columns with a schema default
+    row = {key: value for key, value in dummy_user.items() if key != "is_active"}
+    expected = User.model_validate(row).model_dump(mode="json")
+    assert json.loads(_rows_response(Response(), [row], User, None).body) == [expected]
+
+# --- Entity cache ---
+@pytest.mark.asyncio
+async def test_get_user_is_cached_until_updated(dummy_user: dict):
+    entity_cache.invalidate("user")
+    supabase = MagicMock()
+    user_row = {**dummy_user, "user_roles": [{"roles": {"role_name": "Admin"}}]}
+    select_query = supabase.from_.return_value.select.return_value.eq.return_value.is_.return_value
+    select_query.execute.return_value = (("data", [user_row]), ("count", None))
+    supabase.from_.return_value.update.return_value.eq.return_value.execute.return_value = (("data", [dummy_user]), ("count", None))
+    user_service = UserService(supabase)
+
+    await user_service.get_user(dummy_user["id"])
+    cached_user = await user_service.get_user(dummy_user["id"])
+    assert cached_user.role == "Admin"
+    assert select_query.execute.call_count == 1
+
+    await user_service.update_user(dummy_user["id"], UserUpdate(phone="5550000"))
+    await user_service.get_user(dummy_user["id"])
+    assert select_query.execute.call_count == 2
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_until_user_deleted(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict, session):
+    mock_user_service.get_storage_usage.return_value = UserStorageUsage(user_id=dummy_user["id"])
+    assert authenticated_client.get("/users/authenticated/1/storage_usage").status_code == 200
+
+    # Served from the cache, the database is not asked again
+    session.query(UserModel).delete()
+    session.commit()
+    assert authenticated_client.get("/users/authenticated/1/storage_usage").status_code == 200
+
+    supabase = MagicMock()
+    supabase.from_.return_value.update.return_value.eq.return_value.execute.return_value = (("data", []), ("count", None))
+    await UserService(supabase).delete_user(dummy_user["id"])
+    assert authenticated_client.get("/users/authenticated/1/storage_usage").status_code == 401
+
+def test_current_user_rejects_deactivated_user(authenticated_client: TestClient, mock_user_service: AsyncMock, session):
+    session.query(UserModel).update({"is_active": False})
+    session.commit()
+    assert authenticated_client.get("/users/authenticated/1/storage_usage").status_code == 401
+
+def test_entity_cache_skips_rows_loaded_before_an_invalidation():
+    cache = EntityCache(ttl=60, max_entries=2)
+    generation = cache.generation()
+    cache.invalidate("document", 1)
+    cache.set("document", 1, {"id": 1}, generation)
+    assert cache.get("document", 1) is None
+
+    cache.set("document", 1, {"id": 1})
+    cache.set("document", 2, {"id": 2})
+    cache.set("document", 3, {"id": 3})
+    assert cache.get("document", 1) is None
+    assert cache.get("document", 3) == {"id": 3}
+
+def test_entity_cache_get_many_loads_only_misses_in_chunks():
+    cache = EntityCache(ttl=60, max_entries=2000)
+    cache.set("user", 1, {"id": 1})
+    loaded_chunks = []
+
+    def load(chunk):
+        loaded_chunks.append(list(chunk))
+        return [{"id": key} for key in chunk if key != 7]
+
+    rows = cache.get_many("user", [1, 7, *range(100, 700)], load)
+    assert 1 in rows and 7 not in rows and 699 in rows
+    assert 1 not in loaded_chunks[0]
+    assert [len(chunk) for chunk in loaded_chunks] == [500, 101]
+
+    cache.get_many("user", [1, 100], load)
+    assert len(loaded_chunks) == 2
+
+@pytest.mark.asyncio
+async def test_entity_cache_redis_calls_run_off_the_event_loop():
+    class RecordingRedis:
+        def __init__(self):
+            self.threads = []
+        def get(self, key):
+            self.threads.append(threading.get_ident())
+            return b'{"id": 1}'
+        def set(self, key, value, ex=None):
+            self.threads.append(threading.get_ident())
+
+    cache = EntityCache(ttl=60, max_entries=10, redis_url="redis://cache")
+    cache._redis = RecordingRedis()
+    cache._listener_started = True
+    assert await cache.aget("user", 1) == {"id": 1}
+    await cache.aset("user", 2, {"id": 2})
+    assert len(cache._redis.threads) == 2
+    assert threading.get_ident() not in cache._redis.threads
+    # Local hits never reach Redis
+    assert await cache.aget("user", 1) == {"id": 1}
+    assert len(cache._redis.threads) == 2
+
+def test_entity_cache_survives_idle_invalidation_listener(monkeypatch):
+    import redis
+    done = threading.Event()
+
+    class IdlePubSub:
+        def subscribe(self, channel):
+            pass
+        def listen(self):
+            if not done.is_set():
+                done.set()
+                raise redis.exceptions.TimeoutError("Timeout reading from socket")
+            yield {"data": b'user:1'}
+            threading.Event().wait()
+
+    pubsubs = []
+    class ListenerRedis:
+        def pubsub(self, ignore_subscribe_messages=False):
+            pubsubs.append(IdlePubSub())
+            return pubsubs[-1]
+
+    options = {}
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: options.update(kwargs) or ListenerRedis())
+    cache = EntityCache(ttl=60, max_entries=10, redis_url="redis://cache")
+    cache._set_local("user", 1, {"id": 1})
+    cache._set_local("user", 2, {"id": 2})
+    threading.Thread(target=cache._listen_for_invalidations, daemon=True).start()
+    for _ in range(100):
+        if cache._get_local("user", 1) is None:
+            break
+        time.sleep(0.01)
+    assert options["socket_timeout"] is None
+    assert len(pubsubs) == 1
+    # The published invalidation dropped its row, the idle timeout dropped nothing
+    assert cache._get_local("user", 1) is None
+    assert cache._get_local("user", 2) == {"id": 2}
+
+def test_batch_get_users_authenticated(authenticated_client: TestClient, mock_user_service: AsyncMock, dummy_user: dict):
+    mock_user_service.get_users_by_ids.return_value = [User(**dummy_user), None]
+    response = authenticated_client.post("/users/authenticated/batch_get", json={"ids": [dummy_user["id"], 42]})
+    assert response.status_code == 200
+    assert response.json()["items"][0]["email"] == dummy_user["email"]
+    assert response.json()["items"][1] is None
+    assert response.json()["missing"] == [42]
+    mock_user_service.get_users_by_ids.assert_called_once_with([dummy_user["id"], 42])
+
+# --- Uploaded documents ---
+@pytest.mark.asyncio
+async def test_get_documents_uploaded_by_user_single_query(dummy_user: dict):
+    supabase = MagicMock()
+    query = supabase.from_.return_value.select.return_value.eq.return_value.is_.return_value
+    for method in ("is_", "gt", "eq", "order", "limit"):
+        getattr(query, method).return_value = query
+    query.execute.return_value = (("data", [{
+        **dummy_user,
+        "user_roles": [{"roles": {"role_name": "Admin"}}],
+        "documents": [{"id": 5, "name": "a", "type": "pdf"}, {"id": 6, "name": "b", "type": "pdf"}],
+        "uploaded_count": [{"count": 7}],
+        "process_count": [{"count": 0}],
+        "downloaded_count": [],
+    }]), ("count", None))
+    user_service = UserService(supabase)
+
+    result = await user_service.get_documents_uploaded_by_user(dummy_user["id"], limit=1, status_counts=True)
+
+    supabase.from_.assert_called_once_with("users")
+    query.is_.assert_any_call("documents.deleted_at", None)
+    query.eq.assert_any_call("uploaded_count.status", "uploaded")
+    query.limit.assert_called_once_with(2, foreign_table="documents")
+    assert result.role == "Admin"
+    assert [document.id for document in result.upload_documents] == [5]
+    assert result.next_cursor is not None
+    assert result.status_counts == {"uploaded": 7, "process": 0, "downloaded": 0}
+
+# --- Storage usage ---
+def test_get_user_storage_usage(client: TestClient, mock_user_service: AsyncMock):
+    mock_user_service.get_storage_usage.return_value = UserStorageUsage(user_id=1, bytes=2048, documents=3)
+    response = client.get("/users/1/storage_usage")
+    assert response.status_code == 200
+    assert response.json()["bytes"] == 2048
+    mock_user_service.get_storage_usage.assert_called_once_with(1)
+
+@pytest.mark.asyncio
+async def test_get_storage_usage_without_documents():
+    supabase = MagicMock()
+    supabase.from_.return_value.select.return_value.eq.return_value.execute.return_value = (("data", []), ("count", None))
+    usage = await UserService(supabase).get_storage_usage(5)
+    supabase.from_.assert_called_once_with("user_storage_usage")
+    assert (usage.user_id, usage.bytes, usage.documents) == (5, 0, 0)
+